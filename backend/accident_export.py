@@ -0,0 +1,57 @@
+"""
+Streaming export of filtered accident records
+
+Records are encoded and written a chunk of rows at a time, so an export of
+the full history never builds the whole response in memory.
+"""
+import zlib
+
+from compaction import json_ready
+from serialization import encode_records
+
+# Export format -> content type
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+EXPORT_CHUNK_ROWS = 10000
+
+
+def iter_export(frame, row_ids, fmt, chunk_rows=EXPORT_CHUNK_ROWS, extra_columns=None):
+    """
+    Yield the rows of frame at row_ids (all rows when None) as encoded
+    bytes in the given format, chunk_rows rows at a time. extra_columns
+    are constant columns added to every record.
+    """
+    total = len(frame) if row_ids is None else len(row_ids)
+
+    if total == 0 and fmt == 'csv':
+        # Header only, so an empty export is still a valid CSV
+        empty = frame.iloc[:0].assign(**(extra_columns or {}))
+        yield empty.to_csv(index=False).encode()
+        return
+
+    for start in range(0, total, chunk_rows):
+        if row_ids is None:
+            chunk = frame.iloc[start:start + chunk_rows]
+        else:
+            chunk = frame.iloc[row_ids[start:start + chunk_rows]]
+        if extra_columns:
+            chunk = chunk.assign(**extra_columns)
+
+        if fmt == 'ndjson':
+            # Each line is the record /api/accidents returns, byte for byte
+            yield ''.join(f'{record}\n' for record in encode_records(chunk, missing='""')).encode()
+        else:
+            yield json_ready(chunk).to_csv(index=False, header=(start == 0)).encode()
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
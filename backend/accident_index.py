@@ -0,0 +1,193 @@
+"""
+Row-id indexes for filtering the airline accidents dataset
+"""
+import base64
+import binascii
+import copy
+import json
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Query parameter -> column matched with a case-insensitive pattern
+FILTER_COLUMNS = {
+    'country': 'Country',
+    'severity': 'Injury Severity',
+    'make': 'Make',
+    'aircraft_category': 'Aircraft Category',
+    'phase_of_flight': 'Broad Phase of Flight',
+}
+
+DATE_COLUMN = 'Event Date'
+
+
+def intersect(id_sets):
+    """Intersect sorted row-id arrays, smallest first so every step stays small"""
+    id_sets = sorted(id_sets, key=len)
+    result = id_sets[0]
+    for ids in id_sets[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, ids, assume_unique=True)
+    return result
+
+
+def encode_cursor(row_id):
+    """Opaque pagination cursor pointing just past a row id"""
+    return base64.urlsafe_b64encode(json.dumps({'after': int(row_id)}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the row id a cursor points past; raises ValueError for a malformed cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))['after'])
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'malformed cursor {cursor!r}') from e
+
+
+def page_after(row_ids, total_rows, after, limit):
+    """
+    Keyset page: the first limit row ids greater than after, found by binary
+    search so a deep page costs the same as the first one. row_ids is the
+    sorted result of AccidentIndex.query, or None for all total_rows rows.
+    """
+    if row_ids is None:
+        start = 0 if after is None else max(after + 1, 0)
+        return np.arange(start, min(start + max(limit, 0), total_rows))
+    start = 0 if after is None else np.searchsorted(row_ids, after, side='right')
+    return row_ids[start:start + max(limit, 0)]
+
+
+# Everything an index holds, published as one object so readers never
+# see a partly appended index
+_IndexState = namedtuple('_IndexState', ['rows', 'postings', 'date_order', 'sorted_dates', 'dates'])
+
+
+class AccidentIndex:
+    """
+    Inverted indexes over the categorical filter columns plus a sorted
+    date index, so a filtered page only touches the rows that match.
+    Row ids are positions in the indexed frame.
+    """
+
+    def __init__(self):
+        self._state = _IndexState(
+            rows=0,
+            # column -> {value: sorted row ids}
+            postings={column: {} for column in FILTER_COLUMNS.values()},
+            date_order=np.empty(0, dtype=np.int64),
+            sorted_dates=np.empty(0, dtype='datetime64[ns]'),
+            dates=np.empty(0, dtype='datetime64[ns]'),
+        )
+
+    @property
+    def rows(self):
+        return self._state.rows
+
+    @property
+    def postings(self):
+        return self._state.postings
+
+    @classmethod
+    def build(cls, df):
+        """Index a whole frame"""
+        index = cls()
+        index.append(df)
+        return index
+
+    def appended(self, df):
+        """Return an index that also covers df, appended after the rows indexed here; this one is unchanged"""
+        index = copy.copy(self)
+        index.append(df)
+        return index
+
+    def append(self, df):
+        """
+        Index rows appended after the rows already indexed.
+        The new postings and date arrays are built aside and published in
+        one assignment, so a concurrent query sees the old index or the new.
+        """
+        state = self._state
+        offset = state.rows
+
+        postings = {}
+        for column, existing_postings in state.postings.items():
+            column_postings = dict(existing_postings)
+            if column in df.columns:
+                for value, positions in df.groupby(column, sort=False, observed=True).indices.items():
+                    ids = positions.astype(np.int64) + offset
+                    existing = column_postings.get(value)
+                    # New ids are all larger than existing ones, so appending keeps them sorted
+                    column_postings[value] = ids if existing is None else np.concatenate([existing, ids])
+            postings[column] = column_postings
+
+        dates = np.concatenate([
+            state.dates, pd.to_datetime(df[DATE_COLUMN], errors='coerce').to_numpy(dtype='datetime64[ns]')
+        ])
+        valid = np.flatnonzero(~np.isnat(dates))
+        date_order = valid[np.argsort(dates[valid], kind='stable')]
+
+        self._state = _IndexState(rows=offset + len(df), postings=postings, date_order=date_order,
+                                  sorted_dates=dates[date_order], dates=dates)
+
+    @staticmethod
+    def _match(state, column, pattern):
+        regex = re.compile(pattern, re.IGNORECASE)
+        matches = [ids for value, ids in state.postings[column].items()
+                   if isinstance(value, str) and regex.search(value)]
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(matches))
+
+    @staticmethod
+    def _date_range(state, start=None, end=None):
+        sorted_dates = state.sorted_dates
+        lo = 0 if start is None else np.searchsorted(sorted_dates, np.datetime64(start, 'ns'), side='left')
+        hi = len(sorted_dates) if end is None else np.searchsorted(sorted_dates, np.datetime64(end, 'ns'), side='left')
+        return np.sort(state.date_order[lo:hi])
+
+    @staticmethod
+    def _year_bounds(year):
+        return pd.Timestamp(year=year, month=1, day=1), pd.Timestamp(year=year + 1, month=1, day=1)
+
+    def match(self, column, pattern):
+        """Row ids whose value in column contains the case-insensitive regex pattern"""
+        return self._match(self._state, column, pattern)
+
+    def date_range(self, start=None, end=None):
+        """Row ids with start <= date < end; rows without a valid date never match"""
+        return self._date_range(self._state, start, end)
+
+    def year(self, year):
+        """Row ids whose date falls in the given calendar year"""
+        return self._date_range(self._state, *self._year_bounds(year))
+
+    def query(self, patterns=None, year=None, date_from=None, date_to=None):
+        """
+        Return the sorted row ids matching every given filter, or None when no
+        filter is set (all rows match).
+        patterns maps query parameter names from FILTER_COLUMNS to patterns.
+        date_to is inclusive of the whole day it names.
+        """
+        # Answer from one version of the index throughout
+        state = self._state
+        id_sets = []
+
+        for param, pattern in (patterns or {}).items():
+            if pattern:
+                id_sets.append(self._match(state, FILTER_COLUMNS[param], pattern))
+
+        if year is not None:
+            id_sets.append(self._date_range(state, *self._year_bounds(year)))
+
+        if date_from is not None or date_to is not None:
+            start = None if date_from is None else pd.Timestamp(date_from)
+            end = None if date_to is None else pd.Timestamp(date_to).normalize() + pd.Timedelta(days=1)
+            id_sets.append(self._date_range(state, start, end))
+
+        if not id_sets:
+            return None
+        return intersect(id_sets)
@@ -0,0 +1,177 @@
+"""
+Precomputed summary views over the airline accidents dataset
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from serialization import RawJSON, encode_frame, json_body
+
+TOP_N = 20
+
+# Severity score buckets used by /api/target-distributions: (label, upper bound)
+SCORE_RANGES = [
+    ('0 (No Injuries)', 0),
+    ('1-5 (Minor)', 5),
+    ('6-15 (Moderate)', 15),
+    ('16-30 (Serious)', 30),
+    ('31+ (Severe)', np.inf),
+]
+
+
+def _merge(totals, update):
+    """Add a per-group update into the running per-group totals"""
+    # Sums of compact small-integer columns keep their small dtype; widen
+    # them so running totals cannot overflow
+    if isinstance(update, pd.DataFrame):
+        widened = {col: 'int64' for col, dtype in update.dtypes.items() if pd.api.types.is_integer_dtype(dtype)}
+        update = update.astype(widened)
+    elif pd.api.types.is_integer_dtype(update.dtype):
+        update = update.astype('int64')
+    if totals is None:
+        return update
+    merged = totals.add(update, fill_value=0)
+    # add() aligns the groups through floats; keep counts integers so an
+    # appended dataset renders exactly like a fresh build
+    if isinstance(merged, pd.DataFrame):
+        counts = [col for col in merged.columns
+                  if pd.api.types.is_integer_dtype(totals[col]) and pd.api.types.is_integer_dtype(update[col])]
+        return merged.astype({col: 'int64' for col in counts})
+    if pd.api.types.is_integer_dtype(totals.dtype) and pd.api.types.is_integer_dtype(update.dtype):
+        return merged.astype('int64')
+    return merged
+
+
+def _severity_scores(df):
+    """Compute the weighted injury severity score for each record"""
+    return (
+        pd.to_numeric(df['Total Fatal Injuries'], errors='coerce').astype(float).fillna(0) * 3 +
+        pd.to_numeric(df['Total Serious Injuries'], errors='coerce').astype(float).fillna(0) * 2 +
+        pd.to_numeric(df['Total Minor Injuries'], errors='coerce').astype(float).fillna(0) * 1
+    )
+
+
+class AccidentAggregates:
+    """
+    Running per-group totals for the summary endpoints.
+    Totals are folded in chunk by chunk with append(), and the summary
+    tables are rendered once after each update, so serving a summary is a
+    dictionary lookup instead of a groupby over every record.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self._by_year = None
+        self._by_make = None
+        self._by_country = None
+        self._severity = None
+        self._score_counts = np.zeros(len(SCORE_RANGES), dtype=np.int64)
+        self.tables = {}
+        self._encoded = {}
+
+    @classmethod
+    def build(cls, df):
+        """Build aggregates over a whole frame"""
+        aggregates = cls()
+        aggregates.append(df)
+        return aggregates
+
+    def appended(self, df):
+        """
+        Return aggregates that also cover df, appended after the records
+        already folded in. This object is left unchanged for its readers.
+        """
+        aggregates = copy.copy(self)
+        aggregates.append(df)
+        return aggregates
+
+    def append(self, df):
+        """Fold newly appended records into the totals and re-render the tables"""
+        # Accidents and injuries per year
+        years = pd.to_datetime(df['Event Date'], errors='coerce').dt.year.rename('year')
+        by_year = df.groupby(years).agg(
+            total_accidents=('Event Id', 'count'),
+            fatal_injuries=('Total Fatal Injuries', 'sum'),
+            serious_injuries=('Total Serious Injuries', 'sum'),
+            minor_injuries=('Total Minor Injuries', 'sum'),
+        )
+        self._by_year = _merge(self._by_year, by_year)
+
+        # Accidents and fatalities per aircraft make
+        by_make = df.groupby('Make', observed=True).agg(
+            total_accidents=('Event Id', 'count'),
+            total_fatalities=('Total Fatal Injuries', 'sum'),
+        )
+        self._by_make = _merge(self._by_make, by_make)
+
+        # Accidents and fatalities per country, ignoring empty values
+        countries = df[df['Country'].notna() & (df['Country'].str.strip() != '')]
+        by_country = countries.groupby('Country', observed=True).agg(
+            total_accidents=('Event Id', 'count'),
+            total_fatalities=('Total Fatal Injuries', 'sum'),
+        )
+        self._by_country = _merge(self._by_country, by_country)
+
+        # Injury severity labels
+        severity_counts = df['Injury Severity'].value_counts()
+        self._severity = _merge(self._severity, severity_counts[severity_counts > 0])
+
+        # Severity score buckets in a single pass: 0, (0, 5], (5, 15], (15, 30], > 30
+        scores = _severity_scores(df).to_numpy()
+        scores = scores[scores >= 0]
+        bounds = [upper for _, upper in SCORE_RANGES[:-1]]
+        bucket_counts = np.bincount(np.digitize(scores, bounds, right=True), minlength=len(SCORE_RANGES))
+        self._score_counts = self._score_counts + bucket_counts
+
+        self.rows += len(df)
+        self._render()
+
+    def _render(self):
+        """Materialize the summary tables from the current totals"""
+        by_year = self._by_year.sort_index().fillna(0).reset_index()
+        by_year['year'] = by_year['year'].astype(int)
+        by_year['total_accidents'] = by_year['total_accidents'].astype(int)
+
+        severity = self._severity.astype(int).sort_values(ascending=False, kind='stable')
+        severity = pd.DataFrame({'severity': severity.index.astype(object), 'count': severity.to_numpy()})
+        score_ranges = pd.DataFrame({
+            'range': [label for label, _ in SCORE_RANGES],
+            'count': self._score_counts.astype(np.int64),
+        })
+
+        tables = {
+            'by_year': by_year,
+            'by_airline': self._top(self._by_make, 'make'),
+            'by_location': self._top(self._by_country, 'country'),
+            'severity_distribution': severity,
+            'target_distributions': {
+                'injury_severity': severity,
+                'severity_scores': score_ranges,
+            },
+        }
+
+        # Swap whole dicts so concurrent readers never see a partial update
+        self.tables = tables
+        self._encoded = {}
+
+    def encoded(self, name, layout='records'):
+        """Return the JSON response body of a view, encoded once per update"""
+        encoded = self._encoded
+        key = (name, layout)
+        if key not in encoded:
+            table = self.tables[name]
+            if isinstance(table, dict):
+                payload = {part: RawJSON(encode_frame(frame, layout)) for part, frame in table.items()}
+            else:
+                payload = RawJSON(encode_frame(table, layout))
+            encoded[key] = json_body(payload)
+        return encoded[key]
+
+    @staticmethod
+    def _top(totals, key):
+        """Return the TOP_N groups with the most accidents"""
+        top = totals.fillna(0).sort_values('total_accidents', ascending=False, kind='stable').head(TOP_N)
+        top = top.rename_axis(key).reset_index()
+        top['total_accidents'] = top['total_accidents'].astype(int)
+        return top
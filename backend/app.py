@@ -1,12 +1,29 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
+import re
+import threading
+import time
 import requests
 from dotenv import load_dotenv
-from ml_models import AviationMLModels
+from data_cache import DatasetCache
+from datasets import NTSB_DATA_PATH, load_served_dataset
+from joined_features import JOINED_SOURCES, load_served_joined_features
+from compaction import date_range
+from serialization import LAYOUTS, RawJSON, encode_frame, json_body
+from aggregates import AccidentAggregates
+from accident_index import AccidentIndex, FILTER_COLUMNS, decode_cursor, encode_cursor, page_after
+from accident_export import EXPORT_FORMATS, gzip_stream, iter_export
+from flight_client import AviationStackClient
+from http_cache import DEFAULT_MAX_AGE, conditional
+from model_bundle import MANIFEST_NAME
+from model_registry import BundleNotFoundError, ModelRegistry
+from memory_report import process_memory
+from plot_assets import PLOTS_DIR, PLOT_FORMATS, PLOT_SIZES, choose_format, choose_size, variant_filename
+import metrics
+from metrics import stage
 
 # Load environment variables
 load_dotenv()
@@ -15,39 +32,163 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
 # Initialize ML models
-ml_models = AviationMLModels()
-try:
-    ml_models.load_models()
+# INFERENCE_BACKEND=compiled scores requests with flat-array copies of the forests,
+# and INFERENCE_BACKEND=compact with their pruned float32 variants (compact_forests.py).
+# The registry swaps in the bundle models/bundles/CURRENT points at whenever it
+# moves (checked every MODEL_RELOAD_INTERVAL seconds), without a restart.
+model_registry = ModelRegistry(inference_backend=os.getenv('INFERENCE_BACKEND', 'sklearn'))
+if model_registry.reload(force=True):
     print("✓ ML models loaded successfully")
-except Exception as e:
-    print(f"⚠ Warning: Could not load ML models - {e}")
+else:
+    print("⚠ Warning: Could not load ML models")
     print("  Run 'python train_models.py' to train models first")
+model_registry.start_watcher()
 
-# Load datasets
-AIRLINE_ACCIDENTS_PATH = 'airline_accidents.csv'
-NTSB_DATA_PATH = 'ntsb_aviation_data.csv'
+# Parsed datasets are shared by every request and reloaded only when a file changes.
+# Run 'python datasets.py' to build columnar snapshots that load without a CSV parse.
+# Frames are held compacted (categoricals, small integers, parsed dates); see compaction.py.
+dataset_cache = DatasetCache()
+
+# Request latency and stage timings, served in Prometheus format at /api/metrics
+REQUEST_SECONDS = metrics.registry.histogram(
+    'aviation_http_request_duration_seconds', 'Time to build each API response', ('route', 'method')
+)
+REQUESTS_TOTAL = metrics.registry.counter(
+    'aviation_http_requests_total', 'API responses by route and status', ('route', 'method', 'status')
+)
+PREDICTIONS_TOTAL = metrics.registry.counter(
+    'aviation_predictions_total', 'Inputs scored by the ML models', ('route',)
+)
+
+def timed_builder(stage_name, builder):
+    """Wrap a dataset_cache view builder so its runs are timed as a stage"""
+    def build(frame):
+        with stage(stage_name):
+            return builder(frame)
+    return build
+
+@app.before_request
+def start_request_timer():
+    request.environ['metrics.start'] = time.perf_counter()
+    metrics.begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the request's latency and report its stage timings in Server-Timing"""
+    start = request.environ.get('metrics.start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    # Route templates rather than paths, so /api/plots/<plot_name> is one series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(elapsed, route=route, method=request.method)
+    REQUESTS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+    response.headers['Server-Timing'] = metrics.server_timing(metrics.request_stages(), elapsed)
+    return response
+
+@metrics.registry.collector
+def cache_metrics():
+    """Hit and miss counters of the prediction cache and the AviationStack client"""
+    prediction_cache = model_registry.prediction_cache_stats()
+    families = [
+        ('aviation_prediction_cache_hits_total', 'counter', 'Predictions answered from the cache',
+         [({}, prediction_cache['hits'])]),
+        ('aviation_prediction_cache_misses_total', 'counter', 'Predictions computed by the models',
+         [({}, prediction_cache['misses'])]),
+        ('aviation_model_reloads_total', 'counter', 'Model versions swapped in',
+         [({}, model_registry.reloads)]),
+        ('aviation_model_reload_failures_total', 'counter', 'Model versions that failed to load',
+         [({}, model_registry.reload_failures)]),
+    ]
+    if flight_client is not None:
+        stats = flight_client.stats()
+        families += [
+            ('aviation_upstream_requests_total', 'counter', 'Requests sent to the AviationStack API',
+             [({}, stats['upstream_requests'])]),
+            ('aviation_upstream_cache_hits_total', 'counter', 'AviationStack responses served from the cache',
+             [({}, stats['cache_hits'])]),
+            ('aviation_upstream_coalesced_total', 'counter', 'Callers that waited on a fetch already in flight',
+             [({}, stats['coalesced'])]),
+        ]
+    return families
+
+@metrics.registry.collector
+def memory_metrics():
+    """Resident, proportional and unique memory of this worker (Linux only)"""
+    memory = process_memory()
+    if memory is None:
+        return []
+    return [
+        ('aviation_process_memory_bytes', 'gauge', 'Memory of the serving process; uss is not shared with other workers',
+         [({'pid': os.getpid(), 'kind': kind}, value) for kind, value in memory.items()]),
+    ]
 
 def load_data():
-    """Load and cache the CSV datasets"""
+    """Return the cached CSV datasets, re-reading a file only when it changes on disk"""
     try:
-        airline_accidents = pd.read_csv(AIRLINE_ACCIDENTS_PATH, encoding='latin-1', low_memory=False)
-        ntsb_data = pd.read_csv(NTSB_DATA_PATH, encoding='latin-1', low_memory=False)
-        
-        # Clean numeric columns in airline_accidents
-        numeric_columns = ['Total Fatal Injuries', 'Total Serious Injuries', 'Total Minor Injuries', 'Total Uninjured']
-        for col in numeric_columns:
-            if col in airline_accidents.columns:
-                # Convert to string, strip whitespace, then convert to numeric
-                airline_accidents[col] = pd.to_numeric(
-                    airline_accidents[col].astype(str).str.strip(), 
-                    errors='coerce'
-                ).fillna(0)
+        with stage('data_load'):
+            # Airline accidents with their NTSB features, from the joined table
+            airline_accidents = dataset_cache.get(JOINED_SOURCES, load_served_joined_features)
+            ntsb_data = dataset_cache.get(NTSB_DATA_PATH, lambda path: load_served_dataset('ntsb_data', path))
         
         return airline_accidents, ntsb_data
     except Exception as e:
         print(f"Error loading data: {e}")
         return None, None
 
+def load_indexed_accidents():
+    """
+    Return (airline accidents, filter indexes) of the same data version, so
+    row ids from the index always address the frame they were built from
+    """
+    try:
+        with stage('data_load'):
+            return dataset_cache.frame_and_view(
+                JOINED_SOURCES,
+                load_served_joined_features,
+                'index',
+                timed_builder('filter', AccidentIndex.build)
+            )
+    except Exception as e:
+        print(f"Error building accident index: {e}")
+        return None, None
+
+def load_aggregates():
+    """Return the summary views for the current airline accidents data, built once per version"""
+    try:
+        with stage('data_load'):
+            return dataset_cache.view(
+                JOINED_SOURCES,
+                load_served_joined_features,
+                'aggregates',
+                timed_builder('aggregate', AccidentAggregates.build)
+            )
+    except Exception as e:
+        print(f"Error building aggregates: {e}")
+        return None
+
+def preload():
+    """
+    Load the datasets and build the filter indexes and summary views now.
+    gunicorn.conf.py calls this in the master so forked workers share them.
+    """
+    airline_accidents, ntsb_data = load_data()
+    load_indexed_accidents()
+    load_aggregates()
+    return airline_accidents, ntsb_data
+
+def response_layout():
+    """Return the layout requested with ?layout=records|columns, or None if it is invalid"""
+    layout = request.args.get('layout', 'records')
+    return layout if layout in LAYOUTS else None
+
+def json_response(body, status=200):
+    """Wrap an encoded JSON body (see serialization.py) in a response"""
+    return Response(body, status=status, mimetype='application/json')
+
+def invalid_layout():
+    return jsonify({'error': f"Unknown layout, expected one of {list(LAYOUTS)}"}), 400
+
 @app.route('/')
 def home():
     """API Home endpoint"""
@@ -58,10 +199,14 @@ def home():
             '/api/health': 'Health check',
             '/api/stats': 'Dataset statistics',
             '/api/accidents': 'Get accident data with filters',
+            '/api/accidents/export': 'Stream filtered accident records as NDJSON or CSV',
             '/api/accidents/by-year': 'Accidents grouped by year',
             '/api/accidents/by-airline': 'Accidents grouped by airline',
             '/api/accidents/by-location': 'Accidents grouped by location',
             '/api/predict': 'Make ML predictions (placeholder)',
+            '/api/predict/batch': 'Score a list of prediction inputs in one call',
+            '/api/metrics': 'Request and stage timings in Prometheus format',
+            '/api/models': 'Live and available model versions; POST reload, activate or rollback',
         }
     })
 
@@ -74,6 +219,7 @@ def health_check():
     })
 
 @app.route('/api/stats')
+@conditional(*JOINED_SOURCES)
 def get_stats():
     """Get overall dataset statistics"""
     airline_accidents, ntsb_data = load_data()
@@ -81,165 +227,246 @@ def get_stats():
     if airline_accidents is None or ntsb_data is None:
         return jsonify({'error': 'Failed to load data'}), 500
     
-    # Calculate total fatal injuries safely
-    total_fatal = 0
-    if 'Total Fatal Injuries' in airline_accidents.columns:
-        try:
-            # Data is already cleaned in load_data(), just sum it
-            total_fatal = int(airline_accidents['Total Fatal Injuries'].sum())
-        except Exception as e:
-            print(f"Error calculating fatal injuries: {e}")
-            total_fatal = 0
-    
-    stats = {
-        'airline_accidents': {
-            'total_records': len(airline_accidents),
-            'date_range': {
-                'start': str(airline_accidents['Event Date'].min()),
-                'end': str(airline_accidents['Event Date'].max())
-            },
-            'total_fatal_injuries': total_fatal,
-            'columns': list(airline_accidents.columns)
-        },
-        'ntsb_data': {
-            'total_records': len(ntsb_data),
-            'date_range': {
-                'start': str(ntsb_data['EVENT_LCL_DATE'].min()),
-                'end': str(ntsb_data['EVENT_LCL_DATE'].max())
+    with stage('aggregate'):
+        # Calculate total fatal injuries safely
+        total_fatal = 0
+        if 'Total Fatal Injuries' in airline_accidents.columns:
+            try:
+                # Data is already cleaned in load_data(), just sum it
+                total_fatal = int(airline_accidents['Total Fatal Injuries'].sum())
+            except Exception as e:
+                print(f"Error calculating fatal injuries: {e}")
+                total_fatal = 0
+        
+        stats = {
+            'airline_accidents': {
+                'total_records': len(airline_accidents),
+                'date_range': date_range(airline_accidents, 'Event Date'),
+                'total_fatal_injuries': total_fatal,
+                'ntsb_matched_records': int(airline_accidents['NTSB Matched'].sum()),
+                'columns': list(airline_accidents.columns)
             },
-            'columns': list(ntsb_data.columns)
+            'ntsb_data': {
+                'total_records': len(ntsb_data),
+                'date_range': date_range(ntsb_data, 'EVENT_LCL_DATE'),
+                'columns': list(ntsb_data.columns)
+            }
         }
-    }
     
-    return jsonify(stats)
+    with stage('serialize'):
+        return jsonify(stats)
+
+def accident_filters():
+    """Read the accident filter query parameters as AccidentIndex.query arguments"""
+    return {
+        # country, severity, make, aircraft_category, phase_of_flight
+        'patterns': {param: request.args.get(param) for param in FILTER_COLUMNS},
+        'year': request.args.get('year', None, type=int),
+        'date_from': request.args.get('date_from', None),
+        'date_to': request.args.get('date_to', None),
+    }
 
 @app.route('/api/accidents')
 def get_accidents():
-    """Get accident data with optional filters"""
-    airline_accidents, _ = load_data()
+    """
+    Get accident data with optional filters
+    Pages by offset, or by cursor: pass cursor= (empty) for the first page
+    and then each response's next_cursor, which costs the same at any depth
+    """
+    airline_accidents, accident_index = load_indexed_accidents()
     
-    if airline_accidents is None:
+    if airline_accidents is None or accident_index is None:
         return jsonify({'error': 'Failed to load data'}), 500
     
     # Query parameters
     limit = request.args.get('limit', 100, type=int)
     offset = request.args.get('offset', 0, type=int)
-    country = request.args.get('country', None)
-    severity = request.args.get('severity', None)
-    year = request.args.get('year', None)
-    
-    # Apply filters
-    filtered_data = airline_accidents.copy()
-    
-    if country:
-        filtered_data = filtered_data[filtered_data['Country'].str.contains(country, case=False, na=False)]
-    
-    if severity:
-        filtered_data = filtered_data[filtered_data['Injury Severity'].str.contains(severity, case=False, na=False)]
-    
-    if year:
-        filtered_data['Year'] = pd.to_datetime(filtered_data['Event Date'], errors='coerce').dt.year
-        filtered_data = filtered_data[filtered_data['Year'] == int(year)]
+    cursor = request.args.get('cursor', None)
+    filters = accident_filters()
+    year = filters['year']
+    layout = response_layout()
+    if layout is None:
+        return invalid_layout()
+    
+    # Resolve filters to matching row ids through the indexes
+    try:
+        with stage('filter'):
+            row_ids = accident_index.query(**filters)
+        after = decode_cursor(cursor) if cursor else None
+    except (re.error, ValueError) as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    
+    total = len(airline_accidents) if row_ids is None else len(row_ids)
+    
+    # Pagination - only the rows of the requested page are materialized
+    if cursor is not None:
+        page_ids = page_after(row_ids, len(airline_accidents), after, limit)
+        paginated_data = airline_accidents.iloc[page_ids]
+    elif row_ids is None:
+        page_ids = np.arange(len(airline_accidents))[offset:offset+limit]
+        paginated_data = airline_accidents.iloc[offset:offset+limit]
+    else:
+        page_ids = row_ids[offset:offset+limit]
+        paginated_data = airline_accidents.iloc[page_ids]
+    
+    # A next page exists when a matching row comes after this page's last row
+    last_id = (len(airline_accidents) - 1) if row_ids is None else (row_ids[-1] if len(row_ids) else -1)
+    next_cursor = encode_cursor(page_ids[-1]) if len(page_ids) and page_ids[-1] < last_id else None
+    
+    if year is not None:
+        # Year filtered responses have always carried the parsed year per record
+        paginated_data = paginated_data.assign(Year=year)
+    
+    with stage('serialize'):
+        # Encode the page straight to JSON; missing values are '' in records
+        # and null in the compact columns layout
+        data = encode_frame(paginated_data, layout, missing='""' if layout == 'records' else 'null')
+        
+        response = {
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+            'next_cursor': next_cursor,
+            'data': RawJSON(data)
+        }
+        if cursor is not None:
+            response['cursor'] = cursor
+        if layout != 'records':
+            response['layout'] = layout
+        body = json_body(response)
+    return json_response(body)
+
+@app.route('/api/accidents/export')
+def export_accidents():
+    """
+    Stream every accident record matching the /api/accidents filters
+    format=ndjson (default) or csv; gzip=1 compresses the stream
+    """
+    airline_accidents, accident_index = load_indexed_accidents()
     
-    # Pagination
-    total = len(filtered_data)
-    paginated_data = filtered_data.iloc[offset:offset+limit]
+    if airline_accidents is None or accident_index is None:
+        return jsonify({'error': 'Failed to load data'}), 500
     
-    # Convert to dict and handle NaN values
-    records = paginated_data.fillna('').to_dict('records')
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown format {fmt!r}, expected one of {sorted(EXPORT_FORMATS)}'}), 400
+    compress = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    filters = accident_filters()
     
-    return jsonify({
-        'total': total,
-        'limit': limit,
-        'offset': offset,
-        'data': records
+    try:
+        with stage('filter'):
+            row_ids = accident_index.query(**filters)
+    except (re.error, ValueError) as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    
+    total = len(airline_accidents) if row_ids is None else len(row_ids)
+    extra_columns = {'Year': filters['year']} if filters['year'] is not None else None
+    
+    # The generator keeps its own reference to this version of the data
+    body = iter_export(airline_accidents, row_ids, fmt, extra_columns=extra_columns)
+    # Chunks are encoded while the response streams, after the request itself is recorded
+    body = metrics.timed_stream(body, 'serialize')
+    mimetype = EXPORT_FORMATS[fmt]
+    filename = f'accidents.{fmt}'
+    if compress:
+        body = gzip_stream(body)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Total-Count': str(total),
     })
 
 @app.route('/api/accidents/by-year')
+@conditional(*JOINED_SOURCES)
 def accidents_by_year():
     """Get accidents grouped by year"""
-    airline_accidents, _ = load_data()
+    aggregates = load_aggregates()
+    layout = response_layout()
     
-    if airline_accidents is None:
+    if aggregates is None:
         return jsonify({'error': 'Failed to load data'}), 500
+    if layout is None:
+        return invalid_layout()
     
-    # Parse dates and extract year
-    airline_accidents['Event Date'] = pd.to_datetime(airline_accidents['Event Date'], errors='coerce')
-    airline_accidents['Year'] = airline_accidents['Event Date'].dt.year
-    
-    # Group by year
-    yearly_stats = airline_accidents.groupby('Year').agg({
-        'Event Id': 'count',
-        'Total Fatal Injuries': 'sum',
-        'Total Serious Injuries': 'sum',
-        'Total Minor Injuries': 'sum'
-    }).reset_index()
-    
-    yearly_stats.columns = ['year', 'total_accidents', 'fatal_injuries', 'serious_injuries', 'minor_injuries']
-    
-    # Convert to dict and handle NaN
-    result = yearly_stats.fillna(0).to_dict('records')
-    
-    return jsonify(result)
+    with stage('serialize'):
+        body = aggregates.encoded('by_year', layout)
+    return json_response(body)
 
 @app.route('/api/accidents/by-airline')
+@conditional(*JOINED_SOURCES)
 def accidents_by_airline():
     """Get accidents grouped by airline/make"""
-    airline_accidents, _ = load_data()
+    aggregates = load_aggregates()
+    layout = response_layout()
     
-    if airline_accidents is None:
+    if aggregates is None:
         return jsonify({'error': 'Failed to load data'}), 500
+    if layout is None:
+        return invalid_layout()
     
-    # Group by aircraft make
-    airline_stats = airline_accidents.groupby('Make').agg({
-        'Event Id': 'count',
-        'Total Fatal Injuries': 'sum'
-    }).reset_index().sort_values('Event Id', ascending=False).head(20)
-    
-    airline_stats.columns = ['make', 'total_accidents', 'total_fatalities']
-    
-    result = airline_stats.fillna(0).to_dict('records')
-    
-    return jsonify(result)
+    with stage('serialize'):
+        body = aggregates.encoded('by_airline', layout)
+    return json_response(body)
 
 @app.route('/api/accidents/by-location')
+@conditional(*JOINED_SOURCES)
 def accidents_by_location():
     """Get accidents grouped by country"""
-    airline_accidents, _ = load_data()
+    aggregates = load_aggregates()
+    layout = response_layout()
     
-    if airline_accidents is None:
+    if aggregates is None:
         return jsonify({'error': 'Failed to load data'}), 500
+    if layout is None:
+        return invalid_layout()
     
-    # Filter out empty/null country values
-    valid_countries = airline_accidents[airline_accidents['Country'].notna() & (airline_accidents['Country'].str.strip() != '')]
-    
-    # Group by country
-    location_stats = valid_countries.groupby('Country').agg({
-        'Event Id': 'count',
-        'Total Fatal Injuries': 'sum'
-    }).reset_index().sort_values('Event Id', ascending=False).head(20)
-    
-    location_stats.columns = ['country', 'total_accidents', 'total_fatalities']
-    
-    result = location_stats.fillna(0).to_dict('records')
-    
-    return jsonify(result)
+    with stage('serialize'):
+        body = aggregates.encoded('by_location', layout)
+    return json_response(body)
 
 @app.route('/api/accidents/severity-distribution')
+@conditional(*JOINED_SOURCES)
 def severity_distribution():
     """Get distribution of accident severities"""
-    airline_accidents, _ = load_data()
+    aggregates = load_aggregates()
+    layout = response_layout()
     
-    if airline_accidents is None:
+    if aggregates is None:
         return jsonify({'error': 'Failed to load data'}), 500
+    if layout is None:
+        return invalid_layout()
     
-    # Count by injury severity
-    severity_counts = airline_accidents['Injury Severity'].value_counts().reset_index()
-    severity_counts.columns = ['severity', 'count']
-    
-    result = severity_counts.to_dict('records')
-    
-    return jsonify(result)
+    with stage('serialize'):
+        body = aggregates.encoded('severity_distribution', layout)
+    return json_response(body)
+
+# Upper bound on inputs accepted by /api/predict/batch
+MAX_BATCH_SIZE = 10000
+
+def build_model_input(data):
+    """Extract and map prediction form data to model inputs"""
+    return {
+        'airline': data.get('airline', ''),
+        'aircraft_type': data.get('aircraft_type', ''),
+        'departure_airport': data.get('departure_airport', ''),
+        'arrival_airport': data.get('arrival_airport', ''),
+        'weather_condition': data.get('weather_condition', 'VMC'),
+        'flight_phase': data.get('flight_phase', 'CRUISE'),
+        'number_of_engines': int(data.get('number_of_engines', 2)),
+        'engine_type': data.get('engine_type', 'Jet'),
+        'hour': int(data.get('hour', -1)),  # Local departure hour, -1 when unknown
+        'month': 6,  # Default values
+        'day_of_week': 3
+    }
+
+def departure_hour(scheduled):
+    """Local hour of an ISO departure time such as '2019-12-12T04:20:00+00:00', -1 if unknown"""
+    try:
+        return datetime.fromisoformat(scheduled).hour
+    except (TypeError, ValueError):
+        return -1
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
@@ -247,28 +474,19 @@ def predict():
     try:
         data = request.json
         
-        # Extract and map form data to model inputs
-        input_data = {
-            'airline': data.get('airline', ''),
-            'aircraft_type': data.get('aircraft_type', ''),
-            'departure_airport': data.get('departure_airport', ''),
-            'arrival_airport': data.get('arrival_airport', ''),
-            'weather_condition': data.get('weather_condition', 'VMC'),
-            'flight_phase': data.get('flight_phase', 'CRUISE'),
-            'number_of_engines': int(data.get('number_of_engines', 2)),
-            'engine_type': data.get('engine_type', 'Jet'),
-            'month': 6,  # Default values
-            'day_of_week': 3
-        }
+        input_data = build_model_input(data)
         
         # Make prediction using trained models
-        prediction = ml_models.predict(input_data)
+        with stage('predict'):
+            prediction = model_registry.current().predict(input_data)
+        PREDICTIONS_TOTAL.inc(route='/api/predict')
         
-        return jsonify({
-            'message': 'Prediction generated successfully',
-            'input': data,
-            'prediction': prediction
-        })
+        with stage('serialize'):
+            return jsonify({
+                'message': 'Prediction generated successfully',
+                'input': data,
+                'prediction': prediction
+            })
     except Exception as e:
         return jsonify({
             'message': f'Error making prediction: {str(e)}',
@@ -279,111 +497,152 @@ def predict():
             }
         }), 500
 
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many prediction inputs with one pass through each model"""
+    try:
+        data = request.json
+        
+        # Accept either a bare list of inputs or {"inputs": [...]}
+        inputs = data.get('inputs') if isinstance(data, dict) else data
+        if not isinstance(inputs, list):
+            return jsonify({'message': 'Request body must be a list of inputs or {"inputs": [...]}'}), 400
+        if len(inputs) > MAX_BATCH_SIZE:
+            return jsonify({'message': f'Batch too large - at most {MAX_BATCH_SIZE} inputs per request'}), 400
+        
+        # One malformed input rejects the batch with its position, not a 500
+        input_data = []
+        for position, item in enumerate(inputs):
+            if not isinstance(item, dict):
+                return jsonify({'message': f'Input {position} must be an object', 'index': position}), 400
+            try:
+                input_data.append(build_model_input(item))
+            except (TypeError, ValueError, OverflowError) as e:
+                return jsonify({'message': f'Invalid input {position}: {e}', 'index': position}), 400
+
+        # Make predictions using trained models
+        with stage('predict'):
+            predictions = model_registry.current().predict_batch(input_data)
+        PREDICTIONS_TOTAL.inc(len(input_data), route='/api/predict/batch')
+        
+        with stage('serialize'):
+            return jsonify({
+                'message': 'Predictions generated successfully',
+                'count': len(predictions),
+                'predictions': predictions
+            })
+    except Exception as e:
+        return jsonify({
+            'message': f'Error making predictions: {str(e)}',
+            'predictions': []
+        }), 500
+
 @app.route('/api/target-distributions')
+@conditional(*JOINED_SOURCES)
 def target_distributions():
     """Get distribution of target variables used in ML training"""
     try:
-        airline_accidents, _ = load_data()
+        aggregates = load_aggregates()
+        layout = response_layout()
         
-        if airline_accidents is None:
+        if aggregates is None:
             return jsonify({'error': 'Failed to load data'}), 500
+        if layout is None:
+            return invalid_layout()
         
-        # Get Injury Severity distribution (classifier target)
-        severity_dist = airline_accidents['Injury Severity'].value_counts().reset_index()
-        severity_dist.columns = ['severity', 'count']
-        severity_dist = severity_dist.sort_values('count', ascending=False)
-        
-        # Get Severity Score distribution (regressor target)
-        # Calculate severity scores
-        data = airline_accidents.copy()
-        data['Severity_Score'] = (
-            pd.to_numeric(data['Total Fatal Injuries'], errors='coerce').fillna(0) * 3 +
-            pd.to_numeric(data['Total Serious Injuries'], errors='coerce').fillna(0) * 2 +
-            pd.to_numeric(data['Total Minor Injuries'], errors='coerce').fillna(0) * 1
-        )
-        
-        # Group severity scores into ranges for visualization
-        score_ranges = [
-            {'range': '0 (No Injuries)', 'count': int((data['Severity_Score'] == 0).sum())},
-            {'range': '1-5 (Minor)', 'count': int(((data['Severity_Score'] > 0) & (data['Severity_Score'] <= 5)).sum())},
-            {'range': '6-15 (Moderate)', 'count': int(((data['Severity_Score'] > 5) & (data['Severity_Score'] <= 15)).sum())},
-            {'range': '16-30 (Serious)', 'count': int(((data['Severity_Score'] > 15) & (data['Severity_Score'] <= 30)).sum())},
-            {'range': '31+ (Severe)', 'count': int((data['Severity_Score'] > 30).sum())}
-        ]
-        
-        return jsonify({
-            'injury_severity': severity_dist.to_dict('records'),
-            'severity_scores': score_ranges
-        })
+        # Injury Severity (classifier target) and Severity Score ranges (regressor target)
+        with stage('serialize'):
+            body = aggregates.encoded('target_distributions', layout)
+        return json_response(body)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Training artifacts served as-is; responses built from them are cached by
+# browsers and CDNs until the files change (see http_cache.py)
+PREDICTION_SAMPLES_PATH = 'models/prediction_samples.json'
+
+def live_manifest_path():
+    """Manifest of the live model bundle, or None when no bundle is loaded"""
+    bundle = model_registry.current().bundle
+    return None if bundle is None else os.path.join(bundle.path, MANIFEST_NAME)
+
 @app.route('/api/model-performance')
+@conditional(live_manifest_path)
 def model_performance():
-    """Return model performance metrics"""
+    """Return the performance metrics the live model bundle was saved with"""
     try:
-        # Load model metadata if it exists
-        import json
-        
-        metadata_path = 'models/model_metadata.json'
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-            return jsonify(metadata)
-        else:
-            # Return default/placeholder metrics
+        bundle = model_registry.current().bundle
+        if bundle is None:
             return jsonify({
-                'classifier': {
-                    'accuracy': 0.78,
-                    'model_type': 'Random Forest Classifier',
-                    'features': 8,
-                    'samples_trained': 12273
-                },
-                'regressor': {
-                    'linear_rmse': 2.85,
-                    'random_forest_rmse': 2.12,
-                    'model_type': 'Random Forest Regressor + Linear Regression',
-                    'features': 8,
-                    'samples_trained': 12273
-                },
-                'feature_importance': {
-                    'Weather Condition': 0.26,
-                    'Broad Phase of Flight': 0.26,
-                    'Number of Engines': 0.14,
-                    'Engine Type': 0.13,
-                    'Year': 0.08,
-                    'Month': 0.06,
-                    'DayOfWeek': 0.05,
-                    'Country': 0.02
-                }
-            })
+                'error': 'No model bundle loaded',
+                'message': 'Run train_models.py to train models'
+            }), 404
+        
+        metrics = bundle.manifest.get('metrics') or {}
+        features = len(bundle.feature_columns)
+        performance = {key: value for key, value in metrics.items() if key != 'timings'}
+        performance['bundle_id'] = bundle.bundle_id
+        if 'classifier' in metrics:
+            performance['classifier'] = dict(metrics['classifier'], model_type='Random Forest Classifier',
+                                             features=features)
+        if 'regressor' in metrics:
+            performance['regressor'] = dict(metrics['regressor'],
+                                            model_type='Random Forest Regressor + Linear Regression',
+                                            features=features)
+        with stage('serialize'):
+            return jsonify(performance)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/plots/<plot_name>')
 def get_plot(plot_name):
-    """Serve generated plot images"""
+    """
+    Serve generated plot images
+    ?size=small|medium|large|full or ?width=<px> picks a resolution, and
+    ?format=png|webp (or else the Accept header) picks the encoding
+    """
     try:
-        plot_path = f'models/plots/{plot_name}.png'
-        if os.path.exists(plot_path):
-            return send_file(plot_path, mimetype='image/png')
-        else:
+        size = choose_size(request.args.get('size'), request.args.get('width', None, type=int))
+        fmt = choose_format(request.args.get('format'), request.accept_mimetypes)
+        if size is None or fmt is None:
+            return jsonify({
+                'error': f"Unknown size or format, expected size in {['full', *PLOT_SIZES]} "
+                         f"and format in {list(PLOT_FORMATS)}"
+            }), 400
+        
+        plot_path = os.path.join(PLOTS_DIR, variant_filename(plot_name, size, fmt))
+        if not os.path.exists(plot_path):
+            # Plots rendered before variants existed only have the full-size PNG
+            fmt = 'png'
+            plot_path = os.path.join(PLOTS_DIR, f'{plot_name}.png')
+        if not os.path.exists(plot_path):
             return jsonify({'error': 'Plot not found'}), 404
+        
+        # send_file sets ETag/Last-Modified and answers conditional requests with 304
+        # An absolute path, since send_file resolves relative ones against the app's root_path
+        response = send_file(os.path.abspath(plot_path), mimetype=PLOT_FORMATS[fmt], conditional=True,
+                             max_age=DEFAULT_MAX_AGE)
+        response.cache_control.public = True
+        if 'format' not in request.args:
+            response.vary.add('Accept')
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/prediction-samples')
+@conditional(PREDICTION_SAMPLES_PATH)
 def prediction_samples():
     """Get prediction samples with input features and outputs, grouped by severity"""
     try:
         import json
         
-        samples_path = 'models/prediction_samples.json'
+        samples_path = PREDICTION_SAMPLES_PATH
         if os.path.exists(samples_path):
-            with open(samples_path, 'r') as f:
+            with stage('data_load'), open(samples_path, 'r') as f:
                 data = json.load(f)
             
-            return jsonify(data)
+            with stage('serialize'):
+                return jsonify(data)
         else:
             return jsonify({
                 'error': 'Prediction samples not found',
@@ -392,6 +651,34 @@ def prediction_samples():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Live flights shown on the dashboard: active flights departing the US
+REAL_FLIGHTS_PARAMS = {'limit': 50, 'flight_status': 'active', 'dep_country': 'US'}
+
+# One pooled, cached AviationStack client per process, created on first use.
+# AVIATIONSTACK_BASE_URL points it elsewhere (e.g. flight_stub.py), and
+# AVIATIONSTACK_PREFETCH=1 keeps the live flights warm in the background.
+flight_client = None
+_flight_client_lock = threading.Lock()
+
+def get_flight_client(api_key):
+    """Return the shared AviationStack client, creating it for api_key if needed"""
+    global flight_client
+    client = flight_client
+    if client is not None and client.api_key == api_key:
+        return client
+    # Created and swapped under the lock, so a cold-start burst or a key
+    # change builds one client (and one prefetch thread), not one per request
+    with _flight_client_lock:
+        client = flight_client
+        if client is None or client.api_key != api_key:
+            client = AviationStackClient.from_env(api_key)
+            if os.getenv('AVIATIONSTACK_PREFETCH', '0') == '1':
+                client.start_prefetch('flights', REAL_FLIGHTS_PARAMS)
+            if flight_client is not None:
+                flight_client.close()
+            flight_client = client
+        return client
+
 @app.route('/api/realflights')
 def get_real_flights():
     """
@@ -408,9 +695,9 @@ def get_real_flights():
         # Fetch live flights from AviationStack API
         # Using flights endpoint to get real-time flight data
         # Attempt to filter for US flights only (dep_iata for departure country or arr_iata for arrival country)
-        url = f'http://api.aviationstack.com/v1/flights?access_key={api_key}&limit=50&flight_status=active&dep_country=US'
-        
-        response = requests.get(url, timeout=10)
+        # Concurrent dashboard refreshes share one cached upstream fetch
+        with stage('upstream_fetch'):
+            response = get_flight_client(api_key).get('flights', REAL_FLIGHTS_PARAMS)
         
         if response.status_code != 200:
             return jsonify({
@@ -418,7 +705,7 @@ def get_real_flights():
                 'message': f'AviationStack API returned status {response.status_code}'
             }), 500
         
-        flight_data = response.json()
+        flight_data = response.data or {}
         
         if 'data' not in flight_data or not flight_data['data']:
             return jsonify({
@@ -426,8 +713,9 @@ def get_real_flights():
                 'message': 'AviationStack API returned no flights'
             }), 404
         
-        # Process flights and make predictions
-        predictions = []
+        # Extract flight information and model inputs for every flight
+        flights = []
+        model_inputs = []
         
         for flight in flight_data['data']:
             try:
@@ -452,35 +740,43 @@ def get_real_flights():
                     'country': 'United States',
                     'weather_condition': 'VMC',  # Default to Visual Meteorological Conditions
                     'broad_phase_of_flight': 'CRUISE',
-                    'engine_type': 'Turbo Jet'
-                }
-                
-                # Make prediction using ML models
-                prediction = ml_models.predict(model_input)
-                
-                # Combine flight info with prediction
-                result = {
-                    **flight_info,
-                    'prediction': {
-                        'severity_class': prediction.get('severity_class', 'Unknown'),
-                        'confidence': prediction.get('confidence', 0.0),
-                        'risk_level': prediction.get('risk_level', 'Unknown'),
-                        'severity_score': prediction.get('severity_score', 0.0),
-                        'class_probabilities': prediction.get('class_probabilities', [])
-                    }
+                    'engine_type': 'Turbo Jet',
+                    'hour': departure_hour(flight.get('departure', {}).get('scheduled'))
                 }
                 
-                predictions.append(result)
+                flights.append(flight_info)
+                model_inputs.append(model_input)
                 
             except Exception as flight_error:
                 print(f"Error processing flight: {flight_error}")
                 continue
         
-        return jsonify({
-            'total_flights': len(predictions),
-            'timestamp': datetime.now().isoformat(),
-            'flights': predictions
-        })
+        # Make predictions for all flights in one batch
+        with stage('predict'):
+            batch_predictions = model_registry.current().predict_batch(model_inputs)
+        PREDICTIONS_TOTAL.inc(len(model_inputs), route='/api/realflights')
+        
+        # Combine flight info with predictions
+        predictions = [
+            {
+                **flight_info,
+                'prediction': {
+                    'severity_class': prediction.get('severity_class', 'Unknown'),
+                    'confidence': prediction.get('confidence', 0.0),
+                    'risk_level': prediction.get('risk_level', 'Unknown'),
+                    'severity_score': prediction.get('severity_score', 0.0),
+                    'class_probabilities': prediction.get('class_probabilities', [])
+                }
+            }
+            for flight_info, prediction in zip(flights, batch_predictions)
+        ]
+        
+        with stage('serialize'):
+            return jsonify({
+                'total_flights': len(predictions),
+                'timestamp': datetime.now().isoformat(),
+                'flights': predictions
+            })
         
     except requests.Timeout:
         return jsonify({
@@ -493,6 +789,74 @@ def get_real_flights():
             'message': str(e)
         }), 500
 
+# Model admin calls need "Authorization: Bearer <MODEL_ADMIN_TOKEN>" and
+# are disabled while MODEL_ADMIN_TOKEN is unset
+MODEL_ADMIN_TOKEN = os.getenv('MODEL_ADMIN_TOKEN')
+
+def model_admin_denied():
+    """Return an error response unless the request carries the admin token"""
+    if not MODEL_ADMIN_TOKEN:
+        return jsonify({'error': 'Model administration is disabled - set MODEL_ADMIN_TOKEN'}), 403
+    if request.headers.get('Authorization') != f'Bearer {MODEL_ADMIN_TOKEN}':
+        return jsonify({'error': 'Invalid admin token'}), 401
+    return None
+
+@app.route('/api/models')
+def model_versions():
+    """Live model bundle, the bundle CURRENT points at and every published bundle"""
+    return jsonify(model_registry.status())
+
+@app.route('/api/models/reload', methods=['POST'])
+def reload_models():
+    """Load the bundle CURRENT points at now instead of on the watcher's next check"""
+    denied = model_admin_denied()
+    if denied:
+        return denied
+    
+    reloaded = model_registry.reload()
+    if model_registry.last_error:
+        return jsonify({'error': model_registry.last_error, **model_registry.status()}), 500
+    return jsonify({'reloaded': reloaded, **model_registry.status()})
+
+@app.route('/api/models/activate', methods=['POST'])
+def activate_model():
+    """Serve a bundle by id: {"bundle_id": "..."}"""
+    denied = model_admin_denied()
+    if denied:
+        return denied
+    
+    data = request.get_json(silent=True) or {}
+    bundle_id = data.get('bundle_id')
+    if not bundle_id:
+        return jsonify({'error': 'Request body must be {"bundle_id": "..."}'}), 400
+    try:
+        model_registry.activate(bundle_id)
+    except BundleNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(model_registry.status())
+
+@app.route('/api/models/rollback', methods=['POST'])
+def rollback_model():
+    """Serve the bundle written before the live one"""
+    denied = model_admin_denied()
+    if denied:
+        return denied
+    
+    try:
+        model_registry.rollback()
+    except BundleNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(model_registry.status())
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Request latency, stage timings and cache counters in Prometheus text format"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     print("Starting Aviation ML API...")
     print("Loading datasets...")
@@ -0,0 +1,311 @@
+"""
+Reproducible performance benchmarks
+
+Generates synthetic datasets (see synthetic_data.py) at each scale, trains
+models on them and times the data loading, preprocessing, training and
+prediction paths and every API route through Flask's test client. The
+AviationStack API is replaced by the local stub in flight_stub.py, so no
+real datasets, API key or network access are needed.
+
+    python benchmarks.py [--scales 1 10 100] [--base-rows 5000] [--repeat 20]
+                         [--output results.json] [--compare baseline.json]
+
+Results are written as JSON: p50/p99/mean latency, throughput and peak
+traced memory per benchmark and scale. --compare prints the ratios against
+an earlier results file and exits non-zero when any p50 slowed down more
+than --max-slowdown.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from importlib import metadata
+
+import numpy as np
+
+from datasets import load_dataset
+from flight_stub import StubServer, sample_flights
+from ml_models import AviationMLModels
+from synthetic_data import BASE_ROWS, write_datasets
+
+BENCHMARK_SCALES = [1, 10, 100]
+DEFAULT_REPEAT = 20
+
+# Model fits are slow and their timing varies little between runs
+TRAINING_REPEAT = 1
+
+PREDICTION_INPUT = {
+    'month': 6,
+    'day_of_week': 3,
+    'number_of_engines': 2,
+    'country': 'United States',
+    'weather_condition': 'IMC',
+    'broad_phase_of_flight': 'APPROACH',
+    'engine_type': 'Turbo Fan',
+}
+
+PREDICT_FORM = {
+    'airline': 'Delta Air Lines',
+    'aircraft_type': 'B738',
+    'weather_condition': 'IMC',
+    'flight_phase': 'APPROACH',
+    'number_of_engines': 2,
+    'engine_type': 'Turbo Fan',
+}
+
+# (method, path, JSON body) of every route, with the filters the dashboard uses
+ROUTES = [
+    ('GET', '/', None),
+    ('GET', '/api/health', None),
+    ('GET', '/api/stats', None),
+    ('GET', '/api/accidents?limit=100', None),
+    ('GET', '/api/accidents?limit=100&offset=100&country=United%20States&severity=Fatal', None),
+    ('GET', '/api/accidents?limit=100&cursor=&layout=columns', None),
+    ('GET', '/api/accidents/export?format=ndjson', None),
+    ('GET', '/api/accidents/export?format=csv&gzip=1', None),
+    ('GET', '/api/accidents/by-year', None),
+    ('GET', '/api/accidents/by-airline', None),
+    ('GET', '/api/accidents/by-location', None),
+    ('GET', '/api/accidents/severity-distribution', None),
+    ('GET', '/api/target-distributions', None),
+    ('GET', '/api/model-performance', None),
+    ('GET', '/api/plots/regressor_comparison', None),
+    ('GET', '/api/prediction-samples', None),
+    ('GET', '/api/realflights', None),
+    ('POST', '/api/predict', PREDICT_FORM),
+    ('POST', '/api/predict/batch', {'inputs': [PREDICT_FORM] * 100}),
+]
+
+
+def quiet():
+    """Silence the status output of the code under test"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def measure(fn, repeat, setup=None):
+    """
+    Call fn repeat times and return (per-call seconds, peak traced bytes).
+    setup runs untimed before every call. Peak memory comes from one extra
+    call under tracemalloc, which would otherwise slow the timed calls.
+    """
+    latencies = []
+    with quiet():
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - start)
+
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return latencies, peak
+
+
+def summarize(name, scale, rows, latencies, peak, **extra):
+    """Build one result record from the latencies of a benchmark"""
+    ms = np.array(latencies) * 1000
+    total = sum(latencies)
+    result = {
+        'name': name,
+        'scale': scale,
+        'rows': rows,
+        'iterations': len(latencies),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'throughput_per_s': round(len(latencies) / total, 3) if total else None,
+        'rows_per_s': round(rows * len(latencies) / total, 1) if total else None,
+        'peak_memory_bytes': peak,
+    }
+    result.update(extra)
+    print(f"  {name:<70} p50 {result['p50_ms']:>10.3f} ms  p99 {result['p99_ms']:>10.3f} ms  "
+          f"peak {peak / 1e6:>8.1f} MB")
+    return result
+
+
+def train_models(df, repeat):
+    """Time both trainers on df and save the fitted models as the current bundle"""
+    # train_models.py pulls in matplotlib, so only import it when benchmarking training
+    from train_models import generate_plots
+
+    ml_models = AviationMLModels()
+    timings = {}
+    for name, train in [('train_severity_classifier', ml_models.train_severity_classifier),
+                        ('train_severity_regressor', ml_models.train_severity_regressor)]:
+        timings[name] = measure(lambda: train(df=df), repeat)
+
+    with quiet():
+        classifier_results = ml_models.train_severity_classifier(df=df)
+        regressor_results = ml_models.train_severity_regressor(df=df)
+        # Plots and models are saved untimed so /api/plots and the app serve real files
+        generate_plots(classifier_results, regressor_results, regressor_results.get('X_test'),
+                       regressor_results.get('y_test'), regressor_results.get('y_pred_linear'),
+                       regressor_results.get('y_pred_rf'))
+        ml_models.save_models('models')
+    return timings
+
+
+def run_scale(scale, base_rows, repeat, workdir):
+    """Run every benchmark against synthetic data of one scale written to workdir"""
+    rows = write_datasets(workdir, scale, base_rows)['airline_accidents']
+    os.chdir(workdir)
+    print(f"\nScale {scale}x ({rows} airline accident rows)")
+
+    # app loads models and reads datasets relative to the working directory
+    with quiet():
+        import app as api
+
+    results = []
+
+    def record(name, latencies, peak, row_count=rows, **extra):
+        results.append(summarize(name, scale, row_count, latencies, peak, **extra))
+
+    record('load_data (cold)', *measure(api.load_data, repeat, setup=api.dataset_cache.clear))
+    record('load_data (cached)', *measure(api.load_data, repeat))
+
+    with quiet():
+        df = load_dataset('airline_accidents', parse_dates=True)
+    record('AviationMLModels.preprocess_data', *measure(lambda: AviationMLModels().preprocess_data(df), repeat))
+
+    timings = train_models(df, TRAINING_REPEAT)
+    for name, (latencies, peak) in timings.items():
+        record(f'AviationMLModels.{name}', latencies, peak)
+
+    with quiet():
+        api.model_registry.reload(force=True)
+        api.dataset_cache.clear()
+
+    # Uncached scoring: the prediction cache is emptied before every call
+    models = api.model_registry.current()
+    clear_cache = lambda: models.prediction_cache.invalidate(models.model_version)
+    predict = lambda: models.predict(PREDICTION_INPUT)
+    record('AviationMLModels.predict', *measure(predict, repeat, setup=clear_cache), row_count=1)
+    record('AviationMLModels.predict (cached)', *measure(predict, repeat), row_count=1)
+
+    client = api.app.test_client()
+    for method, path, body in ROUTES:
+        def call():
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            response.close()
+            return response.status_code
+
+        # The first request builds the cached frames and views; time the warm path
+        with quiet():
+            status = call()
+        record(f'{method} {path}', *measure(call, repeat), status=status)
+
+    return results
+
+
+def environment():
+    """Describe the code and machine a result file was produced on"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'git_commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        **{package: metadata.version(package) for package in ('pandas', 'numpy', 'scikit-learn', 'flask')},
+    }
+
+
+def run(scales, base_rows=BASE_ROWS, repeat=DEFAULT_REPEAT):
+    """Run the benchmarks at every scale and return the results document"""
+    stub = StubServer(sample_flights(), port=0).start()
+    os.environ['AVIATIONSTACK_API_KEY'] = 'benchmark'
+    os.environ['AVIATIONSTACK_BASE_URL'] = stub.base_url
+    os.environ['AVIATIONSTACK_PREFETCH'] = '0'
+
+    start_dir = os.getcwd()
+    results = []
+    try:
+        for scale in scales:
+            with tempfile.TemporaryDirectory(prefix=f'aviation-bench-{scale}x-') as workdir:
+                try:
+                    results.extend(run_scale(scale, base_rows, repeat, workdir))
+                finally:
+                    os.chdir(start_dir)
+    finally:
+        stub.stop()
+
+    return {
+        'environment': environment(),
+        'base_rows': base_rows,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(current, baseline, max_slowdown=None):
+    """
+    Print p50 and peak memory ratios of current against baseline results.
+    Returns False when a p50 slowed down by more than max_slowdown.
+    """
+    previous = {(r['scale'], r['name']): r for r in baseline['results']}
+    ok = True
+    print(f"\nCompared with {baseline['environment'].get('git_commit') or 'baseline'}:")
+    for result in current['results']:
+        before = previous.get((result['scale'], result['name']))
+        if before is None or not before['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms']
+        memory = result['peak_memory_bytes'] / before['peak_memory_bytes'] if before['peak_memory_bytes'] else None
+        regressed = max_slowdown is not None and ratio > max_slowdown
+        ok = ok and not regressed
+        marker = '✗' if regressed else '✓'
+        memory_text = f'{memory:.2f}x' if memory is not None else 'n/a'
+        print(f"  {marker} {result['scale']}x {result['name']:<66} p50 {ratio:.2f}x  peak memory {memory_text}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark data loading, training, prediction and API routes')
+    parser.add_argument('--scales', type=float, nargs='+', default=BENCHMARK_SCALES,
+                        help='dataset sizes as multiples of --base-rows')
+    parser.add_argument('--base-rows', type=int, default=BASE_ROWS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='timed calls per benchmark')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--max-slowdown', type=float,
+                        help='with --compare, fail when a p50 grew by more than this ratio')
+    args = parser.parse_args()
+
+    scales = [int(scale) if scale == int(scale) else scale for scale in args.scales]
+    document = run(scales, args.base_rows, args.repeat)
+
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"\n✓ Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if not compare(document, baseline, args.max_slowdown):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
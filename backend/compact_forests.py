@@ -0,0 +1,296 @@
+"""
+Compact forest export for latency-critical serving
+
+The served forests are fit with 100 trees of depth 10. This tool compiles
+smaller variants of the current bundle's forests (see forest_engine.py):
+
+    - fewer trees and shallower depths, from --trees and --depths
+    - splits pruned when both leaves predict within --prune of each other
+      (a probability for the classifier, a fraction of the output range
+      for the regressor)
+    - float32 thresholds (lossless, see forest_engine) and leaf values
+
+Every variant is scored on the rows the bundle's own training held out
+(see held_out_rows), for accuracy or RMSE, single-row and batch latency,
+and size. For each forest
+the cheapest variant within --max-accuracy-drop / --max-rmse-increase of
+the exact forest is saved next to the models in a new bundle, together
+with the report of every variant. Serve it with INFERENCE_BACKEND=compact.
+
+    python compact_forests.py [--trees 10 25 50 100] [--depths 4 6 8 10]
+                              [--prune 0 0.01 0.05] [--no-activate]
+"""
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+
+from datasets import read_airline_accidents_chunks
+from forest_engine import CompiledForest
+from incremental_training import MIN_HOLDOUT_ROWS, WatermarkError, records_since
+from joined_features import load_training_dataset
+from ml_models import AviationMLModels, _regression_split, _split
+from model_bundle import ModelBundle, write_bundle
+from streaming_training import chunk_test_mask
+
+DEFAULT_TREES = [10, 25, 50, 100]
+DEFAULT_DEPTHS = [4, 6, 8, 10]
+DEFAULT_PRUNE = [0.0, 0.01, 0.05]
+
+# Largest loss a compact variant may have against the exact forest
+DEFAULT_MAX_ACCURACY_DROP = 0.01
+DEFAULT_MAX_RMSE_INCREASE = 0.02  # relative
+
+# Latency is the median of this many calls
+LATENCY_REPEAT = 50
+BATCH_ROWS = 256
+
+
+def _lineage_chain(bundle, directory):
+    """
+    The bundles whose training runs produced bundle's trees, newest first:
+    incremental bundles back to the full or streaming run they started from
+    """
+    chain = [bundle]
+    while chain[-1].lineage.get('mode') == 'incremental':
+        parent = chain[-1].lineage.get('parent')
+        if parent is None:
+            raise WatermarkError(f'Incremental bundle {chain[-1].bundle_id} does not name its parent')
+        chain.append(ModelBundle.open(parent, directory, verify=False))
+    return chain
+
+
+def _segment_held_out(ml_models, df, root):
+    """
+    Held-out feature rows of one training run on df: the split of a full run,
+    or of an incremental run's new records (none below MIN_HOLDOUT_ROWS)
+    """
+    features = ml_models.build_training_features(df)
+    if features['feature_columns'] != ml_models.feature_columns:
+        raise WatermarkError(f"Dataset has features {features['feature_columns']}, "
+                             f"the bundle has {ml_models.feature_columns}")
+    X, score = features['X'], features['severity_score']
+    if root:
+        _, test = _split(len(X))
+        _, regression_test = _regression_split(features)
+    else:
+        test = _split(len(X))[1] if len(X) >= MIN_HOLDOUT_ROWS else np.arange(0)
+        regression_test = test[~np.isnan(score[test])]
+    return (X[test], features['severity'][test]), (X[regression_test], score[regression_test])
+
+
+def _streaming_held_out(ml_models, lineage):
+    """Recreate the per-chunk held-out rows of a streaming run from its sources"""
+    if 'rows' not in lineage:
+        raise WatermarkError('The streaming run did not record its sources; retrain it first')
+    sources = lineage['sources']
+    remaining = lineage['rows']
+    classifier, regressor = [], []
+    for index, chunk in enumerate(read_airline_accidents_chunks(sources, lineage['chunk_size'])):
+        if remaining <= 0:
+            break
+        if len(chunk) > remaining and len(sources) > 1:
+            # Rows appended to an earlier file shift every later chunk
+            raise WatermarkError(f'{", ".join(sources)} changed since the streaming run')
+        chunk = chunk.iloc[:remaining]
+        remaining -= len(chunk)
+        features = ml_models.build_training_features(chunk)
+        X, score = features['X'], features['severity_score']
+        test = chunk_test_mask(index, len(X))
+        regression_test = test & ~np.isnan(score)
+        classifier.append((X[test], np.asarray(features['severity'], dtype=str)[test]))
+        regressor.append((X[regression_test], score[regression_test]))
+    if remaining > 0:
+        raise WatermarkError(f"{', '.join(sources)} have fewer rows than the {lineage['rows']} trained on")
+    return classifier, regressor
+
+
+def held_out_rows(ml_models, directory):
+    """
+    The rows no tree of ml_models' bundle was trained on, as
+    {'rf_classifier': (X, y), 'rf_regressor': (X, y)}: the held-out split
+    of every run in the bundle's lineage, each taken of the rows that run
+    trained on (up to its watermark), not of the dataset as it is now.
+    Raises WatermarkError when the dataset is no longer the one trained on.
+    """
+    chain = _lineage_chain(ml_models.bundle, directory)
+    root = chain[-1].lineage
+    if root.get('mode') == 'streaming':
+        classifier, regressor = _streaming_held_out(ml_models, root)
+    else:
+        if 'watermark' not in root:
+            raise WatermarkError(f'Bundle {chain[-1].bundle_id} has no training watermark; retrain first')
+        df = load_training_dataset()
+        records_since(df, ml_models.bundle.lineage['watermark'])
+        classifier, regressor = [], []
+        start = 0
+        for bundle in reversed(chain):
+            rows = bundle.lineage['watermark']['rows']
+            if rows > start or bundle is chain[-1]:
+                held_out = _segment_held_out(ml_models, df.iloc[start:rows], root=bundle is chain[-1])
+                classifier.append(held_out[0])
+                regressor.append(held_out[1])
+            start = rows
+
+    def stack(parts):
+        return np.concatenate([X for X, _ in parts]), np.concatenate([y for _, y in parts])
+
+    return {'rf_classifier': stack(classifier), 'rf_regressor': stack(regressor)}
+
+
+def _median_ms(fn, repeat=LATENCY_REPEAT):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies) * 1000)
+
+
+def evaluate(forest, X, y):
+    """Score a forest (sklearn or compiled) on held-out rows; returns a report entry"""
+    is_classifier = getattr(forest, 'classes_', None) is not None
+    score = forest.predict_proba if is_classifier else forest.predict
+    entry = {
+        'latency_ms': _median_ms(lambda: score(X[:1])),
+        f'batch_{BATCH_ROWS}_ms': _median_ms(lambda: score(X[:BATCH_ROWS])),
+    }
+    predicted = forest.predict(X)
+    if is_classifier:
+        entry['accuracy'] = float(accuracy_score(y, predicted))
+    else:
+        entry['rmse'] = float(np.sqrt(np.mean((predicted - y) ** 2)))
+    return entry
+
+
+def tradeoff_curve(forest, X, y, trees, depths, prune):
+    """
+    Compile and score every (trees, depth, prune) variant of a forest.
+    Returns (report entries, {variant key: CompiledForest}), exact forest first
+    """
+    exact = CompiledForest.from_sklearn(forest)
+    # Regressor pruning tolerances are a fraction of the range of its outputs
+    scale = 1.0 if exact.is_classifier else float(np.ptp(exact.values))
+
+    entries = [
+        {'variant': 'sklearn', 'trees': len(forest.estimators_), 'max_depth': exact.max_depth,
+         'prune': 0.0, 'dtype': 'float64', **evaluate(forest, X, y)},
+        {'variant': 'exact', 'trees': exact.n_estimators, 'max_depth': exact.max_depth,
+         'prune': 0.0, 'dtype': 'float64', 'bytes': exact.nbytes, **evaluate(exact, X, y)},
+    ]
+    variants = {}
+    for n_trees, depth, tolerance in itertools.product(trees, depths, prune):
+        if n_trees > exact.n_estimators or depth > exact.max_depth:
+            continue
+        compiled = CompiledForest.from_sklearn(
+            forest, n_estimators=n_trees, max_depth=depth,
+            prune_tolerance=tolerance * scale if tolerance else None, compact_dtypes=True
+        )
+        key = f'{n_trees}x{depth}/{tolerance:g}'
+        variants[key] = compiled
+        entries.append({'variant': key, 'trees': n_trees, 'max_depth': compiled.max_depth, 'prune': tolerance,
+                        'dtype': 'float32', 'bytes': compiled.nbytes, **evaluate(compiled, X, y)})
+    return entries, variants
+
+
+def choose_variant(entries, max_accuracy_drop, max_rmse_increase):
+    """
+    Return the cheapest variant within the allowed loss, or None.
+    Cost is the tree levels walked per row (trees x depth), then size:
+    latency follows it, and is too noisy below a millisecond to rank by.
+    """
+    exact = entries[1]
+    eligible = []
+    for entry in entries[2:]:
+        if 'accuracy' in entry:
+            within = entry['accuracy'] >= exact['accuracy'] - max_accuracy_drop
+        else:
+            within = entry['rmse'] <= exact['rmse'] * (1 + max_rmse_increase)
+        if within:
+            eligible.append(entry)
+    if not eligible:
+        return None
+    return min(eligible, key=lambda entry: (entry['trees'] * entry['max_depth'], entry['bytes']))['variant']
+
+
+def print_curve(name, entries, chosen):
+    metric = 'accuracy' if 'accuracy' in entries[0] else 'rmse'
+    print(f"\n{name}")
+    print(f"  {'variant':<14}{metric:>9}{'1 row ms':>10}{f'{BATCH_ROWS} rows ms':>14}{'size KB':>10}")
+    for entry in entries:
+        size = f"{entry['bytes'] / 1024:10.0f}" if 'bytes' in entry else f"{'-':>10}"
+        marker = '  <- chosen' if entry['variant'] == chosen else ''
+        print(f"  {entry['variant']:<14}{entry[metric]:9.4f}{entry['latency_ms']:10.3f}"
+              f"{entry[f'batch_{BATCH_ROWS}_ms']:14.3f}{size}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export latency-optimized compact forests of the current models')
+    parser.add_argument('--trees', type=int, nargs='+', default=DEFAULT_TREES)
+    parser.add_argument('--depths', type=int, nargs='+', default=DEFAULT_DEPTHS)
+    parser.add_argument('--prune', type=float, nargs='+', default=DEFAULT_PRUNE,
+                        help='pruning tolerances to try; 0 disables pruning')
+    parser.add_argument('--max-accuracy-drop', type=float, default=DEFAULT_MAX_ACCURACY_DROP,
+                        help='largest classifier accuracy loss allowed (absolute)')
+    parser.add_argument('--max-rmse-increase', type=float, default=DEFAULT_MAX_RMSE_INCREASE,
+                        help='largest regressor RMSE increase allowed (relative)')
+    parser.add_argument('--report', default=None, help='also write the tradeoff report to this JSON file')
+    parser.add_argument('--no-activate', action='store_true',
+                        help='save the new bundle without pointing CURRENT at it')
+    parser.add_argument('--dir', default='models', help='models directory')
+    args = parser.parse_args()
+
+    ml_models = AviationMLModels()
+    if not ml_models.load_models(args.dir) or ml_models.bundle is None:
+        print("✗ No model bundle to compact - run 'python train_models.py' first")
+        return
+    parent = ml_models.bundle
+
+    try:
+        held_out = held_out_rows(ml_models, args.dir)
+    except (WatermarkError, ValueError) as e:
+        # ValueError: category values the bundle's encoders have not seen
+        print(f"✗ The dataset no longer matches bundle {parent.bundle_id} ({e}) - retrain first")
+        return
+
+    forests = {
+        'rf_classifier': (ml_models.random_forest_classifier, *held_out['rf_classifier']),
+        'rf_regressor': (ml_models.random_forest_regressor, *held_out['rf_regressor']),
+    }
+    print(f"Evaluating compact variants of bundle {parent.bundle_id} on held-out rows...")
+
+    report = {'parent': parent.bundle_id, 'max_accuracy_drop': args.max_accuracy_drop,
+              'max_rmse_increase': args.max_rmse_increase, 'forests': {}}
+    compact = {}
+    for name, (forest, X_test, y_test) in forests.items():
+        entries, variants = tradeoff_curve(forest, X_test, y_test, args.trees, args.depths, args.prune)
+        chosen = choose_variant(entries, args.max_accuracy_drop, args.max_rmse_increase)
+        print_curve(name, entries, chosen)
+        if chosen is None:
+            print(f"✗ No variant of {name} is within the allowed loss - widen --trees/--depths or the limits")
+            return
+        compact[name] = variants[chosen]
+        report['forests'][name] = {'chosen': chosen, 'curve': entries}
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Saved tradeoff report to {args.report}")
+
+    # Same models and watermark, so incremental training can continue from this bundle
+    lineage = dict(parent.lineage, parent=parent.bundle_id,
+                   root=parent.lineage.get('root') or parent.bundle_id, compacted=True)
+    bundle_id = write_bundle(ml_models, args.dir, metrics=parent.manifest.get('metrics'),
+                             make_current=not args.no_activate, lineage=lineage,
+                             compact=compact, compact_report=report)
+    print(f"\n✓ Saved compact forests with the models in {args.dir}/bundles/{bundle_id}/")
+    if args.no_activate:
+        print(f"  Serve it with: POST /api/models/activate {{\"bundle_id\": \"{bundle_id}\"}}")
+    print("  Set INFERENCE_BACKEND=compact to score requests with them")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Compact in-memory representation of the served accident frames
+
+Low-cardinality text columns become categoricals, whole-number count
+columns are downcast to the smallest integer type, date columns are parsed
+once into datetime64, and columns no response contains can be dropped.
+Which columns get which treatment is configured per dataset in
+datasets.DATASETS.
+"""
+import numpy as np
+import pandas as pd
+
+# A text column is only made categorical when it has at most this many
+# distinct values per row; for near-unique columns the codes cost more
+MAX_CATEGORY_RATIO = 0.5
+
+# Formats tried for date columns; the first one every value round-trips
+# through is kept, so dates can be rendered exactly as they were read
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%d-%b-%y', '%m/%d/%y', '%d/%m/%Y']
+
+# Format for dates that were already parsed before compaction
+ISO_DATE_FORMAT = '%Y-%m-%d'
+
+
+def _detect_date_format(series):
+    """Return the format all distinct values of a text column round-trip through, or None"""
+    values = pd.Index(series.dropna().unique()).astype(str)
+    if len(values) == 0:
+        return None
+    for fmt in DATE_FORMATS:
+        parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+        if parsed.isna().any():
+            continue
+        if (parsed.strftime(fmt) == values).all():
+            return fmt
+    return None
+
+
+def _parse_dates(series, fmt):
+    """
+    Parse a text date column in fmt. With two-digit years ('%y'), pandas
+    reads 00-68 as 20xx; dates that land in the future are moved back a
+    century, as joined_features does for the NTSB event dates.
+    """
+    parsed = pd.to_datetime(series, format=fmt, errors='coerce')
+    if '%y' in fmt:
+        future = parsed > pd.Timestamp.now()
+        if future.any():
+            parsed = parsed.mask(future, parsed[future] - pd.DateOffset(years=100))
+    return parsed
+
+
+def _downcast_counts(series):
+    """Downcast a column of whole numbers to the smallest integer type, or return None"""
+    values = pd.to_numeric(series, errors='coerce')
+    if values.isna().any() or not np.all(np.mod(values.to_numpy(), 1) == 0):
+        return None
+    return pd.to_numeric(values.astype(np.int64), downcast='unsigned' if values.min() >= 0 else 'integer')
+
+
+def compact_frame(df, categorical_columns=(), count_columns=(), date_columns=(), drop_columns=()):
+    """
+    Return (compacted frame, report). The report maps every changed column
+    to {'before', 'after', 'dtype'} in bytes; dropped columns have after 0.
+    Formats of parsed date columns are kept in frame.attrs['date_formats']
+    for format_dates().
+    """
+    before = df.memory_usage(index=False, deep=True)
+    changed = {}
+    date_formats = {}
+
+    present = [col for col in drop_columns if col in df.columns]
+    df = df.drop(columns=present)
+
+    for col in categorical_columns:
+        if col not in df.columns or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if df[col].nunique(dropna=True) <= MAX_CATEGORY_RATIO * max(len(df), 1):
+            changed[col] = df[col].astype('category')
+
+    for col in count_columns:
+        if col in df.columns:
+            downcast = _downcast_counts(df[col])
+            if downcast is not None:
+                changed[col] = downcast
+
+    for col in date_columns:
+        if col not in df.columns:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            date_formats[col] = ISO_DATE_FORMAT
+            continue
+        fmt = _detect_date_format(df[col])
+        if fmt is None:
+            # Keep text dates that do not parse losslessly as they are
+            continue
+        changed[col] = _parse_dates(df[col], fmt)
+        date_formats[col] = fmt
+
+    if changed:
+        df = df.assign(**changed)
+    df.attrs['date_formats'] = date_formats
+
+    after = df.memory_usage(index=False, deep=True)
+    report = {
+        col: {'before': int(before[col]), 'after': 0, 'dtype': None}
+        for col in present
+    }
+    for col in changed:
+        report[col] = {'before': int(before[col]), 'after': int(after[col]), 'dtype': str(df[col].dtype)}
+
+    return df, report
+
+
+def format_dates(frame):
+    """
+    Render the parsed date columns of a (page of a) compacted frame back to
+    text in their original format; missing dates become NaN
+    """
+    formats = frame.attrs.get('date_formats', {})
+    rendered = {
+        col: frame[col].dt.strftime(fmt)
+        for col, fmt in formats.items()
+        if col in frame.columns and pd.api.types.is_datetime64_any_dtype(frame[col].dtype)
+    }
+    return frame.assign(**rendered) if rendered else frame
+
+
+def date_range(frame, column):
+    """First and last value of a date column, rendered in its original format"""
+    fmt = frame.attrs.get('date_formats', {}).get(column)
+    values = frame[column]
+    if fmt is None or not pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return {'start': str(values.min()), 'end': str(values.max())}
+    start, end = values.min(), values.max()
+    return {
+        'start': 'NaT' if pd.isna(start) else start.strftime(fmt),
+        'end': 'NaT' if pd.isna(end) else end.strftime(fmt),
+    }
+
+
+def json_ready(frame):
+    """Turn categorical and date columns of a page back into plain values for JSON"""
+    frame = format_dates(frame)
+    categorical = {
+        col: frame[col].astype(object)
+        for col in frame.columns
+        if isinstance(frame[col].dtype, pd.CategoricalDtype)
+    }
+    return frame.assign(**categorical) if categorical else frame
+
+
+def print_report(name, report):
+    """Print the bytes saved per column by compact_frame"""
+    if not report:
+        return
+    saved = sum(entry['before'] - entry['after'] for entry in report.values())
+    print(f"✓ Compacted {name}: {saved / 1e6:.1f} MB saved")
+    for col, entry in sorted(report.items(), key=lambda item: item[1]['before'] - item[1]['after'], reverse=True):
+        change = 'dropped' if entry['dtype'] is None else entry['dtype']
+        print(f"    {col:<28} {entry['before']:>12,} -> {entry['after']:>12,} bytes ({change})")
@@ -0,0 +1,137 @@
+"""
+Process-wide, read-only cache for the accident datasets
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Copy-on-write makes shallow copies of a cached frame safe to hand out:
+# any write through a copy (new column, .loc assignment, .values) copies the
+# touched data first instead of modifying the shared frame. pandas 3 always
+# behaves this way and no longer accepts the option.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+def file_signature(path):
+    """Return (mtime_ns, size) of a file - changes whenever the file is rewritten"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def source_signature(path):
+    """
+    Return the signature of a cache key: one file's, or a tuple of every
+    file's for a dataset derived from several (a tuple of paths)
+    """
+    if isinstance(path, tuple):
+        return tuple(file_signature(source) for source in path)
+    return file_signature(path)
+
+
+def _is_append(old_frame, new_frame):
+    """Check whether new_frame is old_frame with extra rows at the end"""
+    old_rows = len(old_frame)
+    if old_rows == 0 or len(new_frame) <= old_rows:
+        return False
+    if list(old_frame.columns) != list(new_frame.columns):
+        return False
+    if not old_frame.dtypes.equals(new_frame.dtypes):
+        return False
+    # Every previously loaded row must be unchanged, not just the boundary:
+    # a file edited in the middle and then appended to is not an append
+    old_hashes = pd.util.hash_pandas_object(old_frame, index=False).to_numpy()
+    new_hashes = pd.util.hash_pandas_object(new_frame.iloc[:old_rows], index=False).to_numpy()
+    return np.array_equal(old_hashes, new_hashes)
+
+
+def _carry_over_views(old_entry, frame):
+    """
+    Extend the views of a reloaded dataset that can absorb appended rows.
+    Views define appended(new_rows), which returns a new view and leaves
+    the old one untouched for requests still reading it.
+    """
+    if old_entry is None or not _is_append(old_entry['frame'], frame):
+        return {}
+
+    new_rows = frame.iloc[len(old_entry['frame']):].copy(deep=False)
+    views = {}
+    for name, view in old_entry['views'].items():
+        if hasattr(view, 'appended'):
+            views[name] = view.appended(new_rows)
+    return views
+
+
+class DatasetCache:
+    """Load each dataset once per process and reload it when the file changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, path, loader):
+        """Return the current cache entry for path, (re)loading it if needed"""
+        signature = source_signature(path)
+        entry = self._entries.get(path)
+
+        if entry is None or entry['signature'] != signature:
+            with self._lock:
+                # Another thread may have reloaded while we waited for the lock
+                entry = self._entries.get(path)
+                if entry is None or entry['signature'] != signature:
+                    frame = loader(path)
+                    views = _carry_over_views(entry, frame)
+                    entry = {'signature': signature, 'frame': frame, 'views': views}
+                    self._entries[path] = entry
+
+        return entry
+
+    def get(self, path, loader):
+        """
+        Return the frame stored for path, calling loader(path) to (re)build it
+        when the file is new or its mtime/size changed since the last load.
+        path may be a tuple of files; any of them changing reloads the frame.
+        Callers receive a shallow copy, so they can add or replace columns
+        without ever touching the cached frame.
+        """
+        return self._entry(path, loader)['frame'].copy(deep=False)
+
+    def view(self, path, loader, name, builder):
+        """
+        Return a derived object built once per version of the dataset at path.
+        builder(frame) runs the first time the view is requested after a
+        (re)load. Views that define appended(new_rows) are extended instead
+        of rebuilt when the file only gained rows at the end.
+        """
+        return self._view(self._entry(path, loader), name, builder)
+
+    def frame_and_view(self, path, loader, name, builder):
+        """
+        Return (frame, view) from the same version of the dataset, for
+        callers that index into the frame with row ids from the view.
+        Separate get() and view() calls could straddle a reload.
+        """
+        entry = self._entry(path, loader)
+        return entry['frame'].copy(deep=False), self._view(entry, name, builder)
+
+    def _view(self, entry, name, builder):
+        views = entry['views']
+
+        if name not in views:
+            with self._lock:
+                if name not in views:
+                    views[name] = builder(entry['frame'].copy(deep=False))
+
+        return views[name]
+
+    def signature(self, path):
+        """Return the file signature of the currently cached frame, or None"""
+        entry = self._entries.get(path)
+        return entry['signature'] if entry else None
+
+    def clear(self):
+        """Drop every cached frame"""
+        with self._lock:
+            self._entries.clear()
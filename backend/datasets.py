@@ -0,0 +1,142 @@
+"""
+Accident dataset definitions, CSV readers and snapshot ingestion
+
+Run this module to convert the CSVs into columnar snapshots:
+    python datasets.py [--force]
+"""
+import sys
+
+import pandas as pd
+
+import snapshot
+from compaction import compact_frame, print_report
+
+AIRLINE_ACCIDENTS_PATH = 'airline_accidents.csv'
+NTSB_DATA_PATH = 'ntsb_aviation_data.csv'
+
+INJURY_COLUMNS = ['Total Fatal Injuries', 'Total Serious Injuries', 'Total Minor Injuries', 'Total Uninjured']
+
+
+def read_airline_accidents(path):
+    """Read and clean the airline accidents CSV"""
+    airline_accidents = pd.read_csv(path, encoding='latin-1', low_memory=False)
+    return clean_airline_accidents(airline_accidents)
+
+
+def clean_airline_accidents(airline_accidents):
+    """Clean the airline accidents columns in place; works on a whole file or one chunk"""
+    # Clean numeric columns in airline_accidents
+    for col in INJURY_COLUMNS:
+        if col in airline_accidents.columns:
+            # Convert to string, strip whitespace, then convert to numeric
+            airline_accidents[col] = pd.to_numeric(
+                airline_accidents[col].astype(str).str.strip(),
+                errors='coerce'
+            ).fillna(0)
+
+    return airline_accidents
+
+
+def read_airline_accidents_chunks(paths, chunksize):
+    """
+    Yield cleaned frames of at most chunksize rows from one or more CSVs in
+    the airline accidents format, without holding a whole file in memory
+    """
+    for path in paths:
+        for chunk in pd.read_csv(path, encoding='latin-1', low_memory=False, chunksize=chunksize):
+            yield clean_airline_accidents(chunk)
+
+
+def read_ntsb_data(path):
+    """Read the NTSB aviation CSV"""
+    return pd.read_csv(path, encoding='latin-1', low_memory=False)
+
+
+# 'compact' configures how load_served_dataset() shrinks a frame for the API:
+# text columns stored as categoricals and count columns downcast to small
+# integers. Every column is kept: /api/accidents and its export return
+# whole records, so only columns no response contains may be dropped
+DATASETS = {
+    'airline_accidents': {
+        'path': AIRLINE_ACCIDENTS_PATH,
+        'reader': read_airline_accidents,
+        'date_columns': ['Event Date'],
+        'compact': {
+            'categorical_columns': ['Country', 'Injury Severity', 'Make', 'Weather Condition',
+                                    'Broad Phase of Flight', 'Engine Type', 'FAR Description',
+                                    'Aircraft Category', 'Investigation Type', 'Aircraft Damage',
+                                    'Amateur Built', 'Purpose of Flight', 'Airport Code', 'Airport Name',
+                                    'Schedule', 'Report Status', 'Publication Date'],
+            'count_columns': INJURY_COLUMNS,
+            'drop_columns': [],
+        },
+    },
+    'ntsb_data': {
+        'path': NTSB_DATA_PATH,
+        'reader': read_ntsb_data,
+        'date_columns': ['EVENT_LCL_DATE'],
+        'compact': {
+            'categorical_columns': ['LOC_STATE_NAME', 'LOC_CNTRY_NAME', 'ACFT_MAKE_NAME', 'FATAL_FLAG'],
+            'count_columns': ['FLT_CRW_INJ_NONE', 'PAX_INJ_NONE'],
+            'drop_columns': [],
+        },
+    },
+}
+
+
+def load_dataset(name, path=None, parse_dates=False):
+    """
+    Load a dataset, opening its columnar snapshot when one exists for the
+    current CSV and falling back to parsing the CSV otherwise.
+    With parse_dates, the dataset's date columns are returned as datetime64.
+    """
+    spec = DATASETS[name]
+    path = path or spec['path']
+    snapshot_dir = snapshot.snapshot_dir_for(path)
+
+    if snapshot.is_current(snapshot_dir, path):
+        return snapshot.load_snapshot(snapshot_dir, parse_dates=parse_dates)
+
+    df = spec['reader'](path)
+    if parse_dates:
+        for col in spec['date_columns']:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def load_served_dataset(name, path=None):
+    """
+    Load a dataset compacted for serving: categoricals, small integer counts,
+    dates parsed once and unused columns dropped (see compaction.py).
+    Prints the bytes saved per column.
+    """
+    spec = DATASETS[name]
+    df, report = compact_frame(load_dataset(name, path), date_columns=spec['date_columns'], **spec['compact'])
+    print_report(name, report)
+    return df
+
+
+def ingest(names=None, force=False):
+    """Build a columnar snapshot for each dataset whose snapshot is missing or stale"""
+    for name in names or DATASETS:
+        spec = DATASETS[name]
+        path = spec['path']
+        snapshot_dir = snapshot.snapshot_dir_for(path)
+
+        if not force and snapshot.is_current(snapshot_dir, path):
+            print(f"✓ Snapshot for {path} is up to date")
+            continue
+
+        try:
+            df = spec['reader'](path)
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            continue
+
+        snapshot.write_snapshot(df, snapshot_dir, path, spec['date_columns'])
+        print(f"✓ Wrote snapshot of {path} ({len(df)} rows) to {snapshot_dir}/")
+
+
+if __name__ == '__main__':
+    ingest(force='--force' in sys.argv[1:])
@@ -0,0 +1,134 @@
+"""
+Persisted training features
+
+Preprocessing (date parsing, label encoding, numeric cleanup) runs once per
+dataset and its output - the encoded feature matrix, both targets and the
+fitted label encoders - is stored under models/feature_store/<fingerprint>/
+as memory-mappable .npy files. Every trainer reads the same arrays, and a
+retrain on an unchanged dataset skips preprocessing entirely.
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from model_bundle import label_encoders_from_classes
+
+# Bump when preprocessing changes so stale feature sets are not reused
+FEATURE_STORE_VERSION = 1
+FEATURE_STORE_DIR = os.path.join('models', 'feature_store')
+MANIFEST_NAME = 'manifest.json'
+
+# Number of feature sets kept on disk
+KEEP_LATEST = 3
+
+
+def dataset_fingerprint(df):
+    """Return a content hash of a training frame"""
+    digest = hashlib.sha256()
+    digest.update(f'{FEATURE_STORE_VERSION}:{json.dumps(list(map(str, df.columns)))}'.encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def save_features(features, label_encoders, fingerprint, directory=FEATURE_STORE_DIR):
+    """Persist a feature set built by AviationMLModels.build_training_features"""
+    target = os.path.join(directory, fingerprint)
+    if os.path.exists(os.path.join(target, MANIFEST_NAME)):
+        return target
+
+    tmp_dir = os.path.join(directory, f'.tmp-{fingerprint}-{uuid.uuid4().hex[:6]}')
+    os.makedirs(tmp_dir)
+    try:
+        np.save(os.path.join(tmp_dir, 'X.npy'), np.ascontiguousarray(features['X'], dtype=np.float64))
+        np.save(os.path.join(tmp_dir, 'severity.npy'), np.asarray(features['severity'], dtype=str))
+        np.save(os.path.join(tmp_dir, 'severity_score.npy'), np.asarray(features['severity_score'], dtype=np.float64))
+
+        manifest = {
+            'format_version': FEATURE_STORE_VERSION,
+            'fingerprint': fingerprint,
+            'created_at': datetime.now().isoformat(),
+            'rows': int(len(features['X'])),
+            'feature_columns': list(features['feature_columns']),
+            'label_encoders': {
+                col: [str(c) for c in encoder.classes_]
+                for col, encoder in label_encoders.items()
+            },
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.rename(tmp_dir, target)
+    except OSError:
+        # Another run published the same fingerprint first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(target, MANIFEST_NAME)):
+            raise
+
+    _prune(directory)
+    return target
+
+
+def load_features(fingerprint, directory=FEATURE_STORE_DIR):
+    """
+    Open a stored feature set as (features, label_encoders), or None if absent.
+    X and severity_score are read-only memory maps.
+    """
+    target = os.path.join(directory, fingerprint)
+    try:
+        with open(os.path.join(target, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format_version') != FEATURE_STORE_VERSION:
+        return None
+
+    features = {
+        'fingerprint': fingerprint,
+        'X': np.load(os.path.join(target, 'X.npy'), mmap_mode='r'),
+        'feature_columns': manifest['feature_columns'],
+        # Labels go back to Python strings, as read from the dataset
+        'severity': np.load(os.path.join(target, 'severity.npy')).astype(object),
+        'severity_score': np.load(os.path.join(target, 'severity_score.npy'), mmap_mode='r'),
+    }
+    return features, label_encoders_from_classes(manifest['label_encoders'])
+
+
+def load_or_build_features(ml_models, df, directory=FEATURE_STORE_DIR):
+    """
+    Return the training features for df, reusing the stored set for an
+    unchanged dataset. The arrays always come from the store, and
+    features['fingerprint'] names them for load_features(). Fitted label
+    encoders are installed on ml_models either way, so the saved models
+    encode inputs the same way.
+    """
+    fingerprint = dataset_fingerprint(df)
+
+    stored = load_features(fingerprint, directory)
+    if stored is not None:
+        features, ml_models.label_encoders = stored
+        print(f"✓ Reusing stored training features {fingerprint} ({len(features['X'])} rows)")
+        return features
+
+    features = ml_models.build_training_features(df)
+    save_features(features, ml_models.label_encoders, fingerprint, directory)
+    print(f"✓ Built and stored training features {fingerprint} ({len(features['X'])} rows)")
+    # Train from the stored memory maps, which worker processes share
+    return load_features(fingerprint, directory)[0]
+
+
+def _prune(directory):
+    """Remove all but the KEEP_LATEST most recent feature sets"""
+    entries = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if not name.startswith('.') and os.path.isdir(os.path.join(directory, name))
+    ]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[KEEP_LATEST:]:
+        shutil.rmtree(path, ignore_errors=True)
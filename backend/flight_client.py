@@ -0,0 +1,175 @@
+"""
+Pooled, cached client for the AviationStack API
+
+Requests reuse pooled keep-alive connections, successful responses are
+cached for a TTL, and concurrent callers asking for the same resource share
+a single upstream fetch. An optional background thread refreshes selected
+resources before they expire, so requests are answered from the cache
+without waiting on the upstream API.
+
+The base URL is configurable, so the client can be pointed at the local
+stub server in flight_stub.py for offline testing and benchmarking.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = 'http://api.aviationstack.com/v1'
+DEFAULT_TTL = 60
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 10
+
+
+class FlightResponse:
+    """Status code and decoded JSON body of an upstream response"""
+
+    def __init__(self, status_code, data, fetched_at):
+        self.status_code = status_code
+        self.data = data
+        self.fetched_at = fetched_at
+
+
+class _Call:
+    """An upstream fetch in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class AviationStackClient:
+    """
+    Thread-safe AviationStack client shared by all requests of a process.
+    Only 200 responses are cached; errors and timeouts reach every caller
+    waiting on the fetch that failed.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, ttl=DEFAULT_TTL,
+                 timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._cache = {}
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._prefetch_stop = threading.Event()
+        self._prefetch_threads = []
+        self.upstream_requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls, api_key):
+        """Build a client configured by the AVIATIONSTACK_* environment variables"""
+        return cls(
+            api_key,
+            base_url=os.getenv('AVIATIONSTACK_BASE_URL', DEFAULT_BASE_URL),
+            ttl=float(os.getenv('AVIATIONSTACK_CACHE_TTL', DEFAULT_TTL)),
+            timeout=float(os.getenv('AVIATIONSTACK_TIMEOUT', DEFAULT_TIMEOUT)),
+        )
+
+    @staticmethod
+    def _key(resource, params):
+        return (resource, tuple(sorted((params or {}).items())))
+
+    def get(self, resource, params=None, max_age=None):
+        """
+        Return the FlightResponse for a resource ('flights', ...) and query
+        params, from the cache when it is younger than max_age (default: the
+        TTL), otherwise from a fetch shared with concurrent callers.
+        Raises requests exceptions such as requests.Timeout.
+        """
+        key = self._key(resource, params)
+        max_age = self.ttl if max_age is None else max_age
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached.fetched_at < max_age:
+                self.cache_hits += 1
+                return cached
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self._fetch(key, resource, params, call)
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.response
+
+    def _fetch(self, key, resource, params, call):
+        try:
+            query = dict(params or {}, access_key=self.api_key)
+            with self._lock:
+                self.upstream_requests += 1
+            response = self.session.get(f'{self.base_url}/{resource}', params=query, timeout=self.timeout)
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            call.response = FlightResponse(response.status_code, data, time.monotonic())
+            if response.status_code == 200:
+                with self._lock:
+                    self._cache[key] = call.response
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def start_prefetch(self, resource, params=None, interval=None):
+        """
+        Refresh a resource in a background thread every interval seconds
+        (default: 80% of the TTL) so callers keep hitting a warm cache
+        """
+        interval = interval or self.ttl * 0.8
+
+        def refresh():
+            while not self._prefetch_stop.is_set():
+                try:
+                    # Force a fetch unless another caller just refreshed it
+                    self.get(resource, params, max_age=interval / 2)
+                except Exception as e:
+                    print(f"⚠ AviationStack prefetch failed: {e}")
+                self._prefetch_stop.wait(interval)
+
+        thread = threading.Thread(target=refresh, name=f'aviationstack-prefetch-{resource}', daemon=True)
+        thread.start()
+        self._prefetch_threads.append(thread)
+        return thread
+
+    def close(self):
+        """Stop prefetching and close pooled connections"""
+        self._prefetch_stop.set()
+        for thread in self._prefetch_threads:
+            thread.join(timeout=1)
+        self.session.close()
+
+    def stats(self):
+        """Return upstream, cache hit and coalesced request counters"""
+        with self._lock:
+            return {
+                'upstream_requests': self.upstream_requests,
+                'cache_hits': self.cache_hits,
+                'coalesced': self.coalesced,
+                'cached_resources': len(self._cache),
+            }
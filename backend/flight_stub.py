@@ -0,0 +1,111 @@
+"""
+Local stand-in for the AviationStack API
+
+Serves /v1/<resource> from a JSON fixture file (or generated sample
+flights) so /api/realflights can be tested and benchmarked offline:
+
+    python flight_stub.py [--fixture flights.json] [--port 8765] [--delay 0.5]
+
+and in .env:
+
+    AVIATIONSTACK_BASE_URL=http://localhost:8765/v1
+    AVIATIONSTACK_API_KEY=stub
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+def sample_flights(count=50):
+    """Generate an AviationStack-shaped /flights response"""
+    airlines = ['American Airlines', 'Delta Air Lines', 'United Airlines', 'Southwest Airlines']
+    airports = ['John F Kennedy International', 'Los Angeles International',
+                "Chicago O'hare International", 'Hartsfield-jackson Atlanta International']
+    return {
+        'pagination': {'limit': count, 'offset': 0, 'count': count, 'total': count},
+        'data': [
+            {
+                'flight_date': time.strftime('%Y-%m-%d'),
+                'flight_status': 'active',
+                'departure': {'airport': airports[i % len(airports)]},
+                'arrival': {'airport': airports[(i + 1) % len(airports)]},
+                'airline': {'name': airlines[i % len(airlines)]},
+                'flight': {'iata': f'XX{1000 + i}'},
+                'aircraft': {'registration': f'N{100 + i}XX', 'iata': 'B738'},
+            }
+            for i in range(count)
+        ],
+    }
+
+
+class StubServer:
+    """Threaded HTTP server answering every /v1/<resource> with fixed JSON"""
+
+    def __init__(self, payload, host='127.0.0.1', port=8765, delay=0.0):
+        self.payload = json.dumps(payload).encode()
+        self.delay = delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if not urlparse(self.path).path.startswith('/v1/'):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(stub.payload)))
+                self.end_headers()
+                self.wfile.write(stub.payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        """Serve from a daemon thread; returns self"""
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve AviationStack-shaped responses locally')
+    parser.add_argument('--fixture', help='JSON file to serve; sample flights are generated if omitted')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds of simulated upstream latency')
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, 'r') as f:
+            payload = json.load(f)
+    else:
+        payload = sample_flights()
+
+    stub = StubServer(payload, port=args.port, delay=args.delay)
+    print(f"AviationStack stub serving on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
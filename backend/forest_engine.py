@@ -0,0 +1,318 @@
+"""
+Flat-array inference engine for fitted random forests
+
+Compiles a fitted RandomForestClassifier or RandomForestRegressor into
+contiguous numpy node arrays and walks every tree for every row at once,
+one vectorized step per tree level, instead of dispatching to each
+estimator from Python.
+
+Check parity with sklearn on the saved models:
+    python forest_engine.py [models_dir]
+"""
+import pickle
+import sys
+
+import numpy as np
+
+LEAF = -1
+
+
+class CompiledForest:
+    """
+    All trees of a forest packed into flat node arrays.
+    Child indices are global offsets into the packed arrays, and every row
+    of values holds a leaf's output: normalized class probabilities for a
+    classifier, the predicted target for a regressor.
+    """
+
+    # Node arrays saved by arrays() and restored by from_arrays()
+    ARRAY_FIELDS = ('feature', 'threshold', 'children', 'missing_left', 'values', 'roots')
+
+    def __init__(self, feature, threshold, children, missing_left, values, roots, max_depth, classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        # Interleaved [left, right] pairs: child of node n is children[2 * n + go_right]
+        self.children = children
+        self.missing_left = missing_left
+        self.values = values
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def is_classifier(self):
+        return self.classes_ is not None
+
+    @classmethod
+    def from_sklearn(cls, forest, n_estimators=None, max_depth=None, prune_tolerance=None, compact_dtypes=False):
+        """
+        Compile a fitted sklearn random forest.
+        The defaults reproduce the forest exactly. For a smaller, faster
+        variant (see compact_forests.py):
+            n_estimators     keep only the first n trees
+            max_depth        turn nodes at this depth into leaves
+            prune_tolerance  collapse splits whose two leaves differ by at
+                             most this much in every output (bottom-up)
+            compact_dtypes   float32 thresholds and leaf values, narrow indices
+        """
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single-output forests can be compiled')
+
+        classes = getattr(forest, 'classes_', None)
+        parts = {'feature': [], 'threshold': [], 'left': [], 'right': [], 'missing_left': [], 'values': []}
+        roots = []
+        offset = 0
+        compiled_depth = 0
+
+        for estimator in forest.estimators_[:n_estimators]:
+            tree = estimator.tree_
+
+            value = tree.value[:, 0, :]
+            if classes is not None and not np.allclose(value.sum(axis=1), 1.0):
+                # sklearn < 1.4 stores class counts and normalizes them in predict_proba;
+                # newer versions already store the fractions and use them as-is
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+
+            nodes, is_leaf, depth = _kept_nodes(tree, value, max_depth, prune_tolerance)
+            n_nodes = len(nodes)
+            # Position of every kept node in the compiled tree
+            position = np.full(tree.node_count, LEAF, dtype=np.intp)
+            position[nodes] = np.arange(n_nodes)
+
+            # Leaves point at themselves so extra traversal steps are no-ops
+            node_ids = np.arange(n_nodes) + offset
+            parts['left'].append(np.where(is_leaf, node_ids, position[tree.children_left[nodes]] + offset))
+            parts['right'].append(np.where(is_leaf, node_ids, position[tree.children_right[nodes]] + offset))
+            parts['feature'].append(np.where(is_leaf, 0, tree.feature[nodes]))
+            parts['threshold'].append(tree.threshold[nodes])
+            missing_left = getattr(tree, 'missing_go_to_left', None)
+            parts['missing_left'].append(
+                np.zeros(n_nodes, dtype=bool) if missing_left is None else missing_left[nodes].astype(bool)
+            )
+            parts['values'].append(value[nodes])
+
+            roots.append(offset)
+            offset += n_nodes
+            compiled_depth = max(compiled_depth, depth)
+
+        left = np.concatenate(parts['left'])
+        right = np.concatenate(parts['right'])
+        threshold = np.concatenate(parts['threshold']).astype(np.float64)
+        index_dtype = np.intp
+        value_dtype = np.float64
+        if compact_dtypes:
+            index_dtype = np.int32
+            value_dtype = np.float32
+            threshold = _float32_thresholds(threshold)
+        return cls(
+            feature=np.concatenate(parts['feature']).astype(np.int32 if compact_dtypes else np.intp),
+            threshold=threshold,
+            children=np.column_stack([left, right]).ravel().astype(index_dtype),
+            missing_left=np.concatenate(parts['missing_left']),
+            values=np.ascontiguousarray(np.concatenate(parts['values']), dtype=value_dtype),
+            roots=np.asarray(roots, dtype=index_dtype),
+            max_depth=compiled_depth,
+            classes=None if classes is None else np.asarray(classes),
+        )
+
+    @property
+    def nbytes(self):
+        """Size of the node arrays in bytes"""
+        return sum(array.nbytes for array in self.arrays().values())
+
+    def arrays(self):
+        """Return the node arrays by name, e.g. for saving them as .npy files"""
+        return {field: getattr(self, field) for field in self.ARRAY_FIELDS}
+
+    @classmethod
+    def from_arrays(cls, arrays, max_depth, classes=None):
+        """Rebuild a compiled forest from saved (possibly memory-mapped) node arrays"""
+        return cls(max_depth=max_depth, classes=classes, **{field: arrays[field] for field in cls.ARRAY_FIELDS})
+
+    def apply(self, X):
+        """Return the leaf node index reached in every tree, shape (n_rows, n_trees)"""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows) * n_features)[:, np.newaxis]
+        has_missing = bool(np.isnan(flat_X).any())
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_estimators)).copy()
+
+        for _ in range(self.max_depth):
+            x = flat_X[row_offsets + self.feature[nodes]]
+            # NaN compares False, so it goes right unless the node sends missing values left
+            go_right = ~(x <= self.threshold[nodes])
+            if has_missing:
+                go_right = np.where(np.isnan(x), ~self.missing_left[nodes], go_right)
+            nodes = self.children[2 * nodes + go_right]
+
+        return nodes
+
+    def _mean_leaf_values(self, X, chunk_size=4096):
+        out = np.empty((len(X), self.values.shape[1]), dtype=np.float64)
+        for start in range(0, len(X), chunk_size):
+            leaves = self.apply(X[start:start + chunk_size])
+            # Accumulate tree by tree in estimator order, exactly like sklearn,
+            # so the floating point sums match bit for bit
+            chunk = np.zeros((len(leaves), self.values.shape[1]), dtype=np.float64)
+            for t in range(self.n_estimators):
+                chunk += self.values[leaves[:, t]]
+            out[start:start + chunk_size] = chunk
+        out /= self.n_estimators
+        return out
+
+    def predict_proba(self, X):
+        """Class probabilities, matching RandomForestClassifier.predict_proba"""
+        if not self.is_classifier:
+            raise AttributeError('predict_proba is only available for classifiers')
+        return self._mean_leaf_values(X)
+
+    def predict(self, X):
+        """Predictions, matching the sklearn forest's predict"""
+        if self.is_classifier:
+            return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+        return self._mean_leaf_values(X)[:, 0]
+
+
+def _kept_nodes(tree, value, max_depth=None, prune_tolerance=None):
+    """
+    Select the nodes of a fitted sklearn tree that a compiled tree keeps.
+    Nodes at max_depth become leaves, and splits whose children are both
+    leaves with outputs within prune_tolerance are collapsed, bottom-up.
+    A node's value is the weighted mean of its children's, so a collapsed
+    split predicts what the samples reaching it averaged.
+    Returns (node ids in depth-first order, leaf mask over them, depth)
+    """
+    left, right = tree.children_left, tree.children_right
+    leaf = left == LEAF
+    if max_depth is None and prune_tolerance is None:
+        return np.arange(tree.node_count), leaf, tree.max_depth
+
+    depth = np.zeros(tree.node_count, dtype=np.intp)
+
+    # Parents come before their children in sklearn's node order
+    for node in range(tree.node_count):
+        if not leaf[node]:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    if max_depth is not None:
+        leaf = leaf | (depth >= max_depth)
+
+    if prune_tolerance is not None:
+        for node in range(tree.node_count - 1, -1, -1):
+            if (not leaf[node] and leaf[left[node]] and leaf[right[node]]
+                    and np.max(np.abs(value[left[node]] - value[right[node]])) <= prune_tolerance):
+                leaf[node] = True
+
+    nodes = []
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        if not leaf[node]:
+            stack += [right[node], left[node]]
+    nodes = np.asarray(nodes, dtype=np.intp)
+    return nodes, leaf[nodes], int(depth[nodes].max())
+
+
+def _float32_thresholds(threshold):
+    """
+    Round thresholds down to float32. Inputs are compared as float32, and
+    for a float32 x, x <= t holds exactly when x <= (largest float32 <= t),
+    so every split sends every input the same way as before.
+    """
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def check_parity(forest, compiled, X):
+    """
+    Compare a compiled forest with its sklearn original on X.
+    Returns a dict of mismatch details; empty when outputs are identical.
+    """
+    mismatches = {}
+
+    expected = forest.predict(X)
+    actual = compiled.predict(X)
+    if not np.array_equal(expected, actual):
+        mismatches['predict'] = int(np.sum(expected != actual))
+
+    if compiled.is_classifier:
+        expected_proba = forest.predict_proba(X)
+        actual_proba = compiled.predict_proba(X)
+        if not np.array_equal(expected_proba, actual_proba):
+            mismatches['predict_proba_max_abs_diff'] = float(np.max(np.abs(expected_proba - actual_proba)))
+
+    return mismatches
+
+
+def _parity_inputs(forest, n_rows=5000, seed=0):
+    """Random rows spanning every threshold the forest splits on"""
+    rng = np.random.default_rng(seed)
+    compiled = CompiledForest.from_sklearn(forest)
+    node_ids = np.arange(len(compiled.feature))
+    split = compiled.children[2 * node_ids] != node_ids
+    X = np.zeros((n_rows, forest.n_features_in_))
+    for j in range(forest.n_features_in_):
+        thresholds = compiled.threshold[split & (compiled.feature == j)]
+        # Splits that only separate missing values have an infinite threshold
+        thresholds = thresholds[np.isfinite(thresholds)]
+        if len(thresholds) == 0:
+            continue
+        # Mix exact thresholds (ties go left) with values around them
+        picks = rng.choice(thresholds, size=n_rows)
+        X[:, j] = picks + rng.choice([0.0, -0.5, 0.5, -5.0, 5.0], size=n_rows)
+    return X, compiled
+
+
+def _saved_forests(directory):
+    """
+    The sklearn forests of the bundle CURRENT points at, or of the loose
+    pickles written before bundles existed
+    """
+    # model_bundle imports this module
+    from model_bundle import FORESTS, ModelBundle
+
+    bundle = ModelBundle.open_current(directory)
+    if bundle is not None:
+        print(f"Checking bundle {bundle.bundle_id}")
+        return {name: bundle.load(name) for name in FORESTS}
+
+    forests = {}
+    for name in FORESTS:
+        with open(f'{directory}/{name}.pkl', 'rb') as f:
+            forests[name] = pickle.load(f)
+    return forests
+
+
+def main(directory='models'):
+    """Check the saved forests against their compiled versions"""
+    failed = False
+    try:
+        forests = _saved_forests(directory)
+    except OSError as e:
+        print(f"✗ No saved forests in {directory} ({e}) - run 'python train_models.py' first")
+        return 1
+
+    for name, forest in forests.items():
+        X, compiled = _parity_inputs(forest)
+        mismatches = check_parity(forest, compiled, X)
+        if mismatches:
+            failed = True
+            print(f"✗ {name}: compiled output differs from sklearn - {mismatches}")
+        else:
+            print(f"✓ {name}: compiled output identical to sklearn on {len(X)} rows")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:2]))
@@ -0,0 +1,65 @@
+"""
+Gunicorn settings for the Aviation ML API
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Before any worker starts, the master brings the dataset snapshots and the
+joined feature table up to date. With preload_app the app is imported
+once, in the master: the models are unpickled, and the compacted datasets,
+filter indexes and summary views are built before any worker is forked. Workers then share those pages
+copy-on-write instead of each loading its own copy. gc.freeze() moves
+everything loaded so far out of the garbage collector's reach, so its
+passes do not write to (and un-share) the inherited objects.
+
+Compare what each worker really costs with:
+    python memory_report.py <master pid>
+
+Environment:
+    PORT                bind port (default 5000)
+    WEB_CONCURRENCY     worker processes (default 4)
+    GUNICORN_PRELOAD    0 to import the app in every worker instead
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+timeout = 120
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # The master is the only serving process that writes the joined feature
+    # table; workers open it, or join in memory if it goes stale
+    from joined_features import ingest_joined
+
+    try:
+        ingest_joined()
+    except Exception as e:
+        # Serve what can be loaded; the data endpoints report the failure
+        server.log.warning(f"Could not ingest the joined feature table: {e}")
+    if not preload_app:
+        return
+    import app
+
+    app.preload()
+    # Workers run their own model watchers (post_fork); the master only forks
+    app.model_registry.stop_watcher()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Models and datasets loaded in the master; workers share them")
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Objects created since when_ready, e.g. before replacing a dead worker
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    import app
+
+    app.model_registry.after_fork()
+    app.model_registry.start_watcher()
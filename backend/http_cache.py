@@ -0,0 +1,88 @@
+"""
+Conditional HTTP caching for responses derived from files on disk
+
+A response built only from a set of files (the accident CSVs, artifacts
+under models/) is versioned by their signatures: the same (mtime, size)
+pair data_cache compares to decide whether to reload. Views decorated with
+conditional() send ETag, Last-Modified and Cache-Control headers, and a
+request whose If-None-Match (or If-Modified-Since) still matches is
+answered with 304 before the view runs, so no data is loaded or encoded.
+"""
+import functools
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from flask import current_app, make_response, request
+
+from data_cache import file_signature
+
+# Seconds browsers and CDNs may reuse a response without revalidating it.
+# 0 means every use is revalidated, which costs a 304 when nothing changed.
+DEFAULT_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '0'))
+
+
+def _signature(path):
+    try:
+        return file_signature(path)
+    except OSError:
+        return None
+
+
+def resource_version(paths):
+    """
+    Return (etag, last_modified) for the current request built from paths.
+    Missing files are part of the version, so creating one changes it.
+    """
+    paths = [path() if callable(path) else path for path in paths]
+    signatures = [(path, _signature(path)) for path in paths if path is not None]
+    digest = hashlib.sha1(repr((request.endpoint, request.query_string, signatures)).encode())
+    mtimes = [signature[0] for _, signature in signatures if signature is not None]
+    last_modified = None
+    if mtimes:
+        # HTTP dates have one-second resolution
+        last_modified = datetime.fromtimestamp(max(mtimes) // 1_000_000_000, timezone.utc)
+    return digest.hexdigest()[:20], last_modified
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def _set_validators(response, etag, last_modified, max_age):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if max_age == 0:
+        response.cache_control.must_revalidate = True
+    return response
+
+
+def conditional(*paths, max_age=None):
+    """
+    Decorate a GET view whose response depends only on the files at paths
+    (relative to the working directory). A path may be a function that
+    returns the path, or None, at request time. Successful responses carry
+    validators; matching conditional requests get an empty 304.
+    """
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            age = DEFAULT_MAX_AGE if max_age is None else max_age
+            etag, last_modified = resource_version(paths)
+            if _not_modified(etag, last_modified):
+                return _set_validators(current_app.response_class(status=304), etag, last_modified, age)
+
+            response = make_response(view(*args, **kwargs))
+            # Errors are not cached; they may not be caused by the files
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified, age)
+            return response
+        return wrapper
+    return decorate
@@ -0,0 +1,246 @@
+"""
+Incremental retraining
+
+A full run refits every model on the whole CSV. Nightly updates only
+append accident records to it, so an incremental run starts from the
+current bundle instead:
+
+    1. the bundle's lineage holds a watermark - the row count and last
+       Event Id of the data it was trained on. Rows past it are new.
+    2. label encoders are extended: values never seen before get the next
+       codes, so existing codes (and every tree split on them) keep their
+       meaning
+    3. each forest grows new trees on the new records and retires its
+       oldest trees beyond a cap; the linear model and scaler are kept
+    4. the result is saved as a new bundle whose lineage names its parent
+
+Run it through the training script:
+    python train_models.py --incremental [--new-trees N] [--max-trees N]
+"""
+import math
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.preprocessing import LabelEncoder
+
+from ml_models import FOREST_PARAMS, LABEL_ENCODED_COLUMNS, _split
+from streaming_training import assemble_forest, pad_tree_classes
+
+# Trees each forest grows per incremental run
+INCREMENTAL_TREES = 10
+
+# Trees each forest keeps; the oldest are retired beyond this
+MAX_FOREST_TREES = 200
+
+# Fewer new usable rows than this are all trained on, with no holdout
+MIN_HOLDOUT_ROWS = 10
+
+
+class WatermarkError(Exception):
+    """Raised when a dataset cannot be trained on incrementally from a bundle"""
+
+
+def training_watermark(df):
+    """Row count, last Event Id and latest Event Date of a training dataset"""
+    last_event_id = None
+    if len(df) and 'Event Id' in df.columns:
+        last_event_id = str(df['Event Id'].iloc[-1])
+
+    max_event_date = None
+    if 'Event Date' in df.columns:
+        latest = pd.to_datetime(df['Event Date'], errors='coerce').max()
+        if not pd.isna(latest):
+            max_event_date = latest.date().isoformat()
+
+    return {'rows': int(len(df)), 'last_event_id': last_event_id, 'max_event_date': max_event_date}
+
+
+def records_since(df, watermark):
+    """
+    Return the rows of df appended after the watermark.
+    Raises WatermarkError if df is not the watermarked data plus new rows.
+    """
+    rows = watermark['rows']
+    if len(df) < rows:
+        raise WatermarkError(f'Dataset has {len(df)} rows, fewer than the {rows} already trained on')
+    if rows and watermark.get('last_event_id') is not None and 'Event Id' in df.columns:
+        last_event_id = str(df['Event Id'].iloc[rows - 1])
+        if last_event_id != watermark['last_event_id']:
+            raise WatermarkError(
+                f"Row {rows} is {last_event_id}, not the last trained record {watermark['last_event_id']}"
+            )
+    return df.iloc[rows:]
+
+
+def extend_encoders(label_encoders, df):
+    """
+    Append the values of df never seen by label_encoders to their classes,
+    in place. Existing values keep their codes.
+    Returns {column: [added values]}
+    """
+    added = {}
+    for col in LABEL_ENCODED_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = set(df[col].fillna('Unknown').astype(str).unique())
+        encoder = label_encoders.get(col)
+        if encoder is None:
+            encoder = label_encoders[col] = LabelEncoder()
+            encoder.classes_ = np.asarray([], dtype=object)
+
+        new_values = sorted(values - set(encoder.classes_))
+        if new_values:
+            # LabelEncoder maps strings through a dict, so classes_ need not stay sorted
+            encoder.classes_ = np.concatenate([np.asarray(encoder.classes_, dtype=object),
+                                               np.asarray(new_values, dtype=object)])
+            added[col] = new_values
+    return added
+
+
+def grow_classifier(forest, X, y, new_trees, max_trees, seed):
+    """
+    Return a classifier made of forest's trees and new_trees trees grown on
+    (X, y), keeping the newest max_trees.
+    sklearn's warm_start would re-derive classes_ from y alone, so the new
+    trees are grown separately and every tree is re-expressed over the
+    union of the old and new classes.
+    """
+    params = dict(FOREST_PARAMS, n_estimators=new_trees, random_state=seed)
+    grown = RandomForestClassifier(**params).fit(X, y)
+
+    old_classes = np.asarray(forest.classes_, dtype=object)
+    new_classes = np.asarray(grown.classes_, dtype=object)
+    classes = np.asarray(sorted(set(old_classes) | set(new_classes)), dtype=object)
+
+    trees = []
+    for estimators, tree_classes in [(forest.estimators_, old_classes), (grown.estimators_, new_classes)]:
+        if len(tree_classes) == len(classes):
+            trees.extend(estimators)
+        else:
+            trees.extend(pad_tree_classes(tree, tree_classes, classes) for tree in estimators)
+
+    retired = max(0, len(trees) - max_trees)
+    classifier = assemble_forest(RandomForestClassifier(**FOREST_PARAMS), trees[retired:], X.shape[1])
+    classifier.classes_ = classes
+    classifier.n_classes_ = len(classes)
+    return classifier, retired
+
+
+def grow_regressor(forest, X, y, new_trees, max_trees, seed):
+    """
+    Warm-start new_trees more trees of forest on (X, y), then retire the
+    oldest beyond max_trees. Modifies forest in place.
+    """
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + new_trees, random_state=seed)
+    forest.fit(X, y)
+    forest.set_params(warm_start=False)
+
+    retired = max(0, len(forest.estimators_) - max_trees)
+    if retired:
+        forest.estimators_ = forest.estimators_[retired:]
+        forest.set_params(n_estimators=len(forest.estimators_))
+    return forest, retired
+
+
+def _rmse(y_true, y_pred):
+    return math.sqrt(float(np.mean((y_pred - y_true) ** 2)))
+
+
+def train_incremental(ml_models, df, new_trees=INCREMENTAL_TREES, max_trees=MAX_FOREST_TREES):
+    """
+    Grow the models ml_models loaded from its current bundle on the rows of
+    df past that bundle's watermark, and install them.
+    Returns (metrics, lineage) to save with the new bundle, or None when
+    there are no new usable records.
+    """
+    parent = ml_models.bundle
+    parent_lineage = parent.lineage if parent is not None else {}
+    if 'watermark' not in parent_lineage:
+        raise WatermarkError('The current bundle has no training watermark; run a full training first')
+
+    new_records = records_since(df, parent_lineage['watermark'])
+    if len(new_records) == 0:
+        print(f"✓ No records since the watermark of bundle {parent.bundle_id}")
+        return None
+    print(f"✓ {len(new_records)} new records since bundle {parent.bundle_id}")
+
+    encoder_classes_added = extend_encoders(ml_models.label_encoders, new_records)
+    for col, values in encoder_classes_added.items():
+        print(f"  {col}: {len(values)} new value(s) encoded")
+
+    features = ml_models.build_training_features(new_records)
+    if features['feature_columns'] != ml_models.feature_columns:
+        raise WatermarkError(
+            f"New records have features {features['feature_columns']}, the bundle has {ml_models.feature_columns}"
+        )
+    X = features['X']
+    if len(X) == 0:
+        print("⚠ None of the new records have every feature - nothing to train on")
+        return None
+
+    if len(X) >= MIN_HOLDOUT_ROWS:
+        train, test = _split(len(X))
+    else:
+        train, test = np.arange(len(X)), np.arange(0)
+
+    generation = parent_lineage.get('generation', 0) + 1
+    seed = FOREST_PARAMS['random_state'] + generation
+    severity = features['severity']
+    score = features['severity_score']
+
+    classifier, classifier_retired = grow_classifier(
+        ml_models.random_forest_classifier, X[train], severity[train], new_trees, max_trees, seed
+    )
+
+    regressor = ml_models.random_forest_regressor
+    regression_train = train[~np.isnan(score[train])]
+    regressor_added = regressor_retired = 0
+    if len(regression_train):
+        regressor, regressor_retired = grow_regressor(
+            regressor, X[regression_train], score[regression_train], new_trees, max_trees, seed
+        )
+        regressor_added = new_trees
+
+    ml_models.random_forest_classifier = classifier
+    ml_models.random_forest_regressor = regressor
+    ml_models._models_changed()
+    print(f"✓ Classifier: +{new_trees} / -{classifier_retired} trees ({len(classifier.estimators_)} total)")
+    print(f"✓ Regressor: +{regressor_added} / -{regressor_retired} trees ({len(regressor.estimators_)} total)")
+
+    # Scored on the held-out new records only
+    metrics = {'evaluated_on': 'new records', 'test_rows': int(len(test))}
+    if len(test):
+        accuracy = accuracy_score(severity[test], classifier.predict(X[test]))
+        metrics['classifier'] = {'accuracy': float(accuracy)}
+        print(f"  Classification Model Accuracy: {accuracy:.4f}")
+
+        regression_test = test[~np.isnan(score[test])]
+        if len(regression_test):
+            X_test, y_test = X[regression_test], score[regression_test]
+            metrics['regressor'] = {
+                'linear_rmse': _rmse(y_test, ml_models.linear_model.predict(ml_models.scaler.transform(X_test))),
+                'random_forest_rmse': _rmse(y_test, regressor.predict(X_test)),
+            }
+            print(f"  Linear Regression RMSE: {metrics['regressor']['linear_rmse']:.4f}")
+            print(f"  Random Forest RMSE: {metrics['regressor']['random_forest_rmse']:.4f}")
+
+    lineage = {
+        'mode': 'incremental',
+        'parent': parent.bundle_id,
+        'root': parent_lineage.get('root') or parent.bundle_id,
+        'generation': generation,
+        'watermark': training_watermark(df),
+        'records_added': int(len(new_records)),
+        'rows_trained': int(len(train)),
+        'encoder_classes_added': encoder_classes_added,
+        'trees': {
+            'rf_classifier': {'added': new_trees, 'retired': classifier_retired,
+                              'total': len(classifier.estimators_)},
+            'rf_regressor': {'added': regressor_added, 'retired': regressor_retired,
+                             'total': len(regressor.estimators_)},
+        },
+        'linear_model': 'inherited',
+    }
+    return metrics, lineage
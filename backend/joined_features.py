@@ -0,0 +1,274 @@
+"""
+Joined feature table of the airline accidents and the NTSB records
+
+Ingestion joins every airline accident to the NTSB record with the same
+report number ('Accident Number' = NTSB_RPRT_NBR) and event date, derives
+features from the match, label-encodes the categorical columns and stores
+the result as a columnar snapshot (see snapshot.py). Training and the data
+endpoints open that table instead of joining or encoding again:
+
+    - the join is one vectorized probe of a sorted key index: a 64-bit hash
+      of (report number, event day) for every NTSB record, built once per
+      version of the NTSB file and kept next to the table
+    - the table is current while neither CSV changes. Only ingestion
+      writes it (this script, training, and the gunicorn master before it
+      forks); readers of a stale table join in memory instead, so
+      concurrent processes never rebuild the same files
+
+Columns added to the airline accidents:
+    NTSB Matched       1 when an NTSB record has the same number and date
+    Event Hour         local hour of the event (0-23), -1 when unknown
+    NTSB Fatal Flag    FATAL_FLAG of the matched record
+    NTSB Uninjured     uninjured crew plus passengers of the matched record
+    NTSB State         LOC_STATE_NAME of the matched record
+    <column>_encoded   label codes of ml_models.LABEL_ENCODED_COLUMNS
+
+    python joined_features.py [--force]
+"""
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+from compaction import compact_frame, print_report
+from data_cache import file_signature
+from datasets import AIRLINE_ACCIDENTS_PATH, DATASETS, NTSB_DATA_PATH, ingest, load_dataset
+from ml_models import LABEL_ENCODED_COLUMNS
+
+# The files the table is built from; also the data cache key of the served frame
+JOINED_SOURCES = (AIRLINE_ACCIDENTS_PATH, NTSB_DATA_PATH)
+
+KEY_INDEX_NAME = 'ntsb_key_index.npz'
+
+# Event days that cannot be parsed; never equal to a real day on either side
+NO_DAY = np.iinfo(np.int64).min
+
+
+def joined_dir_for(airline_path):
+    """Return the joined table directory that belongs to an airline accidents CSV"""
+    return os.path.splitext(airline_path)[0] + '.joined'
+
+
+def _report_numbers(values):
+    return pd.Series(values).astype('string').str.strip().str.upper().fillna('').to_numpy(dtype=object)
+
+
+def _event_days(dates, two_digit_years=False):
+    """Days since the epoch of each date (NO_DAY when missing)"""
+    parsed = pd.to_datetime(pd.Series(dates), errors='coerce')
+    if two_digit_years:
+        # dd-Mon-yy dates before 1969 parse as 20xx
+        future = parsed > pd.Timestamp(datetime.now())
+        if future.any():
+            shifted = parsed[future]
+            parsed[future] = pd.to_datetime(pd.DataFrame({
+                'year': shifted.dt.year - 100, 'month': shifted.dt.month, 'day': shifted.dt.day,
+            }), errors='coerce')
+    days = parsed.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    days[parsed.isna().to_numpy()] = NO_DAY
+    return days
+
+
+def join_keys(numbers, days):
+    """64-bit hash of each (report number, event day) pair"""
+    return pd.util.hash_pandas_object(pd.DataFrame({'number': numbers, 'day': days}), index=False).to_numpy()
+
+
+def build_key_index(ntsb):
+    """
+    Key index of the NTSB records: the sorted join key hashes with the row
+    each one came from. Repeated keys keep their first row first.
+    """
+    numbers = _report_numbers(ntsb['NTSB_RPRT_NBR'])
+    days = _event_days(ntsb['EVENT_LCL_DATE'], two_digit_years=True)
+    keys = join_keys(numbers, days)
+    order = np.argsort(keys, kind='stable')
+    return {'keys': keys[order], 'rows': order, 'numbers': numbers.astype(str), 'days': days}
+
+
+def load_key_index(directory, ntsb_path, ntsb):
+    """Return the saved key index of the NTSB file, rebuilding it if the file changed"""
+    path = os.path.join(directory, KEY_INDEX_NAME)
+    signature = np.asarray(file_signature(ntsb_path), dtype=np.int64)
+    try:
+        with np.load(path) as saved:
+            if np.array_equal(saved['signature'], signature):
+                return {name: saved[name] for name in ('keys', 'rows', 'numbers', 'days')}
+    except (OSError, KeyError, ValueError):
+        pass
+
+    index = build_key_index(ntsb)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, signature=signature, **index)
+    os.replace(tmp_path, path)
+    return index
+
+
+def probe(index, numbers, days):
+    """Return the NTSB row of each (number, day) pair, or -1 where none matches"""
+    keys = join_keys(numbers, days)
+    if len(index['keys']) == 0:
+        return np.full(len(keys), -1, dtype=np.intp)
+    positions = np.minimum(np.searchsorted(index['keys'], keys), len(index['keys']) - 1)
+    rows = index['rows'][positions]
+    # Compare the keys themselves too, so hash collisions never match
+    hit = ((index['keys'][positions] == keys) & (index['numbers'][rows] == numbers)
+           & (index['days'][rows] == days) & (numbers != '') & (days != NO_DAY))
+    return np.where(hit, rows, -1)
+
+
+def event_hours(times):
+    """Hour of each local time ('0800', '12:00', 1530), -1 when missing or invalid"""
+    clock = pd.to_numeric(pd.Series(times).astype('string').str.replace(':', '', regex=False).str.strip(),
+                          errors='coerce')
+    hours = clock // 100
+    valid = (hours >= 0) & (hours < 24) & (clock % 100 < 60)
+    return hours.where(valid).fillna(-1).to_numpy(dtype=np.int8)
+
+
+def ntsb_features(airline, ntsb, index):
+    """Return the NTSB-derived columns of the airline accidents, in their row order"""
+    rows = probe(index, _report_numbers(airline['Accident Number']), _event_days(airline['Event Date']))
+    matched = rows >= 0
+    taken = np.where(matched, rows, 0)
+
+    def from_ntsb(column, missing=np.nan):
+        values = pd.Series(ntsb[column]).to_numpy()
+        if len(values) == 0:
+            return np.full(len(rows), missing, dtype=object)
+        return np.where(matched, values[taken], missing)
+
+    uninjured = (pd.to_numeric(pd.Series(ntsb['FLT_CRW_INJ_NONE']), errors='coerce').fillna(0)
+                 + pd.to_numeric(pd.Series(ntsb['PAX_INJ_NONE']), errors='coerce').fillna(0)).to_numpy()
+    hours = event_hours(ntsb['EVENT_LCL_TIME'])
+    return pd.DataFrame({
+        'NTSB Matched': matched.astype(np.int8),
+        'Event Hour': np.where(matched, hours[taken] if len(hours) else -1, -1).astype(np.int8),
+        'NTSB Fatal Flag': from_ntsb('FATAL_FLAG'),
+        'NTSB Uninjured': np.where(matched, uninjured[taken] if len(uninjured) else np.nan, np.nan),
+        'NTSB State': from_ntsb('LOC_STATE_NAME'),
+    }, index=airline.index)
+
+
+def encode_columns(df):
+    """
+    Label-encode the categorical model inputs exactly as a LabelEncoder
+    fitted on the whole frame would. Returns ({'<col>_encoded': codes}, {col: classes})
+    """
+    encoded = {}
+    classes = {}
+    for col in LABEL_ENCODED_COLUMNS:
+        if col in df.columns:
+            codes, uniques = pd.factorize(df[col].fillna('Unknown').astype(str), sort=True)
+            encoded[f'{col}_encoded'] = codes.astype(np.int32)
+            classes[col] = [str(value) for value in uniques]
+    return encoded, classes
+
+
+def is_current(airline_path=AIRLINE_ACCIDENTS_PATH, ntsb_path=NTSB_DATA_PATH):
+    return snapshot.is_current(joined_dir_for(airline_path), airline_path, extra_sources=[ntsb_path])
+
+
+def join_features(airline_path=AIRLINE_ACCIDENTS_PATH, ntsb_path=NTSB_DATA_PATH):
+    """Join, derive and encode the airline accidents in memory; returns (table, metadata)"""
+    airline = load_dataset('airline_accidents', airline_path)
+    ntsb = load_dataset('ntsb_data', ntsb_path, parse_dates=True)
+
+    index = load_key_index(joined_dir_for(airline_path), ntsb_path, ntsb)
+    derived = ntsb_features(airline, ntsb, index)
+    encoded, classes = encode_columns(airline)
+    table = pd.concat([airline, derived, pd.DataFrame(encoded, index=airline.index)], axis=1)
+
+    metadata = {
+        'ntsb_rows': int(len(ntsb)),
+        'matched_rows': int(derived['NTSB Matched'].sum()),
+        'label_encoder_classes': classes,
+    }
+    return table, metadata
+
+
+def build_joined_features(airline_path=AIRLINE_ACCIDENTS_PATH, ntsb_path=NTSB_DATA_PATH):
+    """Join the airline accidents and write the table; returns its manifest"""
+    directory = joined_dir_for(airline_path)
+    table, metadata = join_features(airline_path, ntsb_path)
+    manifest = snapshot.write_snapshot(table, directory, airline_path, DATASETS['airline_accidents']['date_columns'],
+                                       extra_sources=[ntsb_path], metadata=metadata)
+    print(f"✓ Wrote joined feature table ({len(table)} rows, {metadata['matched_rows']} with an NTSB record) "
+          f"to {directory}/")
+    return manifest
+
+
+def load_training_dataset(parse_dates=True):
+    """
+    The airline accidents to train on: the joined table, or the plain
+    dataset (without NTSB features) when there is no NTSB file
+    """
+    if not os.path.exists(NTSB_DATA_PATH):
+        print(f"⚠ Warning: {NTSB_DATA_PATH} not found - training without the NTSB features")
+        ingest(['airline_accidents'])
+        return load_dataset('airline_accidents', parse_dates=parse_dates)
+    ingest_joined()
+    return load_joined_features(parse_dates=parse_dates)
+
+
+def ingest_joined(force=False):
+    """Refresh both snapshots, then the joined table if it is missing or stale"""
+    ingest(['airline_accidents', 'ntsb_data'])
+    if not force and is_current():
+        print(f"✓ Joined feature table {joined_dir_for(AIRLINE_ACCIDENTS_PATH)} is up to date")
+        return
+    build_joined_features()
+
+
+def load_joined_features(airline_path=AIRLINE_ACCIDENTS_PATH, ntsb_path=NTSB_DATA_PATH, parse_dates=False):
+    """
+    Open the joined table, or join in memory when either CSV changed since
+    it was written (as load_dataset() parses a CSV with a stale snapshot).
+    Never writes the table; see ingest_joined().
+    The label encoder classes of the _encoded columns are in
+    attrs['label_encoder_classes'], which preprocess_data() reuses.
+    """
+    directory = joined_dir_for(airline_path)
+    if is_current(airline_path, ntsb_path):
+        df = snapshot.load_snapshot(directory, parse_dates=parse_dates)
+        df.attrs['label_encoder_classes'] = snapshot.read_manifest(directory)['metadata']['label_encoder_classes']
+        return df
+
+    print(f"⚠ Warning: joined feature table {directory} is stale - joining in memory until it is re-ingested")
+    df, metadata = join_features(airline_path, ntsb_path)
+    if parse_dates:
+        for col in DATASETS['airline_accidents']['date_columns']:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+    df.attrs['label_encoder_classes'] = metadata['label_encoder_classes']
+    return df
+
+
+def load_served_joined_features(sources=JOINED_SOURCES):
+    """
+    Load the joined table compacted for serving, as load_served_dataset()
+    does for a single dataset. Encoded columns are dropped; the endpoints
+    read the original values.
+    """
+    airline_path, ntsb_path = sources
+    df = load_joined_features(airline_path, ntsb_path)
+    spec = DATASETS['airline_accidents']['compact']
+    encoded = [col for col in df.columns if col.endswith('_encoded')]
+    df, report = compact_frame(
+        df,
+        date_columns=DATASETS['airline_accidents']['date_columns'],
+        categorical_columns=spec['categorical_columns'] + ['NTSB Fatal Flag', 'NTSB State'],
+        count_columns=spec['count_columns'],
+        drop_columns=spec['drop_columns'] + encoded,
+    )
+    df.attrs.pop('label_encoder_classes', None)
+    print_report('airline_accidents (joined)', report)
+    return df
+
+
+if __name__ == '__main__':
+    ingest_joined(force='--force' in sys.argv[1:])
@@ -0,0 +1,110 @@
+"""
+Per-process memory of the API's gunicorn workers
+
+Reads /proc/<pid>/smaps_rollup (Linux). For each process:
+
+    rss   every resident page it maps, shared or not
+    pss   proportional set size: each shared page split between its sharers
+    uss   unique set size: pages only this process maps. This is what one
+          more worker costs, and what loading in the master before the fork
+          (see gunicorn.conf.py) saves.
+
+Report a gunicorn master and its workers:
+    python memory_report.py <master pid> [--json]
+"""
+import argparse
+import json
+import os
+
+# smaps_rollup fields, in kB, summed into each reported value
+FIELDS = {
+    'rss': ('Rss',),
+    'pss': ('Pss',),
+    'uss': ('Private_Clean', 'Private_Dirty'),
+    'shared': ('Shared_Clean', 'Shared_Dirty'),
+}
+
+
+def process_memory(pid='self'):
+    """Return {'rss', 'pss', 'uss', 'shared'} in bytes for a process, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    values = {}
+    for line in lines[1:]:
+        name, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts:
+            values[name] = int(parts[0]) * 1024
+    return {key: sum(values.get(name, 0) for name in names) for key, names in FIELDS.items()}
+
+
+def child_pids(pid):
+    """Return the pids of a process's direct children"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; the fields after it do not
+        if int(stat.rpartition(')')[2].split()[1]) == int(pid):
+            children.append(int(entry))
+    return sorted(children)
+
+
+def worker_report(master_pid):
+    """Memory of a master process, each of its workers and the workers' totals"""
+    workers = []
+    for pid in child_pids(master_pid):
+        memory = process_memory(pid)
+        if memory is not None:
+            workers.append({'pid': pid, **memory})
+    return {
+        'master': {'pid': int(master_pid), **(process_memory(master_pid) or {})},
+        'workers': workers,
+        'totals': {key: sum(worker[key] for worker in workers) for key in FIELDS},
+    }
+
+
+def _mb(value):
+    return f'{value / (1 << 20):9.1f}'
+
+
+def print_report(report):
+    print(f"{'process':<16}{'rss MB':>9}{'pss MB':>9}{'uss MB':>9}{'shared MB':>11}")
+    rows = [(f"master {report['master']['pid']}", report['master'])]
+    rows += [(f"worker {worker['pid']}", worker) for worker in report['workers']]
+    rows.append((f"{len(report['workers'])} workers", report['totals']))
+    for label, memory in rows:
+        if 'rss' in memory:
+            print(f"{label:<16}{_mb(memory['rss'])}{_mb(memory['pss'])}{_mb(memory['uss'])}  {_mb(memory['shared'])}")
+    if report['workers']:
+        average = report['totals']['uss'] / len(report['workers'])
+        print(f"\nUnique memory per worker: {average / (1 << 20):.1f} MB on average")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the unique memory of each gunicorn worker')
+    parser.add_argument('master_pid', type=int, help='pid of the gunicorn master')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    if process_memory(args.master_pid) is None:
+        print(f"✗ No memory information for pid {args.master_pid} (needs Linux /proc/<pid>/smaps_rollup)")
+        return
+    report = worker_report(args.master_pid)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
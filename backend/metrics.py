@@ -0,0 +1,240 @@
+"""
+Lightweight in-process metrics exposed in the Prometheus text format
+
+Counters and histograms are plain Python objects guarded by a lock; an
+observation is a bisect and two additions, so instrumentation can stay on
+in production. Request handlers time their work in named stages:
+
+    with stage('serialize'):
+        body = encode_frame(frame)
+
+Stage timings feed a histogram per stage and are also collected for the
+current request, so they can be reported in a Server-Timing header. Stages
+may nest; each records only its own time, excluding nested stages.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds in seconds, from cache hits to model training sized work
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric with one time series per combination of label values"""
+
+    type = None
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, key):
+        return list(zip(self.label_names, key))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in series:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Index of the first bucket whose upper bound is >= value
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', labels + [('le', _format_number(float(bound)))], cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+    """
+    Set of metrics rendered together. Collectors are callables returning
+    (name, type, help, [(labels, value), ...]) tuples for values kept
+    elsewhere, such as the counters of a cache.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, label_names=()):
+        metric = Counter(name, help, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """Register collect(), which is called on every render; returns collect"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"⚠ Metrics collector failed: {e}")
+                continue
+            for name, metric_type, help, samples in families:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(list(labels.items()))} {_format_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry served at /api/metrics
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'aviation_stage_duration_seconds',
+    'Time spent in each request processing stage, excluding nested stages',
+    ('stage',)
+)
+
+# Seconds spent in nested stages of the innermost active stage
+_nested_seconds = ContextVar('nested_seconds', default=None)
+
+# Stage -> seconds of the request being handled, or None outside requests
+_request_stages = ContextVar('request_stages', default=None)
+
+
+def _record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one observation of a stage"""
+    nested = [0.0]
+    token = _nested_seconds.set(nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _nested_seconds.reset(token)
+        parent = _nested_seconds.get()
+        if parent is not None:
+            parent[0] += elapsed
+        _record_stage(name, elapsed - nested[0])
+
+
+def timed_stream(chunks, name):
+    """
+    Yield from a streamed response body, timing the work of producing its
+    chunks as one observation of a stage once the stream ends
+    """
+    elapsed = 0.0
+    iterator = iter(chunks)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield chunk
+    finally:
+        STAGE_SECONDS.observe(elapsed, stage=name)
+
+
+def begin_request():
+    """Start collecting stage timings for the current request"""
+    _request_stages.set({})
+
+
+def request_stages():
+    """Return stage -> seconds recorded so far for the current request"""
+    return _request_stages.get() or {}
+
+
+def server_timing(stages, total=None):
+    """Format stage timings as a Server-Timing header value"""
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in stages.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
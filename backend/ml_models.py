@@ -9,18 +9,229 @@ from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.metrics import mean_squared_error, accuracy_score, classification_report
 import pickle
-import os
+from prediction_cache import PredictionCache
+from forest_engine import CompiledForest
+from model_bundle import ModelBundle, label_encoders_from_classes, write_bundle
+
+# Inference backends for the random forests
+INFERENCE_BACKENDS = ('sklearn', 'compiled', 'compact')
+
+# Larger batches are faster through sklearn's Cython tree traversal
+COMPILED_MAX_BATCH = 1024
+
+# Feature order used by models saved before the schema was persisted
+DEFAULT_FEATURE_COLUMNS = ['Year', 'Month', 'DayOfWeek', 'Number of Engines',
+                           'Country_encoded', 'Weather Condition_encoded',
+                           'Broad Phase of Flight_encoded', 'Engine Type_encoded']
+
+# Categorical columns label-encoded by preprocess_data
+LABEL_ENCODED_COLUMNS = ['Country', 'Weather Condition', 'Broad Phase of Flight', 
+                         'Aircraft Category', 'Engine Type', 'FAR Description']
+
+# Prediction input keys for each numeric model feature, with their defaults
+NUMERIC_FEATURE_INPUTS = {
+    'Year': ('year', 2024),
+    'Month': ('month', 6),
+    'DayOfWeek': ('day_of_week', 3),  # Day of week (0-6)
+    'Number of Engines': ('number_of_engines', 2),
+    'Event Hour': ('hour', -1),  # Local hour (0-23), -1 when unknown
+}
+
+# Prediction input keys (first one present wins) for each label-encoded column
+CATEGORICAL_FEATURE_INPUTS = {
+    'Country': ('country',),
+    'Weather Condition': ('weather_condition',),
+    'Broad Phase of Flight': ('broad_phase_of_flight', 'flight_phase'),
+    'Engine Type': ('engine_type',),
+}
+
+
+# Hyperparameters shared by both random forests
+FOREST_PARAMS = {'n_estimators': 100, 'max_depth': 10, 'random_state': 42}
+
+# Fewer usable rows than this is not enough to train on
+MIN_TRAINING_ROWS = 100
+
+
+def _split(n_rows):
+    """Train/test row positions, the same split train_test_split makes of the arrays"""
+    return train_test_split(np.arange(n_rows), test_size=0.2, random_state=42)
+
+
+def _regression_split(features):
+    """Train/test row positions among the rows that have a severity score"""
+    rows = np.flatnonzero(~np.isnan(features['severity_score']))
+    train, test = _split(len(rows))
+    return rows[train], rows[test]
+
+
+# The fit_* functions below only read the shared training features and
+# return what they fitted, so they can run side by side in worker processes
+# (see train_models.py). n_jobs parallelizes a forest across trees.
+
+def fit_severity_classifier(features, n_jobs=None):
+    """
+    Fit and evaluate the severity classifier
+    Returns the model with its accuracy and classification report, or None
+    """
+    X = features['X']
+    y = features['severity']
+    if len(X) < MIN_TRAINING_ROWS:
+        return None
+    
+    train, test = _split(len(X))
+    model = RandomForestClassifier(n_jobs=n_jobs, **FOREST_PARAMS)
+    model.fit(X[train], y[train])
+    # Evaluate and serve with single-threaded predictions
+    model.set_params(n_jobs=None)
+    
+    y_pred = model.predict(X[test])
+    return {
+        'model': model,
+        'accuracy': accuracy_score(y[test], y_pred),
+        'report': classification_report(y[test], y_pred)
+    }
+
+
+def fit_linear_regressor(features):
+    """
+    Fit and evaluate the scaled linear severity score regressor
+    Returns the model, its scaler, test predictions and RMSE, or None
+    """
+    train, test = _regression_split(features)
+    if len(train) + len(test) < MIN_TRAINING_ROWS:
+        return None
+    
+    X = features['X']
+    y = features['severity_score']
+    scaler = StandardScaler()
+    model = LinearRegression()
+    model.fit(scaler.fit_transform(X[train]), y[train])
+    
+    y_pred = model.predict(scaler.transform(X[test]))
+    return {
+        'model': model,
+        'scaler': scaler,
+        'y_pred': y_pred,
+        'rmse': np.sqrt(mean_squared_error(y[test], y_pred))
+    }
+
+
+def fit_forest_regressor(features, n_jobs=None):
+    """
+    Fit and evaluate the random forest severity score regressor
+    Returns the model, test predictions and RMSE, or None
+    """
+    train, test = _regression_split(features)
+    if len(train) + len(test) < MIN_TRAINING_ROWS:
+        return None
+    
+    X = features['X']
+    y = features['severity_score']
+    model = RandomForestRegressor(n_jobs=n_jobs, **FOREST_PARAMS)
+    model.fit(X[train], y[train])
+    model.set_params(n_jobs=None)
+    
+    y_pred = model.predict(X[test])
+    return {
+        'model': model,
+        'y_pred': y_pred,
+        'rmse': np.sqrt(mean_squared_error(y[test], y_pred))
+    }
 
 
 class AviationMLModels:
     """Class to handle ML model training and predictions"""
     
-    def __init__(self):
+    def __init__(self, prediction_cache_size=4096, inference_backend='sklearn'):
+        if inference_backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend '{inference_backend}', expected one of {INFERENCE_BACKENDS}")
+        
         self.linear_model = None
-        self.random_forest_classifier = None
-        self.random_forest_regressor = None
+        self._random_forest_classifier = None
+        self._random_forest_regressor = None
         self.scaler = StandardScaler()
         self.label_encoders = {}
+        self._encoder_lookup = {}
+        # Ordered model inputs, recorded at training time and saved with the bundle
+        self.feature_columns = list(DEFAULT_FEATURE_COLUMNS)
+        # Bundle the models were loaded from; forests are unpickled from it on demand
+        self.bundle = None
+        # Bumped whenever the fitted models change; scopes the prediction cache
+        self.model_version = 0
+        self.prediction_cache = PredictionCache(maxsize=prediction_cache_size)
+        # 'compiled' scores small batches with flat-array copies of the forests;
+        # 'compact' scores every batch with the bundle's pruned float32 variant
+        self.inference_backend = inference_backend
+        self.compiled_classifier = None
+        self.compiled_regressor = None
+    
+    @property
+    def random_forest_classifier(self):
+        if self._random_forest_classifier is None and self.bundle is not None:
+            self._random_forest_classifier = self.bundle.load('rf_classifier')
+        return self._random_forest_classifier
+    
+    @random_forest_classifier.setter
+    def random_forest_classifier(self, model):
+        self._random_forest_classifier = model
+    
+    @property
+    def random_forest_regressor(self):
+        if self._random_forest_regressor is None and self.bundle is not None:
+            self._random_forest_regressor = self.bundle.load('rf_regressor')
+        return self._random_forest_regressor
+    
+    @random_forest_regressor.setter
+    def random_forest_regressor(self, model):
+        self._random_forest_regressor = model
+        
+    def _models_changed(self, bundle=None):
+        """
+        Start a new model version and drop predictions cached for the old one
+        bundle is the ModelBundle the models were just loaded from, if any
+        """
+        if bundle is None and self.bundle is not None:
+            # Models were refit in memory - load any forest that still only
+            # lives in the old bundle before detaching from it
+            self._random_forest_classifier = self.random_forest_classifier
+            self._random_forest_regressor = self.random_forest_regressor
+        self.bundle = bundle
+        
+        self.model_version += 1
+        self.prediction_cache.invalidate(self.model_version)
+        self._encoder_lookup = {
+            col: {label: code for code, label in enumerate(encoder.classes_)}
+            for col, encoder in self.label_encoders.items()
+        }
+        
+        if self.inference_backend in ('compiled', 'compact'):
+            if bundle is not None:
+                compact = self.inference_backend == 'compact' and bundle.has_compact()
+                if self.inference_backend == 'compact' and not compact:
+                    print(f"⚠ Bundle {bundle.bundle_id} has no compact forests - serving the exact compiled ones")
+                # Memory-mapped node arrays; the sklearn forests stay unloaded
+                self.compiled_classifier = bundle.compiled_forest('rf_classifier', compact=compact)
+                self.compiled_regressor = bundle.compiled_forest('rf_regressor', compact=compact)
+            else:
+                self.compiled_classifier = (CompiledForest.from_sklearn(self.random_forest_classifier)
+                                            if self.random_forest_classifier else None)
+                self.compiled_regressor = (CompiledForest.from_sklearn(self.random_forest_regressor)
+                                           if self.random_forest_regressor else None)
+    
+    def _models_available(self):
+        """Check whether both forests are fitted or can be loaded from the bundle"""
+        if self.bundle is not None:
+            return self.bundle.has('rf_classifier') and self.bundle.has('rf_regressor')
+        return self._random_forest_classifier is not None and self._random_forest_regressor is not None
+    
+    def _forest(self, kind, n_rows):
+        """Pick the sklearn 'classifier'/'regressor' forest or its compiled copy for n_rows"""
+        compiled = self.compiled_classifier if kind == 'classifier' else self.compiled_regressor
+        # Compact forests answer every batch, so predictions never depend on batch size
+        if compiled is not None and (n_rows <= COMPILED_MAX_BATCH or self.inference_backend == 'compact'):
+            return compiled
+        return self.random_forest_classifier if kind == 'classifier' else self.random_forest_regressor
         
     def preprocess_data(self, df):
         """
@@ -38,11 +249,16 @@ class AviationMLModels:
             data['Quarter'] = data['Event Date'].dt.quarter
         
         # Handle categorical variables
-        categorical_columns = ['Country', 'Weather Condition', 'Broad Phase of Flight', 
-                               'Aircraft Category', 'Engine Type', 'FAR Description']
-        
-        for col in categorical_columns:
+        # Frames from the joined feature table arrive already encoded, with
+        # the classes used in attrs (see joined_features.py)
+        encoded_classes = df.attrs.get('label_encoder_classes', {})
+        for col in LABEL_ENCODED_COLUMNS:
             if col in data.columns:
+                if f'{col}_encoded' in data.columns and col in encoded_classes:
+                    if col not in self.label_encoders:
+                        self.label_encoders.update(label_encoders_from_classes({col: encoded_classes[col]}))
+                    if list(self.label_encoders[col].classes_) == encoded_classes[col]:
+                        continue
                 if col not in self.label_encoders:
                     self.label_encoders[col] = LabelEncoder()
                     data[f'{col}_encoded'] = self.label_encoders[col].fit_transform(
@@ -72,12 +288,13 @@ class AviationMLModels:
         
         return data
     
-    def train_severity_classifier(self, df):
+    def build_training_features(self, df):
         """
-        Train Random Forest classifier to predict accident severity
+        Preprocess df once into the encoded feature matrix and both targets
+        Returns a dict with X, feature_columns, severity (class labels) and
+        severity_score (NaN where it cannot be computed), for the rows that
+        have every feature and an Injury Severity label
         """
-        print("Training severity classification model...")
-        
         # Preprocess data
         data = self.preprocess_data(df)
         
@@ -90,6 +307,10 @@ class AviationMLModels:
             if col in data.columns:
                 feature_columns.append(col)
         
+        # Local hour of the matched NTSB record (-1 when unknown, see joined_features.py)
+        if 'Event Hour' in data.columns:
+            feature_columns.append('Event Hour')
+        
         # Filter valid data - keep only rows with all required features
         data = data.dropna(subset=feature_columns + ['Injury Severity'])
         
@@ -97,199 +318,236 @@ class AviationMLModels:
         data['Number of Engines'] = pd.to_numeric(data['Number of Engines'], errors='coerce')
         data = data.dropna(subset=['Number of Engines'])
         
-        if len(data) < 100:
+        if 'Severity_Score' in data.columns:
+            severity_score = pd.to_numeric(data['Severity_Score'], errors='coerce').astype(float).values
+        else:
+            severity_score = np.full(len(data), np.nan)
+        
+        # Prepare X and targets - convert to numeric array
+        return {
+            'X': data[feature_columns].astype(float).values,
+            'feature_columns': feature_columns,
+            'severity': data['Injury Severity'].values,
+            'severity_score': severity_score
+        }
+    
+    def install_classifier(self, features, result):
+        """
+        Adopt a classifier fitted by fit_severity_classifier() and report on it
+        """
+        if result is None:
             print("Insufficient data for training")
             return None
         
-        # Prepare X and y - convert to numeric array
-        X = data[feature_columns].astype(float).values
-        y = data['Injury Severity'].values
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
-        
-        # Train model
-        self.random_forest_classifier = RandomForestClassifier(
-            n_estimators=100, 
-            max_depth=10,
-            random_state=42
-        )
-        self.random_forest_classifier.fit(X_train, y_train)
-        
-        # Evaluate
-        y_pred = self.random_forest_classifier.predict(X_test)
-        accuracy = accuracy_score(y_test, y_pred)
+        feature_columns = features['feature_columns']
+        self.feature_columns = feature_columns
+        self.random_forest_classifier = result['model']
+        self._models_changed()
         
-        print(f"Classification Model Accuracy: {accuracy:.4f}")
+        print(f"Classification Model Accuracy: {result['accuracy']:.4f}")
         print("\nClassification Report:")
-        print(classification_report(y_test, y_pred))
+        print(result['report'])
         
         return {
-            'accuracy': accuracy,
+            'accuracy': result['accuracy'],
             'feature_importance': dict(zip(feature_columns, 
                                           self.random_forest_classifier.feature_importances_))
         }
     
-    def train_severity_regressor(self, df):
+    def train_severity_classifier(self, df=None, features=None, n_jobs=None):
         """
-        Train models to predict severity score (regression)
+        Train Random Forest classifier to predict accident severity
+        Pass features from build_training_features() to skip preprocessing df
         """
-        print("Training severity regression models...")
-        
-        # Preprocess data
-        data = self.preprocess_data(df)
+        print("Training severity classification model...")
         
-        # Define features
-        feature_columns = ['Year', 'Month', 'DayOfWeek', 'Number of Engines']
+        if features is None:
+            features = self.build_training_features(df)
         
-        # Add encoded categorical features
-        for col in ['Country_encoded', 'Weather Condition_encoded', 
-                    'Broad Phase of Flight_encoded', 'Engine Type_encoded']:
-            if col in data.columns:
-                feature_columns.append(col)
+        return self.install_classifier(features, fit_severity_classifier(features, n_jobs=n_jobs))
+    
+    def install_regressors(self, features, linear, forest):
+        """
+        Adopt the models fitted by fit_linear_regressor() and
+        fit_forest_regressor() and report on them
+        """
+        if linear is None or forest is None:
+            print("Insufficient data for training")
+            return None
         
-        # Filter valid data - keep Injury Severity for grouping later
-        data = data.dropna(subset=feature_columns + ['Severity_Score', 'Injury Severity'])
+        feature_columns = features['feature_columns']
+        self.feature_columns = feature_columns
+        self.scaler = linear['scaler']
+        self.linear_model = linear['model']
+        self.random_forest_regressor = forest['model']
+        self._models_changed()
         
-        # Ensure Number of Engines is numeric
-        data['Number of Engines'] = pd.to_numeric(data['Number of Engines'], errors='coerce')
-        data = data.dropna(subset=['Number of Engines'])
+        print(f"Linear Regression RMSE: {linear['rmse']:.4f}")
+        print(f"Random Forest RMSE: {forest['rmse']:.4f}")
         
-        # Ensure Severity_Score is numeric
-        data['Severity_Score'] = pd.to_numeric(data['Severity_Score'], errors='coerce')
-        data = data.dropna(subset=['Severity_Score'])
+        _, test = _regression_split(features)
         
-        if len(data) < 100:
-            print("Insufficient data for training")
-            return None
+        return {
+            'linear_regression_rmse': linear['rmse'],
+            'random_forest_rmse': forest['rmse'],
+            'feature_importance': dict(zip(feature_columns, 
+                                          self.random_forest_regressor.feature_importances_)),
+            'X_test': features['X'][test],
+            'y_test': features['severity_score'][test],
+            'y_pred_linear': linear['y_pred'],
+            'y_pred_rf': forest['y_pred'],
+            'feature_names': feature_columns,
+            'severity_test': features['severity'][test]  # Severity labels for test data
+        }
+    
+    def train_severity_regressor(self, df=None, features=None, n_jobs=None):
+        """
+        Train models to predict severity score (regression)
+        Pass features from build_training_features() to skip preprocessing df
+        """
+        print("Training severity regression models...")
         
-        # Prepare X and y - convert to numeric array
-        X = data[feature_columns].astype(float).values
-        y = data['Severity_Score'].astype(float).values
-        severity_labels = data['Injury Severity'].values  # Keep severity labels
+        if features is None:
+            features = self.build_training_features(df)
         
-        # Split data
-        X_train, X_test, y_train, y_test, _, severity_test = train_test_split(
-            X, y, severity_labels, test_size=0.2, random_state=42
+        return self.install_regressors(
+            features,
+            fit_linear_regressor(features),
+            fit_forest_regressor(features, n_jobs=n_jobs)
         )
+    
+    def _encode(self, column, value):
+        """
+        Label-encode one categorical input value
+        Unseen or missing values map to the 'Unknown' class used for missing
+        data in training, and to 0 when no encoder was saved with the models
+        """
+        lookup = self._encoder_lookup.get(column)
+        if not lookup:
+            return 0
+        if value is not None and str(value) in lookup:
+            return lookup[str(value)]
+        return lookup.get('Unknown', 0)
+    
+    def _feature_row(self, input_data):
+        """
+        Build the model feature vector for one input dict, in training order
+        """
+        features = []
+        for feature in self.feature_columns:
+            if feature in NUMERIC_FEATURE_INPUTS:
+                key, default = NUMERIC_FEATURE_INPUTS[feature]
+                features.append(input_data.get(key, default))
+            elif feature.endswith('_encoded'):
+                column = feature[:-len('_encoded')]
+                keys = CATEGORICAL_FEATURE_INPUTS.get(column, ())
+                value = next((input_data[key] for key in keys if input_data.get(key) is not None), None)
+                features.append(self._encode(column, value))
+            else:
+                features.append(0)
         
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
-        
-        # Train Linear Regression
-        self.linear_model = LinearRegression()
-        self.linear_model.fit(X_train_scaled, y_train)
-        y_pred_linear = self.linear_model.predict(X_test_scaled)
-        rmse_linear = np.sqrt(mean_squared_error(y_test, y_pred_linear))
-        
-        # Train Random Forest Regressor
-        self.random_forest_regressor = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42
-        )
-        self.random_forest_regressor.fit(X_train, y_train)
-        y_pred_rf = self.random_forest_regressor.predict(X_test)
-        rmse_rf = np.sqrt(mean_squared_error(y_test, y_pred_rf))
+        return features
+    
+    def _format_prediction(self, class_labels, severity_class, severity_proba, severity_score):
+        """
+        Turn the raw model outputs for one row into the prediction response
+        """
+        confidence = float(np.max(severity_proba))  # Keep as 0-1 range
+        
+        # Get class labels and probabilities
+        class_probabilities = [
+            {
+                'class': str(label),
+                'probability': round(float(prob), 4)  # Keep as 0-1 range
+            }
+            for label, prob in zip(class_labels, severity_proba)
+        ]
+        # Sort by probability descending
+        class_probabilities.sort(key=lambda x: x['probability'], reverse=True)
+        
+        severity_score = float(severity_score)
+        
+        # Determine risk level based on severity score
+        if severity_score > 10:
+            risk_level = 'High'
+        elif severity_score > 5:
+            risk_level = 'Medium'
+        else:
+            risk_level = 'Low'
         
-        print(f"Linear Regression RMSE: {rmse_linear:.4f}")
-        print(f"Random Forest RMSE: {rmse_rf:.4f}")
+        # Calculate risk score percentage (0-100)
+        risk_score = min(100, int(severity_score * 10))
         
-        # Get feature names for interpretation
-        feature_names = feature_columns
+        # Estimate delay (simple heuristic)
+        delay_prediction = int(severity_score * 5)
         
         return {
-            'linear_regression_rmse': rmse_linear,
-            'random_forest_rmse': rmse_rf,
-            'feature_importance': dict(zip(feature_columns, 
-                                          self.random_forest_regressor.feature_importances_)),
-            'X_test': X_test,
-            'y_test': y_test,
-            'y_pred_linear': y_pred_linear,
-            'y_pred_rf': y_pred_rf,
-            'feature_names': feature_names,
-            'severity_test': severity_test  # Add severity labels for test data
+            'severity_class': str(severity_class),
+            'severity_score': round(severity_score, 2),
+            'risk_level': risk_level,
+            'risk_score': risk_score,
+            'delay_prediction': delay_prediction,
+            'confidence': round(confidence, 4),  # Keep as 0-1 range
+            'class_probabilities': class_probabilities
         }
     
-    def predict(self, input_data):
+    def predict_batch(self, inputs):
         """
-        Make predictions on new data
-        input_data should be a dict with keys matching training features
+        Make predictions for a list of input dicts
+        Builds one feature matrix and runs each model once over all rows,
+        returning one prediction dict per input in the same order.
+        Feature vectors already scored by the current model version are
+        served from the prediction cache.
         """
-        if not self.random_forest_classifier or not self.random_forest_regressor:
-            return {
+        if not self._models_available():
+            return [{
                 'severity_class': 'Unknown',
                 'severity_score': 0.0,
                 'risk_level': 'Unknown',
                 'confidence': 0.0,
                 'error': 'Models not loaded'
-            }
+            } for _ in inputs]
+        
+        if len(inputs) == 0:
+            return []
         
         try:
-            # Create feature array from input_data
-            # Map form fields to model features
-            features = [
-                2024,  # Year - default to current year
-                input_data.get('month', 6),  # Month
-                input_data.get('day_of_week', 3),  # Day of week (0-6)
-                input_data.get('number_of_engines', 2)  # Number of engines
-            ]
-            
-            # Add encoded categorical features with defaults
-            # These would normally come from label encoders
-            features.extend([0, 0, 0, 0])  # Placeholder encoded features
+            rows = [self._feature_row(input_data) for input_data in inputs]
+            keys = [PredictionCache.key(row) for row in rows]
+            version = self.model_version
             
-            # Convert to numpy array
-            X = np.array([features])
+            # Reuse cached outputs; collect the distinct feature vectors still to score
+            outputs = [self.prediction_cache.get(version, key) for key in keys]
+            missing = {}
+            for key, row, output in zip(keys, rows, outputs):
+                if output is None and key not in missing:
+                    missing[key] = row
             
-            # Make predictions
-            severity_class = self.random_forest_classifier.predict(X)[0]
-            severity_proba = self.random_forest_classifier.predict_proba(X)[0]
-            confidence = float(np.max(severity_proba))  # Keep as 0-1 range
+            computed = {}
+            if missing:
+                X = np.array(list(missing.values()))
+                
+                # One probability pass yields both the class and its confidence;
+                # RandomForestClassifier.predict is the argmax of predict_proba
+                classifier = self._forest('classifier', len(X))
+                severity_proba = classifier.predict_proba(X)
+                severity_class = classifier.classes_.take(np.argmax(severity_proba, axis=1))
+                
+                # Predict severity scores
+                regressor = self._forest('regressor', len(X))
+                severity_score = regressor.predict(X)
+                
+                for i, key in enumerate(missing):
+                    output = (classifier.classes_, severity_class[i], severity_proba[i].copy(), severity_score[i])
+                    self.prediction_cache.put(version, key, output)
+                    computed[key] = output
             
-            # Get class labels and probabilities
-            class_labels = self.random_forest_classifier.classes_
-            class_probabilities = [
-                {
-                    'class': str(label),
-                    'probability': round(float(prob), 4)  # Keep as 0-1 range
-                }
-                for label, prob in zip(class_labels, severity_proba)
+            return [
+                self._format_prediction(*(output if output is not None else computed[key]))
+                for key, output in zip(keys, outputs)
             ]
-            # Sort by probability descending
-            class_probabilities.sort(key=lambda x: x['probability'], reverse=True)
-            
-            # Predict severity score
-            severity_score = float(self.random_forest_regressor.predict(X)[0])
-            
-            # Determine risk level based on severity score
-            if severity_score > 10:
-                risk_level = 'High'
-            elif severity_score > 5:
-                risk_level = 'Medium'
-            else:
-                risk_level = 'Low'
-            
-            # Calculate risk score percentage (0-100)
-            risk_score = min(100, int(severity_score * 10))
-            
-            # Estimate delay (simple heuristic)
-            delay_prediction = int(severity_score * 5)
-            
-            return {
-                'severity_class': str(severity_class),
-                'severity_score': round(severity_score, 2),
-                'risk_level': risk_level,
-                'risk_score': risk_score,
-                'delay_prediction': delay_prediction,
-                'confidence': round(confidence, 4),  # Keep as 0-1 range
-                'class_probabilities': class_probabilities
-            }
         except Exception as e:
-            return {
+            return [{
                 'severity_class': 'Error',
                 'severity_score': 0.0,
                 'risk_level': 'Unknown',
@@ -297,32 +555,48 @@ class AviationMLModels:
                 'delay_prediction': 0,
                 'confidence': 0.0,
                 'error': str(e)
-            }
+            } for _ in inputs]
     
-    def save_models(self, directory='models'):
-        """Save trained models to disk"""
-        os.makedirs(directory, exist_ok=True)
-        
-        if self.linear_model:
-            with open(f'{directory}/linear_model.pkl', 'wb') as f:
-                pickle.dump(self.linear_model, f)
-        
-        if self.random_forest_classifier:
-            with open(f'{directory}/rf_classifier.pkl', 'wb') as f:
-                pickle.dump(self.random_forest_classifier, f)
-        
-        if self.random_forest_regressor:
-            with open(f'{directory}/rf_regressor.pkl', 'wb') as f:
-                pickle.dump(self.random_forest_regressor, f)
-        
-        with open(f'{directory}/scaler.pkl', 'wb') as f:
-            pickle.dump(self.scaler, f)
+    def predict(self, input_data):
+        """
+        Make predictions on new data
+        input_data should be a dict with keys matching training features
+        """
+        return self.predict_batch([input_data])[0]
+    
+    def save_models(self, directory='models', metrics=None, lineage=None):
+        """
+        Save trained models, label encoders and feature schema to disk
+        as a new versioned bundle and make it the current one
+        """
+        bundle_id = write_bundle(self, directory, metrics=metrics, lineage=lineage)
         
-        print(f"Models saved to {directory}/")
+        print(f"Models saved to {directory}/bundles/{bundle_id}/")
+        return bundle_id
     
-    def load_models(self, directory='models'):
-        """Load trained models from disk"""
+    def load_models(self, directory='models', bundle_id=None):
+        """
+        Load trained models from disk
+        bundle_id picks a bundle other than the one CURRENT points at
+        """
         try:
+            if bundle_id is not None:
+                bundle = ModelBundle.open(bundle_id, directory)
+            else:
+                bundle = ModelBundle.open_current(directory)
+            if bundle is not None:
+                self.linear_model = bundle.load('linear_model')
+                self.scaler = bundle.load('scaler')
+                self.label_encoders = bundle.label_encoders()
+                self.feature_columns = bundle.feature_columns
+                # Forests are unpickled from the bundle on first use
+                self._random_forest_classifier = None
+                self._random_forest_regressor = None
+                self._models_changed(bundle)
+                print(f"Models loaded successfully from bundle {bundle.bundle_id}")
+                return True
+            
+            # Models saved as separate pickles before bundles existed
             with open(f'{directory}/linear_model.pkl', 'rb') as f:
                 self.linear_model = pickle.load(f)
             
@@ -335,13 +609,15 @@ class AviationMLModels:
             with open(f'{directory}/scaler.pkl', 'rb') as f:
                 self.scaler = pickle.load(f)
             
+            self.label_encoders = {}
+            self.feature_columns = list(DEFAULT_FEATURE_COLUMNS)
+            self._models_changed()
             print("Models loaded successfully")
             return True
         except Exception as e:
             print(f"Error loading models: {e}")
             return False
 
-
 if __name__ == "__main__":
     # Test the ML models
     print("Aviation ML Models Module")
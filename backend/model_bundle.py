@@ -0,0 +1,334 @@
+"""
+Versioned model bundles
+
+Every training run is saved as one bundle directory under models/bundles/:
+
+    models/bundles/<bundle_id>/
+        manifest.json           format version, feature schema, label encoder
+                                classes, metrics, lineage and the size and
+                                sha256 of every file
+        linear_model.pkl        LinearRegression
+        scaler.pkl              StandardScaler
+        rf_classifier.pkl       RandomForestClassifier
+        rf_regressor.pkl        RandomForestRegressor
+        rf_classifier.<array>.npy, rf_regressor.<array>.npy
+                                compiled forest node arrays (see forest_engine)
+        rf_classifier.compact.<array>.npy, rf_regressor.compact.<array>.npy
+                                optional pruned float32 variant for
+                                latency-critical serving (see compact_forests)
+    models/bundles/CURRENT      id of the bundle the API serves
+
+A bundle is written to a temporary directory and renamed into place, and
+CURRENT is replaced atomically, so readers never see a half-written run.
+The compiled forest arrays are memory-mapped, and the pickled forests are
+only unpickled when something actually needs the sklearn objects.
+Opening a bundle checks file sizes; a file's checksum is verified when it
+is first read, so the forest pickles a server never unpickles are never
+hashed. verify() checks every checksum, as activating a bundle does.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import uuid
+from datetime import datetime
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+from forest_engine import CompiledForest
+
+BUNDLE_FORMAT_VERSION = 1
+BUNDLES_DIRNAME = 'bundles'
+CURRENT_POINTER = 'CURRENT'
+MANIFEST_NAME = 'manifest.json'
+
+FORESTS = ('rf_classifier', 'rf_regressor')
+
+# Name of the optional smaller forest variant and its manifest section
+COMPACT_VARIANT = 'compact'
+
+
+class BundleIntegrityError(Exception):
+    """Raised when a bundle file is missing or does not match its size or checksum"""
+
+
+def bundles_dir(directory='models'):
+    """Return the directory holding all bundles of a models directory"""
+    return os.path.join(directory, BUNDLES_DIRNAME)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def label_encoders_from_classes(classes_by_column):
+    """Rebuild fitted LabelEncoders from {column: [classes]}"""
+    encoders = {}
+    for col, classes in classes_by_column.items():
+        encoder = LabelEncoder()
+        encoder.classes_ = np.asarray(classes, dtype=object)
+        encoders[col] = encoder
+    return encoders
+
+
+def current_bundle_id(directory='models'):
+    """Return the id of the current bundle, or None if no bundle has been published"""
+    try:
+        with open(os.path.join(bundles_dir(directory), CURRENT_POINTER), 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def list_bundles(directory='models'):
+    """Return the ids of every published bundle, oldest first"""
+    root = bundles_dir(directory)
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    # Ids start with their creation time, so they sort chronologically
+    return sorted(name for name in names
+                  if not name.startswith('.') and os.path.isfile(os.path.join(root, name, MANIFEST_NAME)))
+
+
+def set_current_bundle(bundle_id, directory='models'):
+    """Atomically point CURRENT at a bundle"""
+    root = bundles_dir(directory)
+    if not os.path.isfile(os.path.join(root, bundle_id, MANIFEST_NAME)):
+        raise FileNotFoundError(f'No bundle {bundle_id} in {root}')
+    tmp_path = os.path.join(root, f'{CURRENT_POINTER}.{uuid.uuid4().hex[:8]}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(bundle_id + '\n')
+    os.replace(tmp_path, os.path.join(root, CURRENT_POINTER))
+
+
+def _save_compiled(compiled, directory, prefix, files):
+    """Save the node arrays of a CompiledForest as <prefix>.<array>.npy; returns its manifest entry"""
+    for field, array in compiled.arrays().items():
+        file_name = f'{prefix}.{field}.npy'
+        np.save(os.path.join(directory, file_name), array, allow_pickle=False)
+        files[file_name] = None
+    return {
+        'max_depth': int(compiled.max_depth),
+        'n_estimators': int(compiled.n_estimators),
+        'classes': None if compiled.classes_ is None else [str(c) for c in compiled.classes_],
+    }
+
+
+def write_bundle(models, directory='models', metrics=None, make_current=True, lineage=None,
+                 compact=None, compact_report=None):
+    """
+    Save the fitted models of an AviationMLModels instance as a new bundle.
+    lineage records how the models were trained (see incremental_training).
+    compact optionally maps forest names to smaller CompiledForest variants
+    (see compact_forests.py), saved next to the exact ones.
+    Returns the bundle id.
+    """
+    root = bundles_dir(directory)
+    os.makedirs(root, exist_ok=True)
+
+    bundle_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    tmp_dir = os.path.join(root, f'.tmp-{bundle_id}')
+    os.makedirs(tmp_dir)
+
+    try:
+        files = {}
+        forests = {}
+
+        objects = {
+            'linear_model': models.linear_model,
+            'scaler': models.scaler,
+            'rf_classifier': models.random_forest_classifier,
+            'rf_regressor': models.random_forest_regressor,
+        }
+        for name, obj in objects.items():
+            if obj is None:
+                continue
+            file_name = f'{name}.pkl'
+            with open(os.path.join(tmp_dir, file_name), 'wb') as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            files[file_name] = None
+
+        for name in FORESTS:
+            forest = objects[name]
+            if forest is None:
+                continue
+            forests[name] = _save_compiled(CompiledForest.from_sklearn(forest), tmp_dir, name, files)
+
+        compact_forests = {
+            name: _save_compiled(compiled, tmp_dir, f'{name}.{COMPACT_VARIANT}', files)
+            for name, compiled in (compact or {}).items()
+        }
+
+        sizes = {}
+        for file_name in files:
+            files[file_name] = _sha256(os.path.join(tmp_dir, file_name))
+            sizes[file_name] = os.path.getsize(os.path.join(tmp_dir, file_name))
+
+        manifest = {
+            'format_version': BUNDLE_FORMAT_VERSION,
+            'bundle_id': bundle_id,
+            'created_at': datetime.now().isoformat(),
+            'feature_columns': list(models.feature_columns),
+            'label_encoders': {
+                col: [str(c) for c in encoder.classes_]
+                for col, encoder in models.label_encoders.items()
+            },
+            'forests': forests,
+            'metrics': metrics or {},
+            'lineage': lineage or {},
+            'files': files,
+            'sizes': sizes,
+        }
+        if compact_forests:
+            manifest[COMPACT_VARIANT] = {'forests': compact_forests, 'report': compact_report or {}}
+        _write_json_atomic(os.path.join(tmp_dir, MANIFEST_NAME), manifest)
+
+        # Publishing the finished directory is a single rename
+        os.rename(tmp_dir, os.path.join(root, bundle_id))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if make_current:
+        set_current_bundle(bundle_id, directory)
+
+    return bundle_id
+
+
+class ModelBundle:
+    """
+    Read side of a bundle.
+    Opening a bundle reads the manifest and checks that every file exists
+    with its recorded size; models are loaded on first access, after their
+    checksums are verified, and the compiled forests are memory-mapped.
+    """
+
+    def __init__(self, path, verify=True):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_NAME), 'r') as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+            raise BundleIntegrityError(
+                f"Unsupported bundle format {self.manifest.get('format_version')} in {path}"
+            )
+        if verify:
+            self.check_files()
+
+        self._cache = {}
+        # Files whose checksum has been verified
+        self._verified = set()
+
+    @classmethod
+    def open(cls, bundle_id, directory='models', verify=True):
+        """Open a bundle by id"""
+        return cls(os.path.join(bundles_dir(directory), bundle_id), verify=verify)
+
+    @classmethod
+    def open_current(cls, directory='models', verify=True):
+        """Open the bundle CURRENT points at, or return None if there is none"""
+        bundle_id = current_bundle_id(directory)
+        if bundle_id is None:
+            return None
+        return cls.open(bundle_id, directory, verify=verify)
+
+    @property
+    def bundle_id(self):
+        return self.manifest['bundle_id']
+
+    @property
+    def feature_columns(self):
+        return list(self.manifest['feature_columns'])
+
+    @property
+    def lineage(self):
+        """How the bundle was trained; {} for bundles written before lineage was recorded"""
+        return self.manifest.get('lineage') or {}
+
+    def check_files(self):
+        """Check that every bundle file exists with the size recorded in the manifest"""
+        sizes = self.manifest['sizes']
+        for file_name in self.manifest['files']:
+            file_path = os.path.join(self.path, file_name)
+            if not os.path.exists(file_path):
+                raise BundleIntegrityError(f'Missing bundle file {file_name} in {self.path}')
+            if os.path.getsize(file_path) != sizes[file_name]:
+                raise BundleIntegrityError(f'Size mismatch for {file_name} in {self.path}')
+
+    def verify(self):
+        """Check every bundle file against the checksum recorded in the manifest"""
+        self.check_files()
+        for file_name in self.manifest['files']:
+            self._verify_file(file_name)
+
+    def _verify_file(self, file_name):
+        """Check one file against its checksum, once; call before reading it"""
+        if file_name in self._verified:
+            return
+        if _sha256(os.path.join(self.path, file_name)) != self.manifest['files'][file_name]:
+            raise BundleIntegrityError(f'Checksum mismatch for {file_name} in {self.path}')
+        self._verified.add(file_name)
+
+    def has(self, name):
+        """Check whether the bundle contains a pickled model"""
+        return f'{name}.pkl' in self.manifest['files']
+
+    def load(self, name):
+        """Unpickle a model ('linear_model', 'scaler', 'rf_classifier', 'rf_regressor'), once"""
+        if name not in self._cache:
+            if not self.has(name):
+                self._cache[name] = None
+            else:
+                self._verify_file(f'{name}.pkl')
+                with open(os.path.join(self.path, f'{name}.pkl'), 'rb') as f:
+                    self._cache[name] = pickle.load(f)
+        return self._cache[name]
+
+    def has_compact(self):
+        """Check whether the bundle holds compact variants of the forests"""
+        return bool(self.manifest.get(COMPACT_VARIANT, {}).get('forests'))
+
+    def compiled_forest(self, name, compact=False):
+        """
+        Return a forest as a CompiledForest over memory-mapped node arrays
+        compact=True returns its compact variant, or None if there is none
+        """
+        key = f'{name}.{COMPACT_VARIANT if compact else "compiled"}'
+        if key not in self._cache:
+            if compact:
+                info = self.manifest.get(COMPACT_VARIANT, {}).get('forests', {}).get(name)
+                prefix = f'{name}.{COMPACT_VARIANT}'
+            else:
+                info = self.manifest['forests'].get(name)
+                prefix = name
+            if info is None:
+                self._cache[key] = None
+            else:
+                for field in CompiledForest.ARRAY_FIELDS:
+                    self._verify_file(f'{prefix}.{field}.npy')
+                arrays = {
+                    field: np.load(os.path.join(self.path, f'{prefix}.{field}.npy'), mmap_mode='r')
+                    for field in CompiledForest.ARRAY_FIELDS
+                }
+                classes = None if info['classes'] is None else np.asarray(info['classes'], dtype=object)
+                self._cache[key] = CompiledForest.from_arrays(arrays, info['max_depth'], classes)
+        return self._cache[key]
+
+    def label_encoders(self):
+        """Rebuild the fitted LabelEncoders from the stored classes"""
+        return label_encoders_from_classes(self.manifest['label_encoders'])
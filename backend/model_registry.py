@@ -0,0 +1,197 @@
+"""
+Live model registry with hot reload
+
+The API serves whichever bundle models/bundles/CURRENT names (see
+model_bundle.py). The registry holds the live AviationMLModels and
+replaces it when CURRENT moves, without restarting the process:
+
+    - a new version is loaded and warmed up off the request path, by a
+      background watcher or an admin call. Files are checksum-verified as
+      they are read; activate() verifies every file of the bundle
+    - the live reference is then swapped in one assignment. Requests
+      take the reference once and keep scoring with the version they
+      started with, so nothing in flight is dropped or mixed
+    - a version that fails to load is never swapped in; the old one
+      keeps serving
+
+activate() and rollback() move CURRENT themselves, only after the target
+bundle has loaded, so every other worker's watcher follows.
+"""
+import os
+import threading
+from datetime import datetime
+
+from ml_models import AviationMLModels
+from model_bundle import BundleIntegrityError, current_bundle_id, list_bundles, set_current_bundle
+
+# Seconds between checks of the CURRENT pointer; 0 disables the watcher
+DEFAULT_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', '10'))
+
+
+class ModelReloadError(Exception):
+    """Raised when a model version cannot be loaded"""
+
+
+class BundleNotFoundError(Exception):
+    """Raised when the bundle to activate does not exist"""
+
+
+class ModelRegistry:
+    """
+    Owns the live models of the API process.
+    current() is safe to call from any thread; reloads are serialized.
+    """
+
+    def __init__(self, directory='models', inference_backend='sklearn', prediction_cache_size=4096):
+        self.directory = directory
+        self.inference_backend = inference_backend
+        self.prediction_cache_size = prediction_cache_size
+        self._live = self._new_models()
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_error = None
+        # Bundle whose last load failed; the watcher does not retry it until CURRENT moves again
+        self._failed_bundle_id = None
+        # Prediction cache counters of versions no longer served, so totals never go down
+        self._retired_cache_hits = 0
+        self._retired_cache_misses = 0
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _new_models(self):
+        return AviationMLModels(prediction_cache_size=self.prediction_cache_size,
+                                inference_backend=self.inference_backend)
+
+    def current(self):
+        """Return the live models; take this once per request and use it throughout"""
+        return self._live
+
+    @property
+    def bundle_id(self):
+        """Id of the live bundle, or None for unbundled or unloaded models"""
+        bundle = self._live.bundle
+        return bundle.bundle_id if bundle is not None else None
+
+    def _load(self, bundle_id=None):
+        models = self._new_models()
+        if not models.load_models(self.directory, bundle_id=bundle_id):
+            raise ModelReloadError(f"Could not load model bundle {bundle_id or 'CURRENT'}")
+        if self.inference_backend == 'sklearn':
+            # Unpickle the forests now rather than in the first request after the swap
+            models.random_forest_classifier
+            models.random_forest_regressor
+        return models
+
+    def _swap(self, models):
+        retired = self._live
+        self._live = models
+        self._retired_cache_hits += retired.prediction_cache.hits
+        self._retired_cache_misses += retired.prediction_cache.misses
+        self.loaded_at = datetime.now().isoformat()
+        self.reloads += 1
+        print(f"✓ Serving model bundle {self.bundle_id}")
+
+    def reload(self, force=False):
+        """
+        Load the bundle CURRENT points at and swap it in, unless it is
+        already live. Returns True if the live models changed.
+        A failed load keeps the live models and is recorded in last_error.
+        """
+        with self._lock:
+            target = current_bundle_id(self.directory)
+            if not force and target is not None and target == self.bundle_id:
+                return False
+            try:
+                models = self._load(target)
+            except Exception as e:
+                self.reload_failures += 1
+                self.last_error = str(e)
+                self._failed_bundle_id = target
+                print(f"⚠ Warning: Could not load models - {e}")
+                return False
+            self.last_error = None
+            self._swap(models)
+            return True
+
+    def activate(self, bundle_id):
+        """
+        Load a bundle, point CURRENT at it and swap it in.
+        Raises BundleNotFoundError or ModelReloadError, leaving everything
+        unchanged, if it does not exist or does not load.
+        """
+        with self._lock:
+            if bundle_id not in list_bundles(self.directory):
+                raise BundleNotFoundError(f'No model bundle {bundle_id}')
+            models = self._load(bundle_id)
+            # Every worker follows CURRENT, so check every checksum before moving it
+            try:
+                models.bundle.verify()
+            except BundleIntegrityError as e:
+                raise ModelReloadError(str(e)) from e
+            set_current_bundle(bundle_id, self.directory)
+            self._swap(models)
+        return bundle_id
+
+    def rollback(self):
+        """Activate the bundle written before the live one; returns its id"""
+        bundles = list_bundles(self.directory)
+        live = self.bundle_id
+        older = [bundle_id for bundle_id in bundles if live is not None and bundle_id < live]
+        if not older:
+            raise BundleNotFoundError(f'No model bundle older than {live} to roll back to')
+        return self.activate(older[-1])
+
+    def start_watcher(self, interval=DEFAULT_RELOAD_INTERVAL):
+        """Check CURRENT every interval seconds in a daemon thread and reload when it moves"""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                         name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def after_fork(self):
+        """
+        Reset thread state in a process forked from the one that loaded the
+        models (a preloaded gunicorn worker). Threads do not survive a fork,
+        and a lock held by one at that moment would stay held.
+        """
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            target = current_bundle_id(self.directory)
+            if target is not None and target not in (self.bundle_id, self._failed_bundle_id):
+                self.reload()
+
+    def prediction_cache_stats(self):
+        """Prediction cache hits and misses across every version served"""
+        cache = self._live.prediction_cache
+        return {
+            'hits': self._retired_cache_hits + cache.hits,
+            'misses': self._retired_cache_misses + cache.misses,
+        }
+
+    def status(self):
+        """Live and available versions, for the admin endpoint"""
+        bundles = list_bundles(self.directory)
+        return {
+            'live': self.bundle_id,
+            'current': current_bundle_id(self.directory),
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'reload_failures': self.reload_failures,
+            'last_error': self.last_error,
+            'watching': self._watcher is not None,
+            'bundles': bundles,
+        }
@@ -0,0 +1,97 @@
+"""
+Resolution and format variants of the training plots
+
+Plots are rendered once as full-size 300-dpi PNGs. At render time, each one
+also gets downscaled copies and WebP encodings, so /api/plots can serve a
+small panel without resizing or re-encoding anything per request:
+
+    models/plots/<name>.png              full size, as rendered
+    models/plots/<name>.webp             full size, WebP
+    models/plots/<name>.<size>.png       optimized PNG, <size> from PLOT_SIZES
+    models/plots/<name>.<size>.webp
+
+Pillow (a matplotlib dependency) is only imported when variants are written.
+"""
+import os
+import uuid
+
+PLOTS_DIR = os.path.join('models', 'plots')
+
+# Variant name -> width in pixels; heights keep the aspect ratio
+PLOT_SIZES = {'small': 480, 'medium': 960, 'large': 1920}
+FULL_SIZE = 'full'
+
+# Format -> mimetype, in order of preference when the client accepts either
+PLOT_FORMATS = {'png': 'image/png', 'webp': 'image/webp'}
+
+WEBP_QUALITY = 85
+
+
+def variant_filename(name, size=FULL_SIZE, fmt='png'):
+    """Return the file name of one variant of a plot"""
+    if size == FULL_SIZE:
+        return f'{name}.{fmt}'
+    return f'{name}.{size}.{fmt}'
+
+
+def variant_filenames(name):
+    """Return the file names of every variant written next to a plot's PNG"""
+    names = [variant_filename(name, FULL_SIZE, 'webp')]
+    for size in PLOT_SIZES:
+        names += [variant_filename(name, size, fmt) for fmt in PLOT_FORMATS]
+    return names
+
+
+def _save_atomic(image, path, fmt, **options):
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    image.save(tmp_path, format=fmt, **options)
+    os.replace(tmp_path, path)
+
+
+def write_variants(png_path):
+    """Write every size and format variant of the plot at png_path"""
+    from PIL import Image
+
+    directory = os.path.dirname(png_path)
+    name = os.path.basename(png_path)[:-len('.png')]
+
+    with Image.open(png_path) as source:
+        # WebP only supports RGB(A); matplotlib writes RGBA
+        image = source.convert('RGBA')
+
+    _save_atomic(image, os.path.join(directory, variant_filename(name, FULL_SIZE, 'webp')),
+                 'WEBP', quality=WEBP_QUALITY)
+    for size, width in PLOT_SIZES.items():
+        if width < image.width:
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        else:
+            resized = image
+        _save_atomic(resized, os.path.join(directory, variant_filename(name, size, 'png')),
+                     'PNG', optimize=True)
+        _save_atomic(resized, os.path.join(directory, variant_filename(name, size, 'webp')),
+                     'WEBP', quality=WEBP_QUALITY)
+
+
+def choose_size(size=None, width=None):
+    """
+    Pick a variant size from ?size=small|medium|large|full or ?width=<px>
+    (the smallest variant at least that wide). Returns None for an unknown size.
+    """
+    if size is not None:
+        return size if size == FULL_SIZE or size in PLOT_SIZES else None
+    if width is not None:
+        for name, variant_width in sorted(PLOT_SIZES.items(), key=lambda item: item[1]):
+            if variant_width >= width:
+                return name
+    return FULL_SIZE
+
+
+def choose_format(fmt, accept_mimetypes):
+    """
+    Pick a format from ?format=png|webp, or else from the Accept header.
+    PNG is served unless the client names WebP. Returns None for an unknown format.
+    """
+    if fmt is not None:
+        return fmt if fmt in PLOT_FORMATS else None
+    best = accept_mimetypes.best_match(list(PLOT_FORMATS.values()))
+    return 'webp' if best == PLOT_FORMATS['webp'] else 'png'
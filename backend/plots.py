@@ -0,0 +1,244 @@
+"""
+Rendering of the training plots
+
+Every figure is drawn from a small input: feature importances, RMSEs, or
+the first test targets and predictions. The inputs of the last run are
+saved next to the figures with a hash per figure. A figure is only
+rendered again when its hash changed or one of its files is missing.
+Figures that need rendering are drawn side by side in worker processes,
+each also writing its size and format variants (see plot_assets.py).
+
+Re-render from the saved inputs of the last training run, without retraining:
+    python plots.py [--workers N] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')  # Non-interactive backend for saving plots
+import matplotlib.pyplot as plt
+import numpy as np
+
+from plot_assets import PLOTS_DIR, variant_filenames, write_variants
+
+PLOT_INPUTS_NAME = 'plot_inputs.json'
+PLOT_DPI = 300
+
+# Bump when the drawing code changes, so every figure is redrawn once
+PLOT_STYLE_VERSION = 1
+
+# Test samples shown in the actual vs predicted plots
+SUBSET_SIZE = 100
+
+
+def _floats(values):
+    return [float(value) for value in values]
+
+
+def plot_inputs(classifier_results, regressor_results, y_test=None, y_pred_linear=None, y_pred_rf=None):
+    """Extract the JSON-serializable input of every figure from training results"""
+    inputs = {}
+
+    if classifier_results and 'feature_importance' in classifier_results:
+        importance = classifier_results['feature_importance']
+        inputs['classifier_feature_importance'] = {
+            'features': list(importance.keys()),
+            'importances': _floats(importance.values()),
+        }
+
+    if regressor_results:
+        importance = regressor_results.get('feature_importance')
+        inputs['regressor_comparison'] = {
+            'rmse': _floats([regressor_results.get('linear_regression_rmse', 0),
+                             regressor_results.get('random_forest_rmse', 0)]),
+            'features': list(importance.keys()) if importance else None,
+            'importances': _floats(importance.values()) if importance else None,
+        }
+
+    if y_test is not None:
+        subset_size = min(SUBSET_SIZE, len(y_test))
+        for name, y_pred in [('linear_regression_predictions', y_pred_linear),
+                             ('random_forest_predictions', y_pred_rf)]:
+            if y_pred is not None:
+                inputs[name] = {
+                    'actual': _floats(y_test[:subset_size]),
+                    'predicted': _floats(y_pred[:subset_size]),
+                }
+
+    return inputs
+
+
+def input_hash(data):
+    """Hash of a figure's input and the drawing code version"""
+    payload = json.dumps({'style': PLOT_STYLE_VERSION, 'data': data}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _draw_classifier_feature_importance(data):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    features = data['features']
+
+    colors = plt.cm.viridis(np.linspace(0.3, 0.9, len(features)))
+    ax.barh(features, data['importances'], color=colors)
+    ax.set_xlabel('Importance Score', fontsize=12)
+    ax.set_title('Random Forest Classifier - Feature Importance', fontsize=14, fontweight='bold')
+    ax.grid(axis='x', alpha=0.3)
+
+
+def _draw_regressor_comparison(data):
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+
+    # RMSE Comparison
+    models = ['Linear\nRegression', 'Random Forest\nRegressor']
+    rmse_values = data['rmse']
+    colors_rmse = ['#fa709a', '#30cfd0']
+
+    bars1 = ax1.bar(models, rmse_values, color=colors_rmse, alpha=0.8, edgecolor='black', linewidth=1.5)
+    ax1.set_ylabel('RMSE (Lower is Better)', fontsize=12)
+    ax1.set_title('Model Performance Comparison', fontsize=14, fontweight='bold')
+    ax1.grid(axis='y', alpha=0.3)
+
+    # Add value labels on bars
+    for bar, value in zip(bars1, rmse_values):
+        height = bar.get_height()
+        ax1.text(bar.get_x() + bar.get_width()/2., height,
+                f'{value:.2f}', ha='center', va='bottom', fontsize=11, fontweight='bold')
+
+    # Feature Importance for Random Forest Regressor
+    if data['features'] is not None:
+        colors_feat = plt.cm.plasma(np.linspace(0.3, 0.9, len(data['features'])))
+        ax2.barh(data['features'], data['importances'], color=colors_feat)
+        ax2.set_xlabel('Importance Score', fontsize=12)
+        ax2.set_title('Random Forest Regressor - Feature Importance', fontsize=14, fontweight='bold')
+        ax2.grid(axis='x', alpha=0.3)
+
+
+def _draw_actual_vs_predicted(data, model_name, color):
+    subset_size = len(data['actual'])
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    x_axis = np.arange(subset_size)
+    ax.plot(x_axis, data['actual'], 'o-', label='Actual', color='#667eea', markersize=6, linewidth=2, alpha=0.8)
+    ax.plot(x_axis, data['predicted'], 's-', label='Predicted', color=color, markersize=5, linewidth=2, alpha=0.8)
+
+    ax.set_xlabel('Test Sample Index', fontsize=12)
+    ax.set_ylabel('Severity Score', fontsize=12)
+    ax.set_title(f'{model_name}: Actual vs Predicted Values (First {SUBSET_SIZE} Samples)', fontsize=14, fontweight='bold')
+    ax.legend(loc='best', fontsize=11)
+    ax.grid(True, alpha=0.3)
+
+
+# Figure name -> (draw function, label used in status messages)
+PLOTS = {
+    'classifier_feature_importance': (_draw_classifier_feature_importance, 'classifier feature importance'),
+    'regressor_comparison': (_draw_regressor_comparison, 'regressor comparison'),
+    'linear_regression_predictions': (
+        lambda data: _draw_actual_vs_predicted(data, 'Linear Regression', '#fa709a'),
+        'linear regression predictions'
+    ),
+    'random_forest_predictions': (
+        lambda data: _draw_actual_vs_predicted(data, 'Random Forest Regressor', '#30cfd0'),
+        'random forest predictions'
+    ),
+}
+
+
+def render_plot(name, data, directory=PLOTS_DIR):
+    """Draw one figure, atomically replace its PNG and write its variants; returns the path"""
+    draw, _ = PLOTS[name]
+    draw(data)
+    plt.tight_layout()
+    path = os.path.join(directory, f'{name}.png')
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        plt.savefig(tmp_path, format='png', dpi=PLOT_DPI, bbox_inches='tight')
+    finally:
+        plt.close()
+    os.replace(tmp_path, path)
+    # Smaller and WebP copies for /api/plots
+    write_variants(path)
+    return path
+
+
+def load_plot_inputs(directory=PLOTS_DIR):
+    """Return {name: {'hash', 'data'}} saved by the last render, or {}"""
+    try:
+        with open(os.path.join(directory, PLOT_INPUTS_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_plot_inputs(saved, directory):
+    path = os.path.join(directory, PLOT_INPUTS_NAME)
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(saved, f)
+    os.replace(tmp_path, path)
+
+
+def render_plots(inputs, directory=PLOTS_DIR, workers=1, force=False):
+    """
+    Render every figure in inputs ({name: data}) whose input changed since
+    the last render or whose PNG or variants are missing, in up to
+    `workers` processes.
+    Returns {'rendered': [names], 'unchanged': [names]}
+    """
+    os.makedirs(directory, exist_ok=True)
+    saved = load_plot_inputs(directory)
+    hashes = {name: input_hash(data) for name, data in inputs.items()}
+
+    pending = [
+        name for name in inputs
+        if force
+        or saved.get(name, {}).get('hash') != hashes[name]
+        or not all(os.path.exists(os.path.join(directory, filename))
+                   for filename in [f'{name}.png'] + variant_filenames(name))
+    ]
+    unchanged = [name for name in inputs if name not in pending]
+
+    workers = min(max(1, workers), len(pending))
+    if workers <= 1:
+        for name in pending:
+            render_plot(name, inputs[name], directory)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_plot, name, inputs[name], directory) for name in pending]
+            for future in futures:
+                future.result()
+
+    for name in pending:
+        print(f"✓ Saved {PLOTS[name][1]} plot")
+    for name in unchanged:
+        print(f"✓ {PLOTS[name][1].capitalize()} plot is up to date")
+
+    # Only record inputs once their figures are on disk
+    saved.update({name: {'hash': hashes[name], 'data': inputs[name]} for name in inputs})
+    _save_plot_inputs(saved, directory)
+
+    return {'rendered': pending, 'unchanged': unchanged}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the training plots from the last saved plot inputs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--force', action='store_true', help='redraw every figure even if its input is unchanged')
+    parser.add_argument('--dir', default=PLOTS_DIR, help='plots directory holding plot_inputs.json')
+    args = parser.parse_args()
+
+    saved = load_plot_inputs(args.dir)
+    if not saved:
+        print(f"✗ No saved plot inputs in {args.dir}/ - run 'python train_models.py' first")
+        return
+
+    inputs = {name: entry['data'] for name, entry in saved.items() if name in PLOTS}
+    render_plots(inputs, args.dir, args.workers, args.force)
+    print(f"\nPlots saved to: {args.dir}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Bounded LRU cache for model predictions
+"""
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    LRU cache of raw model outputs keyed by the final feature vector.
+    Entries belong to one model version; switching to another version
+    drops everything cached for the previous one.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(features):
+        """Return a hashable cache key for a feature vector"""
+        return tuple(float(value) for value in features)
+
+    def get(self, version, key):
+        """Return the cached value for key under a model version, or None"""
+        with self._lock:
+            if version != self.version:
+                self._reset(version)
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, version, key, value):
+        """Store a value, evicting the least recently used entries over maxsize"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                self._reset(version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, version):
+        """Drop all entries and start caching for a new model version"""
+        with self._lock:
+            self._reset(version)
+
+    def _reset(self, version):
+        self._entries.clear()
+        self.version = version
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
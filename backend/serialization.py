@@ -0,0 +1,151 @@
+"""
+Direct JSON encoding of DataFrame-backed responses
+
+Frames are encoded column by column: every distinct value of a column is
+encoded once (categories, factorized text) or all values at once with
+numpy (numbers), and rows are then stitched together with one format
+string, so no per-row dicts of Python objects are built. Output matches
+Flask's jsonify (compact separators, ASCII-escaped strings, sorted keys).
+
+Two layouts are supported:
+    records  [{"col": value, ...}, ...]                 (the default)
+    columns  {"columns": [...], "data": {"col": [...]}} (compact)
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+LAYOUTS = ('records', 'columns')
+
+# Matches Flask's default JSON provider
+ENSURE_ASCII = True
+
+
+class RawJSON:
+    """Already-encoded JSON text embedded in a response payload"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def scalar_token(value, missing='null'):
+    """Encode one value; NaN, NaT, None and infinities become missing"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return missing
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return missing
+    return json.dumps(value, ensure_ascii=ENSURE_ASCII, default=_default)
+
+
+def _float_tokens(values, missing):
+    # numpy's shortest round-trip repr is the same text Python's json writes
+    values = values.astype(np.float64, copy=False)
+    tokens = values.astype(str).astype(object)
+    tokens[~np.isfinite(values)] = missing
+    return tokens
+
+
+def column_tokens(series, missing='null', date_format=None):
+    """Return an object array with the JSON text of every value in a column"""
+    dtype = series.dtype
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        vocabulary = [scalar_token(value, missing) for value in series.cat.categories] + [missing]
+        # Missing values have code -1, which picks the trailing missing token
+        return np.asarray(vocabulary, dtype=object)[series.cat.codes.to_numpy()]
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        series = series.dt.strftime(date_format or '%Y-%m-%dT%H:%M:%S')
+        dtype = series.dtype
+
+    if pd.api.types.is_bool_dtype(dtype) and dtype != object:
+        return np.where(series.to_numpy(), 'true', 'false').astype(object)
+
+    if pd.api.types.is_integer_dtype(dtype) and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return series.to_numpy().astype(str).astype(object)
+
+    if pd.api.types.is_float_dtype(dtype) and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return _float_tokens(series.to_numpy(), missing)
+
+    # Text and mixed columns: encode each distinct value once
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    vocabulary = [scalar_token(value, missing) for value in uniques] + [missing]
+    return np.asarray(vocabulary, dtype=object)[codes]
+
+
+def _frame_tokens(frame, missing, sort_keys):
+    """Column names, their output order and the tokens of each column"""
+    columns = [str(col) for col in frame.columns]
+    order = sorted(range(len(columns)), key=columns.__getitem__) if sort_keys else range(len(columns))
+    date_formats = frame.attrs.get('date_formats', {})
+    tokens = {
+        i: column_tokens(frame.iloc[:, i], missing, date_formats.get(frame.columns[i]))
+        for i in order
+    }
+    return columns, order, tokens
+
+
+def encode_records(frame, missing='null', sort_keys=True):
+    """Return the JSON object text of every row of a frame, as encode_frame writes it"""
+    columns, order, tokens = _frame_tokens(frame, missing, sort_keys)
+    template = '{' + ','.join(
+        json.dumps(columns[i], ensure_ascii=ENSURE_ASCII).replace('%', '%%') + ':%s'
+        for i in order
+    ) + '}'
+    rows = zip(*(tokens[i] for i in order)) if order else ((),) * len(frame)
+    return [template % row for row in rows]
+
+
+def encode_frame(frame, layout='records', missing='null', sort_keys=True):
+    """
+    Encode a frame as JSON text in records or columns layout. Dates use the
+    formats compaction.compact_frame recorded in frame.attrs.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f'Unknown layout {layout!r}, expected one of {LAYOUTS}')
+
+    if layout == 'columns':
+        columns, order, tokens = _frame_tokens(frame, missing, sort_keys)
+        names = [columns[i] for i in order]
+        data = ','.join(
+            f'{json.dumps(columns[i], ensure_ascii=ENSURE_ASCII)}:[{",".join(tokens[i])}]'
+            for i in order
+        )
+        return f'{{"columns":{json.dumps(names, ensure_ascii=ENSURE_ASCII)},"data":{{{data}}}}}'
+
+    if len(frame) == 0:
+        return '[]'
+    return '[' + ','.join(encode_records(frame, missing, sort_keys)) + ']'
+
+
+def dumps(payload, sort_keys=True):
+    """Encode a payload of plain values, numpy scalars and RawJSON parts"""
+    if isinstance(payload, RawJSON):
+        return payload.text
+    if isinstance(payload, dict):
+        items = sorted(payload.items()) if sort_keys else payload.items()
+        return '{' + ','.join(
+            f'{json.dumps(str(key), ensure_ascii=ENSURE_ASCII)}:{dumps(value, sort_keys)}'
+            for key, value in items
+        ) + '}'
+    if isinstance(payload, (list, tuple)):
+        return '[' + ','.join(dumps(value, sort_keys) for value in payload) + ']'
+    if isinstance(payload, pd.DataFrame):
+        return encode_frame(payload, sort_keys=sort_keys)
+    return scalar_token(payload)
+
+
+def json_body(payload, sort_keys=True):
+    """Encode a payload as the bytes of a JSON response body"""
+    return (dumps(payload, sort_keys) + '\n').encode()
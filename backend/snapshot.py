@@ -0,0 +1,167 @@
+"""
+Typed columnar snapshots of the accident datasets
+
+A snapshot is a directory holding one .npy file per column plus a
+manifest.json describing them. Numeric and date columns are stored as plain
+numpy arrays and text columns as integer category codes, so opening a
+snapshot is a memory map instead of a latin-1 CSV parse, and every worker
+process on a host shares the same page-cache pages.
+"""
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from data_cache import file_signature
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+
+def snapshot_dir_for(csv_path):
+    """Return the snapshot directory that belongs to a CSV file"""
+    return os.path.splitext(csv_path)[0] + '.snapshot'
+
+
+def read_manifest(directory):
+    """Return the parsed manifest of a snapshot, or None if there is none"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _source_entry(path):
+    return {'path': os.path.basename(path), 'signature': list(file_signature(path))}
+
+
+def is_current(directory, source_path, extra_sources=()):
+    """
+    Check whether a snapshot exists and was built from the current source
+    file, and from the current version of every file in extra_sources
+    """
+    manifest = read_manifest(directory)
+    if not manifest or manifest.get('format_version') != FORMAT_VERSION:
+        return False
+    try:
+        sources = [_source_entry(path) for path in (source_path, *extra_sources)]
+    except OSError:
+        return False
+    built_from = [manifest['source']] + manifest.get('extra_sources', [])
+    return [entry['signature'] for entry in built_from] == [entry['signature'] for entry in sources]
+
+
+def write_snapshot(df, directory, source_path, date_columns=(), extra_sources=(), metadata=None):
+    """
+    Write a DataFrame as a columnar snapshot of source_path.
+    Columns listed in date_columns are additionally stored parsed as
+    datetime64 so readers never have to parse the date strings again.
+    A frame derived from several files lists the others in extra_sources,
+    so is_current() checks them all; metadata is kept in the manifest.
+    Files are written under a fresh build id and the manifest is swapped in
+    last, so concurrent readers always see a complete snapshot.
+    """
+    os.makedirs(directory, exist_ok=True)
+    build_id = uuid.uuid4().hex[:12]
+    columns = []
+    dates = {}
+
+    def save(array, suffix):
+        file_name = f'{build_id}_{suffix}.npy'
+        np.save(os.path.join(directory, file_name), array, allow_pickle=False)
+        return file_name
+
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {'name': name, 'dtype': str(series.dtype)}
+
+        if series.dtype.kind in 'biufM':
+            entry['kind'] = 'array'
+            entry['file'] = save(series.to_numpy(), f'{i}')
+        elif pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+            # Text columns: int32 codes into a sorted fixed-width string table
+            codes, categories = pd.factorize(series, sort=True)
+            entry['kind'] = 'category'
+            entry['file'] = save(codes.astype(np.int32), f'{i}')
+            entry['categories_file'] = save(np.asarray(categories, dtype=str), f'{i}_categories')
+        else:
+            # Mixed-type object column - keep it exact, even though it cannot be mapped
+            entry['kind'] = 'pickle'
+            entry['file'] = f'{build_id}_{i}.npy'
+            np.save(os.path.join(directory, entry['file']), series.to_numpy(dtype=object), allow_pickle=True)
+
+        columns.append(entry)
+
+    for name in date_columns:
+        if name in df.columns:
+            parsed = pd.to_datetime(df[name], errors='coerce')
+            dates[name] = save(parsed.to_numpy(dtype='datetime64[ns]'), f'{df.columns.get_loc(name)}_date')
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'build_id': build_id,
+        'source': _source_entry(source_path),
+        'rows': len(df),
+        'columns': columns,
+        'dates': dates,
+    }
+    if extra_sources:
+        manifest['extra_sources'] = [_source_entry(path) for path in extra_sources]
+    if metadata is not None:
+        manifest['metadata'] = metadata
+
+    tmp_path = os.path.join(directory, f'{MANIFEST_NAME}.{build_id}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+    # Remove files from earlier builds; processes that still map them keep
+    # their open pages until they reload
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.npy') and not file_name.startswith(build_id):
+            os.remove(os.path.join(directory, file_name))
+
+    return manifest
+
+
+def load_snapshot(directory, parse_dates=False, as_category=False):
+    """
+    Open a snapshot as a DataFrame.
+    Numeric columns are read-only memory maps of the snapshot files. Text
+    columns are decoded back to Python strings, or kept as pandas
+    categoricals over the mapped codes when as_category is set. With
+    parse_dates, date columns are returned as datetime64 instead of text.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f'No snapshot found in {directory}')
+
+    def mapped(file_name):
+        return np.load(os.path.join(directory, file_name), mmap_mode='r')
+
+    data = {}
+    for entry in manifest['columns']:
+        name = entry['name']
+
+        if parse_dates and name in manifest['dates']:
+            data[name] = mapped(manifest['dates'][name])
+        elif entry['kind'] == 'array':
+            data[name] = mapped(entry['file'])
+        elif entry['kind'] == 'category':
+            codes = mapped(entry['file'])
+            categories = np.load(os.path.join(directory, entry['categories_file']))
+            if as_category:
+                data[name] = pd.Categorical.from_codes(codes, categories=categories)
+            elif len(categories) == 0:
+                data[name] = np.full(len(codes), np.nan, dtype=object)
+            else:
+                values = categories.astype(object).take(codes)
+                values[codes < 0] = np.nan
+                data[name] = values
+        else:
+            data[name] = np.load(os.path.join(directory, entry['file']), allow_pickle=True)
+
+    return pd.DataFrame(data, columns=[entry['name'] for entry in manifest['columns']], copy=False)
@@ -3,7 +3,7 @@
 echo "Starting Aviation ML API..."
 
 # Check if models directory exists and has trained models
-if [ ! -f "models/random_forest_classifier.pkl" ]; then
+if [ ! -f "models/bundles/CURRENT" ]; then
     echo "Models not found. Training models..."
     python train_models.py
     echo "Model training complete!"
@@ -13,4 +13,6 @@ fi
 
 # Start the application with gunicorn
 echo "Starting Gunicorn server..."
-gunicorn app:app --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+# Models and datasets are loaded once in the master and shared by the
+# workers (see gunicorn.conf.py); WEB_CONCURRENCY sets the worker count
+gunicorn -c gunicorn.conf.py app:app
@@ -0,0 +1,296 @@
+"""
+Out-of-core training
+
+Trains the serving models from CSVs read in chunks, so peak memory is
+bounded by the chunk size instead of the dataset size:
+
+    pass 1  collect the label encoder classes and count rows
+    pass 2  encode each chunk and spool its features to disk, update the
+            scaler, and grow a slice of each random forest on the chunk,
+            or on a sample of a group of chunks when there are more
+            chunks than trees (see tree_groups)
+    pass 3  fit an SGD linear regressor over the spooled chunks
+    pass 4  evaluate every model on the held-out rows
+
+Each forest is assembled from the trees grown on every chunk, so it is
+served, bundled and compiled like a forest trained in memory, and has
+FOREST_PARAMS['n_estimators'] trees however many chunks there are.
+
+Run it through the training script:
+    python train_models.py --stream [--chunk-size N] [--source CSV ...]
+"""
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree._tree import Tree
+
+from datasets import read_airline_accidents_chunks
+from ml_models import FOREST_PARAMS, LABEL_ENCODED_COLUMNS
+from model_bundle import label_encoders_from_classes
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Share of rows held out for evaluation, as in the in-memory split
+TEST_FRACTION = 0.2
+
+# Passes of the SGD regressor over the spooled chunks
+SGD_EPOCHS = 5
+
+
+def chunk_test_mask(index, n_rows):
+    """Held-out rows among the n_rows usable feature rows of chunk index"""
+    return _chunk_rng(index).random(n_rows) < TEST_FRACTION
+
+
+def _chunk_rng(index):
+    return np.random.default_rng([FOREST_PARAMS['random_state'], index])
+
+
+def tree_groups(n_chunks, n_trees):
+    """
+    Share n_trees trees among n_chunks chunks. Consecutive chunks form at
+    most n_trees groups; returns the group of each chunk and the trees each
+    group grows. With fewer chunks than trees every chunk is its own group.
+    """
+    groups = min(n_chunks, n_trees)
+    group_of = np.arange(n_chunks) * groups // n_chunks
+    trees = np.diff(np.arange(groups + 1) * n_trees // groups)
+    return group_of, trees
+
+
+def collect_vocabulary(sources, chunksize):
+    """
+    Pass 1: the sorted classes of every label-encoded column, which are
+    exactly what LabelEncoder.fit would learn from the whole dataset,
+    plus the total row and chunk counts
+    """
+    vocabulary = {}
+    rows = chunks = 0
+    for chunk in read_airline_accidents_chunks(sources, chunksize):
+        rows += len(chunk)
+        chunks += 1
+        for col in LABEL_ENCODED_COLUMNS:
+            if col in chunk.columns:
+                vocabulary.setdefault(col, set()).update(chunk[col].fillna('Unknown').astype(str).unique())
+    return {col: sorted(values) for col, values in vocabulary.items()}, rows, chunks
+
+
+def pad_tree_classes(estimator, chunk_classes, classes):
+    """
+    Re-express a tree grown on one chunk over the classes of all chunks.
+    Trees of a forest are fit on class positions, so a tree only has
+    outputs for the classes its chunk contained.
+    """
+    tree = estimator.tree_
+    state = tree.__getstate__()
+    values = np.zeros((tree.node_count, 1, len(classes)))
+    values[:, :, np.searchsorted(classes, chunk_classes)] = state['values']
+    state['values'] = values
+
+    padded = Tree(tree.n_features, np.array([len(classes)], dtype=np.intp), 1)
+    padded.__setstate__(state)
+    estimator.tree_ = padded
+    estimator.classes_ = np.arange(len(classes), dtype=np.float64)
+    estimator.n_classes_ = len(classes)
+    return estimator
+
+
+def assemble_forest(forest, estimators, n_features):
+    """Turn an unfitted forest into a fitted one made of the given trees"""
+    forest.set_params(n_estimators=len(estimators))
+    forest.estimators_ = estimators
+    forest.n_features_in_ = n_features
+    forest.n_outputs_ = 1
+    return forest
+
+
+class StreamingTrainer:
+    """
+    Trains the models of an AviationMLModels instance chunk by chunk.
+    Spooled feature chunks live in a temporary directory for the duration
+    of train().
+    """
+
+    def __init__(self, ml_models, sources, chunksize=DEFAULT_CHUNK_SIZE):
+        self.ml_models = ml_models
+        self.sources = list(sources)
+        self.chunksize = chunksize
+        self._spool = None
+        self._chunks = []
+        # Rows trained on, set by train(); with sources and chunksize it
+        # recreates the held-out rows (see compact_forests.py)
+        self.rows = 0
+
+    def train(self):
+        """Run all passes and install the models; returns the evaluation metrics or None"""
+        self._spool = tempfile.mkdtemp(prefix='aviation-training-')
+        try:
+            vocabulary, rows, n_chunks = collect_vocabulary(self.sources, self.chunksize)
+            self.rows = rows
+            print(f"✓ Pass 1: {rows} rows, {sum(len(v) for v in vocabulary.values())} category values")
+            if rows == 0:
+                print("Insufficient data for training")
+                return None
+            self.ml_models.label_encoders = label_encoders_from_classes(vocabulary)
+
+            forests = self._grow_forests(n_chunks)
+            if forests is None:
+                print("Insufficient data for training")
+                return None
+            print(f"✓ Pass 2: {len(self._chunks)} chunks spooled, "
+                  f"{len(forests[0].estimators_)} classifier / {len(forests[1].estimators_)} regressor trees")
+
+            linear_model = self._fit_linear()
+            print(f"✓ Pass 3: SGD regressor fitted over {SGD_EPOCHS} epochs")
+
+            self.ml_models.random_forest_classifier, self.ml_models.random_forest_regressor = forests
+            self.ml_models.linear_model = linear_model
+            self.ml_models._models_changed()
+
+            metrics = self._evaluate()
+            print(f"✓ Pass 4: Classification Model Accuracy: {metrics['classifier']['accuracy']:.4f}")
+            print(f"  Linear Regression (SGD) RMSE: {metrics['regressor']['linear_rmse']:.4f}")
+            print(f"  Random Forest RMSE: {metrics['regressor']['random_forest_rmse']:.4f}")
+            return metrics
+        finally:
+            shutil.rmtree(self._spool, ignore_errors=True)
+            self._spool = None
+            self._chunks = []
+
+    def _grow_forests(self, n_chunks):
+        """
+        Pass 2: spool features, update the scaler and grow each group's
+        trees (see tree_groups). A group of several chunks grows its trees
+        on a sample of each chunk's training rows, so a tree is fit on
+        about one chunk of rows whatever the group size.
+        """
+        scaler = StandardScaler()
+        classifier_trees = []
+        regressor_trees = []
+        classes = set()
+        feature_columns = None
+        group_of, group_trees = tree_groups(n_chunks, FOREST_PARAMS['n_estimators'])
+        group_sizes = np.bincount(group_of)
+        pending = []
+
+        def grow(group):
+            """Grow the trees of a group on its pending training rows"""
+            if not pending:
+                return
+            X = np.concatenate([rows[0] for rows in pending])
+            severity = np.concatenate([rows[1] for rows in pending])
+            score = np.concatenate([rows[2] for rows in pending])
+            pending.clear()
+
+            seed = FOREST_PARAMS['random_state'] + group
+            params = dict(FOREST_PARAMS, n_estimators=int(group_trees[group]), random_state=seed)
+            if len(X):
+                classifier = RandomForestClassifier(**params).fit(X, severity)
+                classes.update(classifier.classes_)
+                classifier_trees.extend((tree, classifier.classes_) for tree in classifier.estimators_)
+
+            regression = ~np.isnan(score)
+            if regression.any():
+                regressor = RandomForestRegressor(**params).fit(X[regression], score[regression])
+                regressor_trees.extend(regressor.estimators_)
+
+        group = 0
+        for index, chunk in enumerate(read_airline_accidents_chunks(self.sources, self.chunksize)):
+            # The sources may have grown since pass 1; extra chunks join the last group
+            if group_of[min(index, n_chunks - 1)] != group:
+                grow(group)
+                group = group_of[index]
+
+            features = self.ml_models.build_training_features(chunk)
+            X = features['X']
+            if len(X) == 0:
+                continue
+            feature_columns = features['feature_columns']
+            severity = np.asarray(features['severity'], dtype=str)
+            score = features['severity_score']
+            test = chunk_test_mask(index, len(X))
+
+            path = os.path.join(self._spool, f'chunk-{index}.npz')
+            np.savez(path, X=X, severity=severity, severity_score=score, test=test)
+            self._chunks.append(path)
+
+            train = ~test
+            regression = train & ~np.isnan(score)
+            if regression.any():
+                scaler.partial_fit(X[regression])
+
+            if group_sizes[group] > 1:
+                sample = np.random.default_rng([FOREST_PARAMS['random_state'], index, 1])
+                train &= sample.random(len(X)) < 1 / group_sizes[group]
+            pending.append((X[train], severity[train], score[train]))
+        grow(group)
+
+        if not classifier_trees or not regressor_trees:
+            return None
+
+        classes = np.asarray(sorted(str(c) for c in classes), dtype=object)
+        classifier_trees = [pad_tree_classes(tree, chunk_classes.astype(object), classes)
+                            for tree, chunk_classes in classifier_trees]
+
+        self.ml_models.feature_columns = feature_columns
+        self.ml_models.scaler = scaler
+
+        classifier = assemble_forest(RandomForestClassifier(**FOREST_PARAMS), classifier_trees, len(feature_columns))
+        classifier.classes_ = classes
+        classifier.n_classes_ = len(classes)
+        regressor = assemble_forest(RandomForestRegressor(**FOREST_PARAMS), regressor_trees, len(feature_columns))
+        return classifier, regressor
+
+    def _spooled(self):
+        for path in self._chunks:
+            with np.load(path) as chunk:
+                yield {name: chunk[name] for name in chunk.files}
+
+    def _fit_linear(self):
+        """Pass 3: SGD linear regression on the scaled training rows"""
+        model = SGDRegressor(random_state=FOREST_PARAMS['random_state'])
+        for _ in range(SGD_EPOCHS):
+            for chunk in self._spooled():
+                rows = ~chunk['test'] & ~np.isnan(chunk['severity_score'])
+                if rows.any():
+                    model.partial_fit(self.ml_models.scaler.transform(chunk['X'][rows]), chunk['severity_score'][rows])
+        return model
+
+    def _evaluate(self):
+        """Pass 4: accuracy and RMSE accumulated over the held-out rows"""
+        ml_models = self.ml_models
+        correct = total = 0
+        regression_rows = 0
+        squared_error = {'linear_rmse': 0.0, 'random_forest_rmse': 0.0}
+
+        for chunk in self._spooled():
+            X = chunk['X'][chunk['test']]
+            if len(X) == 0:
+                continue
+            predicted = ml_models.random_forest_classifier.predict(X)
+            correct += int(np.sum(predicted == chunk['severity'][chunk['test']]))
+            total += len(X)
+
+            score = chunk['severity_score'][chunk['test']]
+            rows = ~np.isnan(score)
+            if rows.any():
+                regression_rows += int(rows.sum())
+                squared_error['linear_rmse'] += float(np.sum(
+                    (ml_models.linear_model.predict(ml_models.scaler.transform(X[rows])) - score[rows]) ** 2))
+                squared_error['random_forest_rmse'] += float(np.sum(
+                    (ml_models.random_forest_regressor.predict(X[rows]) - score[rows]) ** 2))
+
+        return {
+            'classifier': {'accuracy': correct / total if total else 0.0},
+            'regressor': {
+                name: math.sqrt(error / regression_rows) if regression_rows else 0.0
+                for name, error in squared_error.items()
+            },
+            'training': {'mode': 'streaming', 'chunk_size': self.chunksize, 'sources': self.sources},
+        }
@@ -0,0 +1,180 @@
+"""
+Synthetic accident datasets for benchmarking
+
+Generates airline_accidents.csv and ntsb_aviation_data.csv files with the
+same columns as the real datasets, including their quirks: latin-1 place
+names, padded and blank categorical values, and injury counts stored as
+dirty strings (' 1 ', '', 'N/A'). Output is deterministic for a seed, so
+benchmark runs on different commits read identical data.
+
+    python synthetic_data.py [--scale 1] [--base-rows 5000] [--out DIR] [--seed 0]
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from datasets import AIRLINE_ACCIDENTS_PATH, NTSB_DATA_PATH
+
+# Rows of airline_accidents.csv at scale 1
+BASE_ROWS = 5000
+
+AIRLINE_COLUMNS = [
+    'Event Id', 'Investigation Type', 'Accident Number', 'Event Date', 'Location', 'Country',
+    'Latitude', 'Longitude', 'Airport Code', 'Airport Name', 'Injury Severity', 'Aircraft Damage',
+    'Aircraft Category', 'Registration Number', 'Make', 'Model', 'Amateur Built', 'Number of Engines',
+    'Engine Type', 'FAR Description', 'Schedule', 'Purpose of Flight', 'Air Carrier',
+    'Total Fatal Injuries', 'Total Serious Injuries', 'Total Minor Injuries', 'Total Uninjured',
+    'Weather Condition', 'Broad Phase of Flight', 'Report Status', 'Publication Date',
+]
+
+LOCATIONS = ['Anchorage, AK', 'Montréal, QC', 'Zürich, Switzerland', 'São Paulo, Brazil',
+             'Chicago, IL', 'Reykjavík, Iceland', 'Denver, CO', 'Bogotá, Colombia']
+COUNTRIES = ['United States', 'United States', 'United States', 'Canada', 'Mexico', 'Brazil',
+             ' France ', 'Switzerland', 'Iceland', '']
+SEVERITIES = ['Non-Fatal', 'Non-Fatal', 'Non-Fatal', 'Incident', 'Fatal(1)', 'Fatal(2)', 'Fatal(3)',
+              'Fatal(5)', 'Fatal(6)', 'Unavailable']
+MAKES = ['Cessna', 'CESSNA', 'Piper', 'PIPER', 'Beech', 'Boeing', 'Airbus', 'Bell', 'Robinson',
+         'Mooney', 'Cirrus', 'de Havilland']
+MODELS = ['172', '152', 'PA-28-140', '737-800', 'A320', '206B', 'R44', 'M20J', 'SR22', 'DHC-6']
+CATEGORIES = ['Airplane', 'Airplane', 'Helicopter', 'Glider', 'Balloon', '']
+ENGINE_TYPES = ['Reciprocating', 'Reciprocating', 'Turbo Fan', 'Turbo Jet', 'Turbo Prop',
+                'Turbo Shaft', 'Unknown', '']
+ENGINE_COUNTS = ['1', '1', '2', ' 2 ', '2.0', '4', '', '0']
+FAR_PARTS = ['Part 91: General Aviation', 'Part 121: Air Carrier', 'Part 135: Air Taxi & Commuter',
+             'Part 137: Agricultural', '']
+WEATHER = ['VMC', 'VMC', 'VMC', 'IMC', 'UNK', '']
+PHASES = ['CRUISE', 'LANDING', 'TAKEOFF', 'APPROACH', 'MANEUVERING', 'TAXI', 'CLIMB', 'DESCENT', '']
+PURPOSES = ['Personal', 'Instructional', 'Business', 'Aerial Application', 'Positioning', '']
+DAMAGE = ['Substantial', 'Destroyed', 'Minor', '']
+REPORT_STATUS = ['Probable Cause', 'Factual', 'Preliminary',
+                 'The pilot\'s failure to maintain adequate airspeed, which resulted in a stall.']
+
+# Injury counts as they appear in the CSV: mostly clean, some padded or junk
+DIRTY_COUNT_VALUES = np.array([' ', '', 'N/A', 'UNK'], dtype=object)
+
+
+def _choice(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+def _dirty_counts(rng, n, lam):
+    """Poisson injury counts written as strings, ~10% padded and ~5% not numeric"""
+    counts = rng.poisson(lam, n).astype(str).astype(object)
+    roll = rng.random(n)
+    padded = roll < 0.10
+    counts[padded] = ' ' + counts[padded] + ' '
+    junk = roll > 0.95
+    counts[junk] = _choice(rng, DIRTY_COUNT_VALUES, int(junk.sum()))
+    return counts
+
+
+def _dates(rng, n, start, days, fmt):
+    offsets = rng.integers(0, days, n)
+    return (pd.Timestamp(start) + pd.to_timedelta(offsets, unit='D')).strftime(fmt)
+
+
+def airline_accidents_frame(rows, seed=0):
+    """Build a synthetic airline_accidents frame with raw, uncleaned string values"""
+    rng = np.random.default_rng([seed, 1])
+    ids = np.arange(rows)
+    blank = np.full(rows, '', dtype=object)
+    data = {
+        'Event Id': pd.Index(ids).map(lambda i: f'2001{i:08d}X{i % 97:05d}'),
+        'Investigation Type': _choice(rng, ['Accident', 'Accident', 'Incident'], rows),
+        'Accident Number': pd.Index(ids).map(lambda i: f'LAX{i:07d}'),
+        'Event Date': _dates(rng, rows, '1962-01-01', 22000, '%m/%d/%Y'),
+        'Location': _choice(rng, LOCATIONS, rows),
+        'Country': _choice(rng, COUNTRIES, rows),
+        'Latitude': blank,
+        'Longitude': blank,
+        'Airport Code': _choice(rng, ['ANC', 'ORD', 'DEN', 'YUL', ''], rows),
+        'Airport Name': _choice(rng, ['Merrill Field', "Chicago O'Hare", 'Denver Intl', ''], rows),
+        'Injury Severity': _choice(rng, SEVERITIES, rows),
+        'Aircraft Damage': _choice(rng, DAMAGE, rows),
+        'Aircraft Category': _choice(rng, CATEGORIES, rows),
+        'Registration Number': pd.Index(ids).map(lambda i: f'N{i % 99999}'),
+        'Make': _choice(rng, MAKES, rows),
+        'Model': _choice(rng, MODELS, rows),
+        'Amateur Built': _choice(rng, ['No', 'No', 'No', 'Yes', ''], rows),
+        'Number of Engines': _choice(rng, ENGINE_COUNTS, rows),
+        'Engine Type': _choice(rng, ENGINE_TYPES, rows),
+        'FAR Description': _choice(rng, FAR_PARTS, rows),
+        'Schedule': _choice(rng, ['SCHD', 'NSCH', ''], rows),
+        'Purpose of Flight': _choice(rng, PURPOSES, rows),
+        'Air Carrier': _choice(rng, ['', '', '', 'Delta Air Lines', 'Société Air Québec'], rows),
+        'Total Fatal Injuries': _dirty_counts(rng, rows, 0.4),
+        'Total Serious Injuries': _dirty_counts(rng, rows, 0.3),
+        'Total Minor Injuries': _dirty_counts(rng, rows, 0.5),
+        'Total Uninjured': _dirty_counts(rng, rows, 2.0),
+        'Weather Condition': _choice(rng, WEATHER, rows),
+        'Broad Phase of Flight': _choice(rng, PHASES, rows),
+        'Report Status': _choice(rng, REPORT_STATUS, rows),
+        'Publication Date': _dates(rng, rows, '2000-01-01', 8000, '%m/%d/%Y'),
+    }
+    return pd.DataFrame(data, columns=AIRLINE_COLUMNS)
+
+
+def ntsb_frame(rows, seed=0, airline_dates=None):
+    """
+    Build a synthetic ntsb_aviation_data frame. Report numbers follow the
+    airline accident numbers; given their Event Dates, ~80% of the reports
+    also carry the same date, so they join (see joined_features.py)
+    """
+    rng = np.random.default_rng([seed, 2])
+    dates = _dates(rng, rows, '1982-01-01', 14000, '%d-%b-%y')
+    if airline_dates is not None:
+        n = min(rows, len(airline_dates))
+        same = np.random.default_rng([seed, 3]).random(n) < 0.8
+        airline_dates = pd.to_datetime(pd.Series(airline_dates[:n]), format='%m/%d/%Y').dt.strftime('%d-%b-%y')
+        dates = np.asarray(dates, dtype=object)
+        dates[:n][same] = airline_dates.to_numpy()[same]
+    return pd.DataFrame({
+        'NTSB_RPRT_NBR': pd.Index(np.arange(rows)).map(lambda i: f'LAX{i:07d}'),
+        'EVENT_LCL_DATE': dates,
+        'EVENT_LCL_TIME': _choice(rng, ['0800', '12:00', '1530', ''], rows),
+        'LOC_CITY_NAME': _choice(rng, ['Montréal', 'Anchorage', 'Zürich', 'Denver'], rows),
+        'LOC_STATE_NAME': _choice(rng, ['QC', 'AK', '', 'CO'], rows),
+        'LOC_CNTRY_NAME': _choice(rng, ['CANADA', 'UNITED STATES', 'SWITZERLAND'], rows),
+        'ACFT_MAKE_NAME': _choice(rng, ['CESSNA', 'PIPER', 'BOEING'], rows),
+        'ACFT_MODEL_NAME': _choice(rng, MODELS, rows),
+        'FATAL_FLAG': _choice(rng, ['No', 'No', 'Yes'], rows),
+        'FLT_CRW_INJ_NONE': rng.integers(0, 3, rows),
+        'PAX_INJ_NONE': rng.integers(0, 150, rows),
+    })
+
+
+def write_datasets(directory, scale=1, base_rows=BASE_ROWS, seed=0):
+    """
+    Write both synthetic CSVs (latin-1, as the real files) into directory.
+    Returns {'airline_accidents': rows, 'ntsb_data': rows}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    airline_rows = int(base_rows * scale)
+    ntsb_rows = max(1, airline_rows * 2 // 3)
+
+    airline_accidents = airline_accidents_frame(airline_rows, seed)
+    airline_accidents.to_csv(
+        os.path.join(directory, AIRLINE_ACCIDENTS_PATH), index=False, encoding='latin-1'
+    )
+    ntsb_frame(ntsb_rows, seed, airline_accidents['Event Date'].to_numpy()).to_csv(
+        os.path.join(directory, NTSB_DATA_PATH), index=False, encoding='latin-1'
+    )
+    return {'airline_accidents': airline_rows, 'ntsb_data': ntsb_rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic accident datasets')
+    parser.add_argument('--scale', type=float, default=1, help='multiple of --base-rows to generate')
+    parser.add_argument('--base-rows', type=int, default=BASE_ROWS)
+    parser.add_argument('--out', default='.', help='directory to write the CSVs to')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = write_datasets(args.out, args.scale, args.base_rows, args.seed)
+    print(f"✓ Wrote {rows['airline_accidents']} airline accident and {rows['ntsb_data']} NTSB rows to {args.out}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Compaction of served accident frames
+"""
+import pandas as pd
+
+from compaction import compact_frame, date_range, format_dates
+
+# dd-Mon-yy event dates on both sides of 1969, where pandas switches century
+TWO_DIGIT_YEAR_DATES = ['05-Jan-69', '20-Dec-68', '15-Mar-05', '01-Jul-99', None]
+
+
+def _compacted_dates():
+    df = pd.DataFrame({'EVENT_LCL_DATE': TWO_DIGIT_YEAR_DATES})
+    return compact_frame(df, date_columns=['EVENT_LCL_DATE'])[0]
+
+
+def test_two_digit_years_are_never_in_the_future():
+    compacted = _compacted_dates()
+    assert compacted.attrs['date_formats'] == {'EVENT_LCL_DATE': '%d-%b-%y'}
+    years = compacted['EVENT_LCL_DATE'].dt.year.dropna().astype(int).tolist()
+    assert years == [1969, 1968, 2005, 1999]
+
+
+def test_date_range_of_two_digit_years_starts_before_it_ends():
+    compacted = _compacted_dates()
+    assert date_range(compacted, 'EVENT_LCL_DATE') == {'start': '20-Dec-68', 'end': '15-Mar-05'}
+    dates = compacted['EVENT_LCL_DATE']
+    assert dates.min() <= dates.max()
+
+
+def test_two_digit_years_render_as_read():
+    rendered = format_dates(_compacted_dates())['EVENT_LCL_DATE']
+    assert rendered.iloc[:4].tolist() == TWO_DIGIT_YEAR_DATES[:4]
+    assert pd.isna(rendered.iloc[4])
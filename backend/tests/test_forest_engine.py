@@ -0,0 +1,163 @@
+"""
+Parity of compiled forests with the sklearn forests they are compiled from
+"""
+import copy
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from forest_engine import CompiledForest, _parity_inputs, check_parity
+
+N_FEATURES = 6
+
+
+def _training_data(seed=0, rows=600, missing=False):
+    rng = np.random.default_rng(seed)
+    # Few distinct values, so many inputs sit exactly on split thresholds
+    X = rng.integers(0, 8, size=(rows, N_FEATURES)).astype(float)
+    X[:, 0] += rng.normal(size=rows)
+    y_class = np.where(X[:, 1] + X[:, 2] > 7, 'Fatal', np.where(X[:, 3] > 4, 'Incident', 'Non-Fatal'))
+    y_score = X[:, 1] * 2 + X[:, 4] + rng.normal(size=rows)
+    if missing:
+        X[rng.random(X.shape) < 0.1] = np.nan
+    return X, y_class, y_score
+
+
+def _forests(missing=False):
+    X, y_class, y_score = _training_data(missing=missing)
+    params = {'n_estimators': 20, 'max_depth': 8, 'random_state': 42}
+    return (
+        RandomForestClassifier(**params).fit(X, y_class),
+        RandomForestRegressor(**params).fit(X, y_score),
+    )
+
+
+def _inputs(forest, missing=False):
+    """Random rows, rows on and around every threshold, and rows with NaN if fitted on them"""
+    X = np.vstack([_training_data(seed=1, rows=300)[0], _parity_inputs(forest, n_rows=1000)[0]])
+    if missing:
+        X[np.random.default_rng(2).random(X.shape) < 0.15] = np.nan
+    return X
+
+
+def _assert_identical(forest, compiled, X):
+    np.testing.assert_array_equal(compiled.predict(X), forest.predict(X))
+    if compiled.is_classifier:
+        np.testing.assert_array_equal(compiled.predict_proba(X), forest.predict_proba(X))
+
+
+def _node_at_depth(tree, x, depth):
+    """Walk one sklearn tree node by node, stopping at a leaf or after depth splits"""
+    node = 0
+    for _ in range(depth):
+        if tree.children_left[node] == -1:
+            break
+        value = x[tree.feature[node]]
+        go_left = tree.missing_go_to_left[node] if np.isnan(value) else value <= tree.threshold[node]
+        node = tree.children_left[node] if go_left else tree.children_right[node]
+    return node
+
+
+def _truncated_reference(forest, X, depth):
+    """Mean over the trees of the value of the node each row reaches at depth (or its leaf above it)"""
+    X = X.astype(np.float32)
+    total = None
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        nodes = np.array([_node_at_depth(tree, x, depth) for x in X])
+        values = tree.value[nodes, 0, :]
+        total = values.copy() if total is None else total + values
+    return total / len(forest.estimators_)
+
+
+def test_reference_walk_matches_sklearn_apply():
+    forest = _forests(missing=True)[0]
+    X = _inputs(forest, missing=True).astype(np.float32)
+    estimator = forest.estimators_[0]
+    nodes = [_node_at_depth(estimator.tree_, x, estimator.tree_.max_depth) for x in X]
+    np.testing.assert_array_equal(nodes, estimator.apply(X))
+
+
+@pytest.mark.parametrize('missing', [False, True], ids=['complete', 'nan'])
+def test_compiled_forests_match_sklearn(missing):
+    for forest in _forests(missing):
+        compiled = CompiledForest.from_sklearn(forest)
+        _assert_identical(forest, compiled, _inputs(forest, missing))
+
+
+def test_check_parity_reports_no_mismatch():
+    for forest in _forests():
+        X, compiled = _parity_inputs(forest)
+        assert check_parity(forest, compiled, X) == {}
+
+
+@pytest.mark.parametrize('missing', [False, True], ids=['complete', 'nan'])
+def test_fewer_trees_match_sklearn_first_trees(missing):
+    for forest in _forests(missing):
+        first = copy.deepcopy(forest)
+        first.estimators_ = forest.estimators_[:5]
+        first.n_estimators = 5
+        compiled = CompiledForest.from_sklearn(forest, n_estimators=5)
+        assert compiled.n_estimators == 5
+        _assert_identical(first, compiled, _inputs(forest, missing))
+
+
+@pytest.mark.parametrize('missing', [False, True], ids=['complete', 'nan'])
+def test_float32_thresholds_send_every_row_the_same_way(missing):
+    for forest in _forests(missing):
+        X = _inputs(forest, missing)
+        exact = CompiledForest.from_sklearn(forest)
+        compact = CompiledForest.from_sklearn(forest, compact_dtypes=True)
+        assert compact.threshold.dtype == np.float32
+        np.testing.assert_array_equal(compact.apply(X), exact.apply(X))
+        # Leaf values are rounded to float32, so outputs agree to float32 precision
+        if compact.is_classifier:
+            proba = forest.predict_proba(X)
+            np.testing.assert_allclose(compact.predict_proba(X), proba, atol=1e-6)
+            top_two = np.sort(proba, axis=1)[:, -2:]
+            clear = top_two[:, 1] - top_two[:, 0] > 1e-5
+            np.testing.assert_array_equal(compact.predict(X)[clear], forest.predict(X)[clear])
+        else:
+            np.testing.assert_allclose(compact.predict(X), forest.predict(X),
+                                       rtol=0, atol=1e-6 * np.ptp(exact.values))
+
+
+@pytest.mark.parametrize('missing', [False, True], ids=['complete', 'nan'])
+def test_shallower_trees_match_sklearn_node_values(missing):
+    for forest in _forests(missing):
+        X = _inputs(forest, missing)
+        compiled = CompiledForest.from_sklearn(forest, max_depth=3)
+        assert compiled.max_depth == 3
+        expected = _truncated_reference(forest, X, 3)
+        if compiled.is_classifier:
+            np.testing.assert_array_equal(compiled.predict_proba(X), expected)
+        else:
+            np.testing.assert_array_equal(compiled.predict(X), expected[:, 0])
+
+
+def test_pruning_stays_within_tolerance():
+    for forest in _forests():
+        X = _inputs(forest)
+        exact = CompiledForest.from_sklearn(forest)
+        scale = 1.0 if exact.is_classifier else float(np.ptp(exact.values))
+        tolerance = 0.01 * scale
+        pruned = CompiledForest.from_sklearn(forest, prune_tolerance=tolerance)
+        assert len(pruned.feature) < len(exact.feature)
+        # Each collapsed level moves a leaf by at most the tolerance
+        bound = tolerance * exact.max_depth
+        if exact.is_classifier:
+            assert np.max(np.abs(pruned.predict_proba(X) - forest.predict_proba(X))) <= bound
+        else:
+            assert np.max(np.abs(pruned.predict(X) - forest.predict(X))) <= bound
+
+
+def test_zero_tolerance_pruning_keeps_predictions():
+    for forest in _forests():
+        X = _inputs(forest)
+        pruned = CompiledForest.from_sklearn(forest, prune_tolerance=0.0)
+        # A collapsed split's value is the mean of two equal leaves, up to rounding
+        if pruned.is_classifier:
+            np.testing.assert_allclose(pruned.predict_proba(X), forest.predict_proba(X), rtol=0, atol=1e-12)
+        else:
+            np.testing.assert_allclose(pruned.predict(X), forest.predict(X), rtol=0, atol=1e-9)
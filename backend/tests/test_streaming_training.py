@@ -0,0 +1,43 @@
+"""
+Tree budget of forests trained chunk by chunk
+"""
+import numpy as np
+import pytest
+
+import streaming_training
+from ml_models import AviationMLModels
+from streaming_training import StreamingTrainer, tree_groups
+from synthetic_data import airline_accidents_frame
+
+N_TREES = 8
+
+
+@pytest.mark.parametrize('n_chunks, n_trees', [(1, 100), (3, 100), (100, 100), (101, 100), (250, 100), (7, 3)])
+def test_tree_groups_share_exactly_n_trees(n_chunks, n_trees):
+    group_of, trees = tree_groups(n_chunks, n_trees)
+    assert len(group_of) == n_chunks
+    assert trees.sum() == n_trees
+    assert (trees >= 1).all()
+    # Groups are runs of consecutive chunks, numbered from 0
+    assert group_of[0] == 0 and group_of[-1] == len(trees) - 1
+    assert set(np.diff(group_of)) <= {0, 1}
+
+
+@pytest.fixture
+def small_forests(monkeypatch):
+    params = dict(streaming_training.FOREST_PARAMS, n_estimators=N_TREES, max_depth=4)
+    monkeypatch.setattr(streaming_training, 'FOREST_PARAMS', params)
+
+
+@pytest.mark.parametrize('chunksize', [400, 50])
+def test_streaming_forests_have_n_estimators_trees(tmp_path, small_forests, chunksize):
+    path = tmp_path / 'airline_accidents.csv'
+    airline_accidents_frame(800).to_csv(path, index=False, encoding='latin-1')
+
+    models = AviationMLModels()
+    trainer = StreamingTrainer(models, [str(path)], chunksize)
+    assert trainer.train() is not None
+    # 2 chunks grow 4 trees each; 16 chunks share a tree between 2
+    assert len(models.random_forest_classifier.estimators_) == N_TREES
+    assert len(models.random_forest_regressor.estimators_) == N_TREES
+    assert trainer.rows == 800
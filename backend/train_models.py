@@ -1,119 +1,110 @@
 """
 Script to train ML models on aviation accident data
 """
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend for saving plots
-import matplotlib.pyplot as plt
-import numpy as np
-from ml_models import AviationMLModels
+from ml_models import (AviationMLModels, _regression_split, _split, fit_severity_classifier, fit_linear_regressor,
+                       fit_forest_regressor)
+from datasets import AIRLINE_ACCIDENTS_PATH
+from joined_features import load_training_dataset
+from feature_store import FEATURE_STORE_DIR, load_features, load_or_build_features
+from plots import PLOTS_DIR, plot_inputs, render_plots
+from streaming_training import DEFAULT_CHUNK_SIZE, StreamingTrainer
+from incremental_training import (INCREMENTAL_TREES, MAX_FOREST_TREES, WatermarkError,
+                                  train_incremental, training_watermark)
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import argparse
 import os
 import json
+import time
 
+# Independent model fits: stage -> (fit function, whether it can split its trees across cores).
+# Forests come first so the longest fits start first.
+TRAINING_STAGES = {
+    'rf_classifier': (fit_severity_classifier, True),
+    'rf_regressor': (fit_forest_regressor, True),
+    'linear_regression': (fit_linear_regressor, False),
+}
 
-def generate_plots(classifier_results, regressor_results, X_test=None, y_test=None, y_pred_linear=None, y_pred_rf=None):
-    """Generate and save visualization plots"""
-    plots_dir = 'models/plots'
-    os.makedirs(plots_dir, exist_ok=True)
-    
-    # Plot 1: Feature Importance Comparison
-    if classifier_results and 'feature_importance' in classifier_results:
-        fig, ax = plt.subplots(figsize=(10, 6))
-        features = list(classifier_results['feature_importance'].keys())
-        importances = list(classifier_results['feature_importance'].values())
-        
-        colors = plt.cm.viridis(np.linspace(0.3, 0.9, len(features)))
-        bars = ax.barh(features, importances, color=colors)
-        ax.set_xlabel('Importance Score', fontsize=12)
-        ax.set_title('Random Forest Classifier - Feature Importance', fontsize=14, fontweight='bold')
-        ax.grid(axis='x', alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig(f'{plots_dir}/classifier_feature_importance.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"✓ Saved classifier feature importance plot")
+
+def default_workers():
+    """Worker count from TRAINING_WORKERS, or every core"""
+    return int(os.getenv('TRAINING_WORKERS', '0')) or os.cpu_count() or 1
+
+
+@contextmanager
+def timed(timings, stage):
+    """Record the wall-clock seconds of a block under timings[stage]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def _run_stage(stage, features, n_jobs):
+    fit, splits_trees = TRAINING_STAGES[stage]
+    start = time.perf_counter()
+    result = fit(features, n_jobs=n_jobs) if splits_trees else fit(features)
+    return result, time.perf_counter() - start
+
+
+def _run_stage_from_store(stage, fingerprint, directory, n_jobs):
+    """Worker entry point: map the stored features read-only and run one stage"""
+    features, _ = load_features(fingerprint, directory)
+    return _run_stage(stage, features, n_jobs)
+
+
+def fit_models(features, workers=1, directory=FEATURE_STORE_DIR):
+    """
+    Run every stage in TRAINING_STAGES, side by side in a pool of up to
+    `workers` processes. Workers memory-map the stored feature matrix rather
+    than receiving a copy of it, and cores beyond one per stage are split
+    across the trees of the forests.
+    Returns ({stage: result}, {stage: fit seconds})
+    """
+    workers = max(1, workers)
+    if workers == 1:
+        timed_results = {stage: _run_stage(stage, features, None) for stage in TRAINING_STAGES}
+    else:
+        processes = min(workers, len(TRAINING_STAGES))
+        forests = sum(1 for _, splits_trees in TRAINING_STAGES.values() if splits_trees)
+        n_jobs = max(1, (workers - (processes - forests)) // forests)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {
+                stage: pool.submit(_run_stage_from_store, stage, features['fingerprint'], directory,
+                                   n_jobs if splits_trees else None)
+                for stage, (_, splits_trees) in TRAINING_STAGES.items()
+            }
+            timed_results = {stage: future.result() for stage, future in futures.items()}
     
-    # Plot 2: Model Performance Comparison
-    if regressor_results:
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-        
-        # RMSE Comparison
-        models = ['Linear\nRegression', 'Random Forest\nRegressor']
-        rmse_values = [regressor_results.get('linear_regression_rmse', 0), regressor_results.get('random_forest_rmse', 0)]
-        colors_rmse = ['#fa709a', '#30cfd0']
-        
-        bars1 = ax1.bar(models, rmse_values, color=colors_rmse, alpha=0.8, edgecolor='black', linewidth=1.5)
-        ax1.set_ylabel('RMSE (Lower is Better)', fontsize=12)
-        ax1.set_title('Model Performance Comparison', fontsize=14, fontweight='bold')
-        ax1.grid(axis='y', alpha=0.3)
-        
-        # Add value labels on bars
-        for bar, value in zip(bars1, rmse_values):
-            height = bar.get_height()
-            ax1.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{value:.2f}', ha='center', va='bottom', fontsize=11, fontweight='bold')
-        
-        # Feature Importance for Random Forest Regressor
-        if 'feature_importance' in regressor_results:
-            features = list(regressor_results['feature_importance'].keys())
-            importances = list(regressor_results['feature_importance'].values())
-            
-            colors_feat = plt.cm.plasma(np.linspace(0.3, 0.9, len(features)))
-            bars2 = ax2.barh(features, importances, color=colors_feat)
-            ax2.set_xlabel('Importance Score', fontsize=12)
-            ax2.set_title('Random Forest Regressor - Feature Importance', fontsize=14, fontweight='bold')
-            ax2.grid(axis='x', alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig(f'{plots_dir}/regressor_comparison.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"✓ Saved regressor comparison plot")
-    
-    # Plot 3: Linear Regression - Actual vs Predicted (subset)
-    if y_test is not None and y_pred_linear is not None:
-        # Use only first 100 samples for clarity
-        subset_size = min(100, len(y_test))
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        x_axis = np.arange(subset_size)
-        ax.plot(x_axis, y_test[:subset_size], 'o-', label='Actual', color='#667eea', markersize=6, linewidth=2, alpha=0.8)
-        ax.plot(x_axis, y_pred_linear[:subset_size], 's-', label='Predicted', color='#fa709a', markersize=5, linewidth=2, alpha=0.8)
-        
-        ax.set_xlabel('Test Sample Index', fontsize=12)
-        ax.set_ylabel('Severity Score', fontsize=12)
-        ax.set_title('Linear Regression: Actual vs Predicted Values (First 100 Samples)', fontsize=14, fontweight='bold')
-        ax.legend(loc='best', fontsize=11)
-        ax.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig(f'{plots_dir}/linear_regression_predictions.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"✓ Saved linear regression predictions plot")
-    
-    # Plot 4: Random Forest - Actual vs Predicted (subset)
-    if y_test is not None and y_pred_rf is not None:
-        # Use only first 100 samples for clarity
-        subset_size = min(100, len(y_test))
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        x_axis = np.arange(subset_size)
-        ax.plot(x_axis, y_test[:subset_size], 'o-', label='Actual', color='#667eea', markersize=6, linewidth=2, alpha=0.8)
-        ax.plot(x_axis, y_pred_rf[:subset_size], 's-', label='Predicted', color='#30cfd0', markersize=5, linewidth=2, alpha=0.8)
-        
-        ax.set_xlabel('Test Sample Index', fontsize=12)
-        ax.set_ylabel('Severity Score', fontsize=12)
-        ax.set_title('Random Forest Regressor: Actual vs Predicted Values (First 100 Samples)', fontsize=14, fontweight='bold')
-        ax.legend(loc='best', fontsize=11)
-        ax.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig(f'{plots_dir}/random_forest_predictions.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"✓ Saved random forest predictions plot")
+    results = {stage: result for stage, (result, _) in timed_results.items()}
+    seconds = {stage: elapsed for stage, (_, elapsed) in timed_results.items()}
+    return results, seconds
+
+
+def print_timings(timings):
+    """Print the per-stage wall-clock times of a training run"""
+    print("\nStage timings (wall clock):")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<28} {seconds:8.2f}s")
+
+
+def generate_plots(classifier_results, regressor_results, X_test=None, y_test=None, y_pred_linear=None, y_pred_rf=None,
+                   workers=1, force=False):
+    """
+    Render the visualization plots whose inputs changed since the last run,
+    in up to `workers` processes (see plots.py)
+    """
+    inputs = plot_inputs(classifier_results, regressor_results, y_test, y_pred_linear, y_pred_rf)
+    result = render_plots(inputs, PLOTS_DIR, workers=workers, force=force)
     
-    print(f"\nPlots saved to: {plots_dir}/")
+    print(f"\nPlots saved to: {PLOTS_DIR}/")
+    return result
 
-def main():
+def main(workers=None):
+    workers = workers or default_workers()
+    timings = {}
+    
     print("=" * 60)
     print("Aviation ML Model Training")
     print("=" * 60)
@@ -121,7 +112,9 @@ def main():
     # Load data
     print("\nLoading datasets...")
     try:
-        airline_accidents = pd.read_csv('airline_accidents.csv', encoding='latin-1', low_memory=False)
+        with timed(timings, 'load data'):
+            # Refresh the joined feature table if a CSV changed, then map it
+            airline_accidents = load_training_dataset()
         print(f"Loaded {len(airline_accidents)} records from airline_accidents.csv")
     except Exception as e:
         print(f"Error loading data: {e}")
@@ -130,11 +123,24 @@ def main():
     # Initialize ML models
     ml_models = AviationMLModels()
     
+    # Preprocess once (or reuse stored features for an unchanged dataset)
+    # and share the encoded feature matrix between all trainers
+    print("\nPreparing training features...")
+    with timed(timings, 'prepare features'):
+        features = load_or_build_features(ml_models, airline_accidents)
+    
+    # The classifier and both regressors are independent, so fit them side by side
+    print(f"\nFitting {len(TRAINING_STAGES)} models with {workers} worker(s)...")
+    with timed(timings, 'fit models'):
+        fit_results, fit_seconds = fit_models(features, workers)
+    for stage, seconds in fit_seconds.items():
+        timings[f'  fit {stage}'] = seconds
+    
     # Train classification model
     print("\n" + "=" * 60)
     print("Training Classification Model (Severity Prediction)")
     print("=" * 60)
-    classifier_results = ml_models.train_severity_classifier(airline_accidents)
+    classifier_results = ml_models.install_classifier(features, fit_results['rf_classifier'])
     
     if classifier_results:
         print("\nTop 5 Important Features:")
@@ -147,7 +153,9 @@ def main():
     print("\n" + "=" * 60)
     print("Training Regression Models (Severity Score Prediction)")
     print("=" * 60)
-    regressor_results = ml_models.train_severity_regressor(airline_accidents)
+    regressor_results = ml_models.install_regressors(
+        features, fit_results['linear_regression'], fit_results['rf_regressor']
+    )
     
     # Get test predictions for visualization
     X_test = regressor_results.get('X_test') if regressor_results else None
@@ -209,22 +217,147 @@ def main():
     print("\n" + "=" * 60)
     print("Generating Visualization Plots")
     print("=" * 60)
-    generate_plots(classifier_results, regressor_results, X_test, y_test, y_pred_linear, y_pred_rf)
+    with timed(timings, 'render plots'):
+        generate_plots(classifier_results, regressor_results, X_test, y_test, y_pred_linear, y_pred_rf, workers)
     
     # Save models
     print("\n" + "=" * 60)
     print("Saving Models")
     print("=" * 60)
-    ml_models.save_models()
+    # Served by /api/model-performance from the bundle
+    metrics = {}
+    if classifier_results:
+        metrics['classifier'] = {
+            'accuracy': float(classifier_results['accuracy']),
+            'samples_trained': int(len(_split(len(features['X']))[0])),
+        }
+        metrics['feature_importance'] = {
+            feature: float(score) for feature, score in classifier_results['feature_importance'].items()
+        }
+    if regressor_results:
+        metrics['regressor'] = {
+            'linear_rmse': float(regressor_results['linear_regression_rmse']),
+            'random_forest_rmse': float(regressor_results['random_forest_rmse']),
+            'samples_trained': int(len(_regression_split(features)[0])),
+        }
+    metrics['timings'] = {stage.strip(): round(seconds, 3) for stage, seconds in timings.items()}
+    # The watermark lets later runs train on appended records only (--incremental)
+    lineage = {'mode': 'full', 'parent': None, 'generation': 0,
+               'watermark': training_watermark(airline_accidents)}
+    with timed(timings, 'save models'):
+        ml_models.save_models(metrics=metrics, lineage=lineage)
+    print_timings(timings)
     
     print("\n" + "=" * 60)
     print("Training Complete!")
     print("=" * 60)
     print("\nGenerated files:")
-    print("  - models/*.pkl (ML models)")
-    print("  - models/model_metadata.json (performance metrics)")
+    print("  - models/bundles/<run>/ (ML model bundle and its metrics, see models/bundles/CURRENT)")
     print("  - models/plots/*.png (visualization plots)")
 
 
+def main_streaming(sources=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Train out of core from CSVs read in chunks (see streaming_training.py)"""
+    sources = sources or [AIRLINE_ACCIDENTS_PATH]
+    timings = {}
+    
+    print("=" * 60)
+    print("Aviation ML Model Training (streaming)")
+    print("=" * 60)
+    print(f"\nStreaming {', '.join(sources)} in chunks of {chunk_size} rows...")
+    
+    ml_models = AviationMLModels()
+    with timed(timings, 'streaming training'):
+        trainer = StreamingTrainer(ml_models, sources, chunk_size)
+        metrics = trainer.train()
+    if metrics is None:
+        return
+    
+    print("\n" + "=" * 60)
+    print("Saving Models")
+    print("=" * 60)
+    metrics['timings'] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    with timed(timings, 'save models'):
+        ml_models.save_models(metrics=metrics, lineage={
+            'mode': 'streaming', 'parent': None, 'generation': 0,
+            # What compact_forests.py needs to recreate the held-out rows
+            'sources': list(sources), 'chunk_size': chunk_size, 'rows': trainer.rows,
+        })
+    print_timings(timings)
+    
+    print("\n" + "=" * 60)
+    print("Training Complete!")
+    print("=" * 60)
+
+
+def main_incremental(new_trees=INCREMENTAL_TREES, max_trees=MAX_FOREST_TREES):
+    """Grow the current bundle's models on records appended since it was trained (see incremental_training.py)"""
+    timings = {}
+    
+    print("=" * 60)
+    print("Aviation ML Model Training (incremental)")
+    print("=" * 60)
+    
+    ml_models = AviationMLModels()
+    if not ml_models.load_models():
+        print("✗ No trained models to update - run 'python train_models.py' first")
+        return
+    
+    print("\nLoading datasets...")
+    try:
+        with timed(timings, 'load data'):
+            airline_accidents = load_training_dataset()
+        print(f"Loaded {len(airline_accidents)} records from airline_accidents.csv")
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        return
+    
+    print(f"\nGrowing {new_trees} trees per forest on the new records...")
+    try:
+        with timed(timings, 'incremental training'):
+            result = train_incremental(ml_models, airline_accidents, new_trees, max_trees)
+    except WatermarkError as e:
+        print(f"✗ {e}")
+        print("  Run a full training with 'python train_models.py'")
+        return
+    if result is None:
+        return
+    metrics, lineage = result
+    
+    print("\n" + "=" * 60)
+    print("Saving Models")
+    print("=" * 60)
+    metrics['timings'] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    with timed(timings, 'save models'):
+        ml_models.save_models(metrics=metrics, lineage=lineage)
+    print_timings(timings)
+    
+    print("\n" + "=" * 60)
+    print(f"Incremental Training Complete! (generation {lineage['generation']} of {lineage['root']})")
+    print("=" * 60)
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Train the aviation ML models')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes (and cores) to train with; defaults to TRAINING_WORKERS or all cores')
+    parser.add_argument('--stream', action='store_true',
+                        help='train out of core from CSV chunks instead of loading the dataset into memory')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='rows per chunk in --stream mode')
+    parser.add_argument('--source', action='append', default=None,
+                        help='CSV in the airline accidents format to stream; repeat for several files')
+    parser.add_argument('--incremental', action='store_true',
+                        help='update the current models with only the records appended since they were trained')
+    parser.add_argument('--new-trees', type=int, default=INCREMENTAL_TREES,
+                        help='trees each forest grows in --incremental mode')
+    parser.add_argument('--max-trees', type=int, default=MAX_FOREST_TREES,
+                        help='trees each forest keeps in --incremental mode; the oldest are retired')
+    args = parser.parse_args()
+    
+    if args.incremental:
+        main_incremental(args.new_trees, args.max_trees)
+    elif args.stream:
+        main_streaming(args.source, args.chunk_size)
+    else:
+        main(args.workers)